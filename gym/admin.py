@@ -1,5 +1,5 @@
 from django.contrib import admin
-from.models import Ejercicio, Rutina, EjercicioRutina, Entrenamiento, SerieEjercicio
+from.models import Ejercicio, Rutina, EjercicioRutina, Entrenamiento, SerieEjercicio, ResumenSesionEjercicio, RecordPersonal, EstadisticasUsuario, RegistroEliminado, UltimoRendimiento, Importacion, RankingFuerza, PerfilPeticion, SesionArchivada
 
 # Register your models here.
 admin.site.register(Ejercicio)
@@ -13,3 +13,60 @@ from .models import Perfil
 class PerfilAdmin(admin.ModelAdmin):
     list_display = ('usuario', 'peso_corporal')
     search_fields = ('usuario__username',)
+
+@admin.register(ResumenSesionEjercicio)
+class ResumenSesionEjercicioAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'ejercicio', 'fecha', 'peso_maximo', 'e1rm_maximo', 'series_completadas', 'volumen_total')
+    list_filter = ('ejercicio',)
+    search_fields = ('usuario__username',)
+
+@admin.register(RecordPersonal)
+class RecordPersonalAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'ejercicio', 'repeticiones_minimas', 'peso_kg', 'repeticiones', 'e1rm', 'fecha')
+    list_filter = ('repeticiones_minimas',)
+    search_fields = ('usuario__username', 'ejercicio__nombre')
+
+@admin.register(UltimoRendimiento)
+class UltimoRendimientoAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'ejercicio', 'fecha')
+    search_fields = ('usuario__username', 'ejercicio__nombre')
+
+@admin.register(EstadisticasUsuario)
+class EstadisticasUsuarioAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'total_entrenamientos', 'total_series', 'volumen_total', 'ultima_fecha')
+    search_fields = ('usuario__username',)
+
+@admin.register(RegistroEliminado)
+class RegistroEliminadoAdmin(admin.ModelAdmin):
+    list_display = ('modelo', 'objeto_id', 'usuario_id', 'fecha')
+    list_filter = ('modelo',)
+
+@admin.register(Importacion)
+class ImportacionAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'nombre_fichero', 'fecha', 'estado', 'entrenamientos', 'series', 'filas_omitidas')
+    list_filter = ('estado',)
+    search_fields = ('usuario__username', 'nombre_fichero')
+
+@admin.register(RankingFuerza)
+class RankingFuerzaAdmin(admin.ModelAdmin):
+    list_display = ('ejercicio', 'posicion', 'usuario', 'categoria', 'posicion_categoria', 'e1rm', 'relacion', 'actualizado')
+    list_filter = ('ejercicio', 'categoria')
+    search_fields = ('usuario__username', 'ejercicio__nombre')
+
+
+@admin.register(PerfilPeticion)
+class PerfilPeticionAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'metodo', 'ruta', 'vista', 'estado', 'duracion_ms', 'consultas', 'tiempo_sql_ms', 'usuario')
+    list_filter = ('vista', 'metodo')
+    search_fields = ('ruta', 'vista')
+    readonly_fields = [campo.name for campo in PerfilPeticion._meta.fields]
+    
+    # Los perfiles solo los crea el middleware
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(SesionArchivada)
+class SesionArchivadaAdmin(admin.ModelAdmin):
+    list_display = ('entrenamiento', 'series_totales', 'volumen_total', 'archivada')
+    search_fields = ('entrenamiento__usuario__username',)
+    exclude = ('datos',)
@@ -0,0 +1,995 @@
+"""
+Agregados precalculados que se mantienen en cada escritura.
+
+Las vistas de progreso leen estas tablas en vez de recorrer todas las
+series del usuario. Las señales de gym/signals.py llaman a estas funciones
+cuando cambia una SerieEjercicio, y el comando `reconstruir_agregados`
+las recalcula desde cero si alguna vez se desincronizan.
+"""
+from functools import reduce
+from itertools import chain
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Max, Min, Q, Sum, Value, When
+from django.utils import timezone
+
+from . import archivo, cache_progreso
+from .models import (
+    Entrenamiento, EjercicioRutina, EstadisticasUsuario, Perfil, RankingFuerza, RecordPersonal,
+    ResumenSesionEjercicio, SerieEjercicio, SesionArchivada, UltimoRendimiento,
+)
+
+
+# 📝 EXPLICACIÓN: Agregados de las series de un ejercicio en una sesión
+def _agregar_series(series):
+    return series.aggregate(
+        peso_maximo=Max('peso_kg'),
+        reps_totales=Sum('repeticiones'),
+        series_completadas=Count('id'),
+        volumen_total=Sum(F('peso_kg') * F('repeticiones'), output_field=FloatField()),
+        e1rm_maximo=Max('e1rm'),
+    )
+
+
+def actualizar_resumen_sesion(entrenamiento, ejercicio_id):
+    """
+    Recalcula el resumen (sesión × ejercicio). Solo mira las series de esa
+    sesión para ese ejercicio, así que el coste no crece con el historial.
+    """
+    datos = _agregar_series(SerieEjercicio.objects.filter(
+        entrenamiento=entrenamiento,
+        ejercicio_rutina__ejercicio_id=ejercicio_id
+    ))
+
+    # Sin series → el resumen ya no tiene sentido
+    if not datos['series_completadas']:
+        borrados, _ = ResumenSesionEjercicio.objects.filter(
+            entrenamiento=entrenamiento,
+            ejercicio_id=ejercicio_id
+        ).delete()
+        if borrados:
+            actualizar_ejercicio_frecuente(entrenamiento.usuario_id)
+        return None
+
+    resumen, creado = ResumenSesionEjercicio.objects.update_or_create(
+        entrenamiento=entrenamiento,
+        ejercicio_id=ejercicio_id,
+        defaults={
+            'usuario_id': entrenamiento.usuario_id,
+            'fecha': entrenamiento.fecha,
+            **datos,
+        }
+    )
+    # Una sesión más con este ejercicio → puede cambiar el más frecuente
+    if creado:
+        actualizar_ejercicio_frecuente(entrenamiento.usuario_id)
+    return resumen
+
+
+# 📝 EXPLICACIÓN: Contadores generales del usuario (EstadisticasUsuario)
+def _ejercicio_mas_frecuente(usuario_id):
+    """Ejercicio presente en más sesiones, contado sobre los resúmenes"""
+    return ResumenSesionEjercicio.objects.filter(
+        usuario_id=usuario_id
+    ).values('ejercicio_id').annotate(
+        sesiones=Count('id')
+    ).order_by('-sesiones', 'ejercicio_id').values_list('ejercicio_id', flat=True).first()
+
+
+def actualizar_ejercicio_frecuente(usuario_id):
+    EstadisticasUsuario.objects.filter(usuario_id=usuario_id).update(
+        ejercicio_frecuente_id=_ejercicio_mas_frecuente(usuario_id)
+    )
+
+
+def _sumar_series(usuario_id, series, volumen):
+    # F() → el incremento lo hace la base de datos, sin carreras entre peticiones
+    EstadisticasUsuario.objects.filter(usuario_id=usuario_id).update(
+        total_series=F('total_series') + series,
+        volumen_total=F('volumen_total') + volumen,
+    )
+
+
+def entrenamiento_creado(entrenamiento):
+    """Suma el entrenamiento nuevo a los contadores del usuario"""
+    with transaction.atomic():
+        estadisticas = EstadisticasUsuario.objects.select_for_update().filter(
+            usuario_id=entrenamiento.usuario_id
+        ).first()
+
+        # Usuario con historial anterior a la tabla → calcular todo una vez
+        if estadisticas is None:
+            reconstruir_estadisticas(entrenamiento.usuario_id)
+            return
+
+        estadisticas.total_entrenamientos += 1
+        if estadisticas.primera_fecha is None or entrenamiento.fecha < estadisticas.primera_fecha:
+            estadisticas.primera_fecha = entrenamiento.fecha
+        if estadisticas.ultima_fecha is None or entrenamiento.fecha > estadisticas.ultima_fecha:
+            estadisticas.ultima_fecha = entrenamiento.fecha
+        estadisticas.save(update_fields=['total_entrenamientos', 'primera_fecha', 'ultima_fecha'])
+
+
+def entrenamientos_creados_en_lote(usuario_id, entrenamientos):
+    """Equivalente a entrenamiento_creado() para un bulk_create"""
+    if not entrenamientos:
+        return
+    cache_progreso.invalidar_usuario(usuario_id)
+    with transaction.atomic():
+        estadisticas = EstadisticasUsuario.objects.select_for_update().filter(usuario_id=usuario_id).first()
+        if estadisticas is None:
+            reconstruir_estadisticas(usuario_id)
+            return
+
+        fechas = [entrenamiento.fecha for entrenamiento in entrenamientos]
+        estadisticas.total_entrenamientos += len(entrenamientos)
+        estadisticas.primera_fecha = min(fechas + [estadisticas.primera_fecha or min(fechas)])
+        estadisticas.ultima_fecha = max(fechas + [estadisticas.ultima_fecha or max(fechas)])
+        estadisticas.save(update_fields=['total_entrenamientos', 'primera_fecha', 'ultima_fecha'])
+
+
+def paquete_por_eliminar(entrenamiento):
+    """
+    (series, volumen, ids de las series) de una sesión archivada que se va
+    a borrar: el CASCADE se lleva su SesionArchivada sin que ninguna serie
+    pase por serie_eliminada. None si la sesión no está archivada.
+    """
+    if not entrenamiento.archivado:
+        return None
+    sesion = SesionArchivada.objects.filter(entrenamiento_id=entrenamiento.id).first()
+    if sesion is None:
+        return None
+    ids = [serie.id for serie in archivo.desempaquetar(sesion.datos)]
+    return sesion.series_totales, sesion.volumen_total, ids
+
+
+def entrenamiento_eliminado(entrenamiento, paquete=None):
+    """
+    Resta el entrenamiento y vuelve a buscar las fechas extremas. `paquete`
+    es lo que tenía archivado (paquete_por_eliminar), leído antes del borrado.
+    """
+    with transaction.atomic():
+        fechas = Entrenamiento.objects.filter(
+            usuario_id=entrenamiento.usuario_id
+        ).aggregate(primera=Min('fecha'), ultima=Max('fecha'))
+        EstadisticasUsuario.objects.filter(usuario_id=entrenamiento.usuario_id).update(
+            total_entrenamientos=F('total_entrenamientos') - 1,
+            primera_fecha=fechas['primera'],
+            ultima_fecha=fechas['ultima'],
+            # Sus resúmenes se borraron en cascada, sin pasar por actualizar_resumen_sesion
+            ejercicio_frecuente_id=_ejercicio_mas_frecuente(entrenamiento.usuario_id),
+        )
+        # Los últimos rendimientos que eran de esta sesión quedaron sin ella (SET_NULL)
+        for ejercicio_id in UltimoRendimiento.objects.filter(
+            usuario_id=entrenamiento.usuario_id,
+            entrenamiento__isnull=True
+        ).values_list('ejercicio_id', flat=True):
+            recalcular_ultimo_rendimiento(entrenamiento.usuario_id, ejercicio_id)
+
+        if paquete:
+            series, volumen, serie_ids = paquete
+            _sumar_series(entrenamiento.usuario_id, -series, -volumen)
+            # Solo los récords que eran de series del paquete (y con el de
+            # 1RM estimado, el ranking)
+            rangos = {}
+            for ejercicio_id, rango in RecordPersonal.objects.filter(
+                usuario_id=entrenamiento.usuario_id,
+                serie_archivada__in=serie_ids
+            ).values_list('ejercicio_id', 'repeticiones_minimas'):
+                rangos.setdefault(ejercicio_id, []).append(rango)
+            for ejercicio_id, rangos_ejercicio in rangos.items():
+                recalcular_records(entrenamiento.usuario_id, ejercicio_id, sorted(rangos_ejercicio))
+
+
+# 📝 EXPLICACIÓN: Libro de récords personales (PRs)
+# 0 = récord absoluto, RANGO_E1RM = mejor 1RM estimado
+RANGOS_RECORD = [RecordPersonal.RANGO_E1RM, 0] + RecordPersonal.RANGOS_REPETICIONES
+
+
+def _cumple_rango(serie, rango):
+    if rango == RecordPersonal.RANGO_E1RM:
+        return serie.e1rm is not None
+    return serie.repeticiones >= rango
+
+
+def _orden_record(repeticiones_minimas, peso, reps, e1rm, fecha):
+    """
+    Clave para max(): mejor serie del rango; a igualdad, la más antigua.
+    La usan el camino incremental y la reconstrucción, así que los dos
+    eligen la misma serie en los empates.
+    """
+    if repeticiones_minimas == RecordPersonal.RANGO_E1RM:
+        return (e1rm or 0, -fecha.timestamp())
+    return (peso, reps, -fecha.timestamp())
+
+
+def _es_mejor(serie, record, rango):
+    """¿La serie supera al récord? A igual peso ganan más reps; a igual todo, la más antigua"""
+    return _orden_record(rango, serie.peso_kg, serie.repeticiones, serie.e1rm, serie.entrenamiento.fecha) > (
+        _orden_record(rango, record.peso_kg, record.repeticiones, record.e1rm, record.fecha)
+    )
+
+
+def _series_archivadas(usuario_id, ejercicio_id):
+    """[(fecha, SerieArchivada)] del ejercicio en las sesiones archivadas del usuario (una consulta)"""
+    return [
+        (fecha, serie)
+        for _, _, fecha, serie in archivo.filas_archivadas(SesionArchivada.objects.filter(
+            entrenamiento__usuario_id=usuario_id,
+            entrenamiento__resumenes__ejercicio_id=ejercicio_id,
+        ))
+        if serie.ejercicio_id == ejercicio_id
+    ]
+
+
+def _mejor_serie_archivada(archivadas, repeticiones_minimas):
+    """
+    La mejor serie del rango entre las archivadas, sin guardar (id=None);
+    su id archivado va en `id_archivado`
+    """
+    candidatas = [
+        (fecha, serie) for fecha, serie in archivadas
+        if (serie.e1rm is not None if repeticiones_minimas == RecordPersonal.RANGO_E1RM
+            else serie.repeticiones >= repeticiones_minimas)
+    ]
+    if not candidatas:
+        return None
+    fecha, serie = max(candidatas, key=lambda candidata: _orden_record(
+        repeticiones_minimas, candidata[1].peso_kg, candidata[1].repeticiones, candidata[1].e1rm, candidata[0]
+    ))
+    mejor = SerieEjercicio(
+        entrenamiento=Entrenamiento(fecha=fecha), ejercicio_rutina_id=serie.ejercicio_rutina_id,
+        peso_kg=serie.peso_kg, repeticiones=serie.repeticiones, rpe=serie.rpe, e1rm=serie.e1rm,
+    )
+    mejor.id_archivado = serie.id
+    return mejor
+
+
+def _mejor_serie(usuario_id, ejercicio_id, repeticiones_minimas, archivadas=()):
+    series = SerieEjercicio.objects.filter(
+        entrenamiento__usuario_id=usuario_id,
+        ejercicio_rutina__ejercicio_id=ejercicio_id,
+    ).select_related('entrenamiento')
+    if repeticiones_minimas == RecordPersonal.RANGO_E1RM:
+        mejor = series.filter(e1rm__isnull=False).order_by('-e1rm', 'entrenamiento__fecha', 'id').first()
+    else:
+        mejor = series.filter(
+            repeticiones__gte=repeticiones_minimas
+        ).order_by(
+            '-peso_kg', '-repeticiones', 'entrenamiento__fecha', 'id'
+        ).first()
+
+    # Las sesiones archivadas también cuentan (gym/archivo.py)
+    archivada = _mejor_serie_archivada(archivadas, repeticiones_minimas)
+    if archivada is None:
+        return mejor
+    if mejor is None:
+        return archivada
+    return max(mejor, archivada, key=lambda serie: _orden_record(
+        repeticiones_minimas, serie.peso_kg, serie.repeticiones, serie.e1rm, serie.entrenamiento.fecha
+    ))
+
+
+def recalcular_records(usuario_id, ejercicio_id, rangos=None):
+    """
+    Vuelve a buscar el mejor récord de los rangos indicados. Solo hace falta
+    cuando la serie que tenía el récord se edita a la baja o se borra.
+    """
+    archivadas = _series_archivadas(usuario_id, ejercicio_id)
+    for rango in (RANGOS_RECORD if rangos is None else rangos):
+        mejor = _mejor_serie(usuario_id, ejercicio_id, rango, archivadas)
+        if rango == RecordPersonal.RANGO_E1RM:
+            record_e1rm_cambiado(usuario_id, ejercicio_id, mejor and mejor.e1rm)
+        if mejor is None:
+            RecordPersonal.objects.filter(
+                usuario_id=usuario_id,
+                ejercicio_id=ejercicio_id,
+                repeticiones_minimas=rango
+            ).delete()
+            continue
+        RecordPersonal.objects.update_or_create(
+            usuario_id=usuario_id,
+            ejercicio_id=ejercicio_id,
+            repeticiones_minimas=rango,
+            defaults={
+                'peso_kg': mejor.peso_kg,
+                'repeticiones': mejor.repeticiones,
+                'e1rm': mejor.e1rm,
+                'fecha': mejor.entrenamiento.fecha,
+                'serie': mejor if mejor.pk else None,  # las archivadas no tienen fila
+                'serie_archivada': getattr(mejor, 'id_archivado', None),
+            }
+        )
+
+
+def actualizar_records(series, usuario_id, ejercicio_id):
+    """
+    Compara las series guardadas (todas del mismo ejercicio) con los
+    récords actuales, leídos en una consulta, y solo escribe los que superan.
+    """
+    records = {
+        record.repeticiones_minimas: record
+        for record in RecordPersonal.objects.select_for_update().filter(
+            usuario_id=usuario_id,
+            ejercicio_id=ejercicio_id
+        )
+    }
+
+    cambiados = set()
+    por_recalcular = set()
+    for serie in series:
+        for rango in RANGOS_RECORD:
+            record = records.get(rango)
+            cumple_rango = _cumple_rango(serie, rango)
+
+            if cumple_rango and (record is None or _es_mejor(serie, record, rango)):
+                if record is None:
+                    record = records[rango] = RecordPersonal(
+                        usuario_id=usuario_id, ejercicio_id=ejercicio_id, repeticiones_minimas=rango
+                    )
+                record.peso_kg = serie.peso_kg
+                record.repeticiones = serie.repeticiones
+                record.e1rm = serie.e1rm
+                record.fecha = serie.entrenamiento.fecha
+                record.serie = serie
+                record.serie_archivada = None
+                cambiados.add(rango)
+            elif record is not None and record.serie_id == serie.pk:
+                # Se editó la serie del récord y ya no es la mejor
+                por_recalcular.add(rango)
+
+    for rango in cambiados - por_recalcular:
+        records[rango].save()
+    if RecordPersonal.RANGO_E1RM in cambiados - por_recalcular:
+        record_e1rm_cambiado(usuario_id, ejercicio_id, records[RecordPersonal.RANGO_E1RM].e1rm)
+    if por_recalcular:
+        recalcular_records(usuario_id, ejercicio_id, sorted(por_recalcular))
+
+
+# 📝 EXPLICACIÓN: Ranking de fuerza entre usuarios (gym/ranking.py). Al
+# cambiar el récord de 1RM de alguien o su peso solo se mueve a ese
+# usuario: se cuenta quién queda por delante con los índices (ejercicio,
+# relacion) / (ejercicio, categoria, e1rm) y se corre un puesto a los que
+# adelanta o le adelantan. Todos sus ejercicios a la vez: un cambio de
+# peso cuesta las mismas consultas con 1 ejercicio que con 20. Los empates
+# se deshacen por id de usuario (el más antiguo delante).
+def _por_delante(otros, campo_valor, valores, usuario_id):
+    """{ejercicio_id: cuántos de los demás van por delante con ese valor}, en una consulta"""
+    condicion = reduce(or_, [
+        Q(ejercicio_id=ejercicio_id) & (
+            Q(**{f'{campo_valor}__gt': valor}) | Q(**{campo_valor: valor, 'usuario_id__lt': usuario_id})
+        )
+        for ejercicio_id, valor in valores.items()
+    ])
+    return dict(otros.filter(condicion).order_by().values('ejercicio_id').annotate(
+        delante=Count('id')
+    ).values_list('ejercicio_id', 'delante'))
+
+
+def _recolocar(otros, campo_valor, campo_posicion, usuario_id, cambios):
+    """
+    Ajusta los puestos de `otros` (el ranking sin el usuario) para que, en
+    cada ejercicio de `cambios` ({ejercicio_id: (puesto anterior o None,
+    valor nuevo o None si sale)}), el usuario pase al puesto que le toca.
+    Un UPDATE para todos los ejercicios. Devuelve {ejercicio_id: puesto}.
+    """
+    entran = {ejercicio_id: valor for ejercicio_id, (_, valor) in cambios.items() if valor is not None}
+    delante = _por_delante(otros, campo_valor, entran, usuario_id) if entran else {}
+
+    puestos = {}
+    movimientos = []  # (filas que se mueven, +1 o -1)
+    for ejercicio_id, (anterior, valor) in cambios.items():
+        puesto = None if valor is None else delante.get(ejercicio_id, 0) + 1
+        puestos[ejercicio_id] = puesto
+        del_ejercicio = Q(ejercicio_id=ejercicio_id)
+        if puesto is None:
+            if anterior is not None:
+                movimientos.append((del_ejercicio & Q(**{f'{campo_posicion}__gt': anterior}), -1))
+        elif anterior is None:
+            movimientos.append((del_ejercicio & Q(**{f'{campo_posicion}__gte': puesto}), 1))
+        elif puesto < anterior:
+            # Sube: los que adelanta bajan un puesto
+            movimientos.append((
+                del_ejercicio & Q(**{f'{campo_posicion}__gte': puesto, f'{campo_posicion}__lt': anterior}), 1
+            ))
+        elif puesto > anterior:
+            # Baja: los que le adelantan suben un puesto
+            movimientos.append((
+                del_ejercicio & Q(**{f'{campo_posicion}__gt': anterior, f'{campo_posicion}__lte': puesto}), -1
+            ))
+
+    if movimientos:
+        otros.filter(reduce(or_, [filas for filas, _ in movimientos])).update(**{
+            campo_posicion: F(campo_posicion) + Case(
+                *[When(filas, then=Value(paso)) for filas, paso in movimientos], default=Value(0)
+            )
+        })
+    return puestos
+
+
+def actualizar_rankings(usuario_id, e1rms, peso_corporal):
+    """
+    Coloca al usuario en el ranking de cada ejercicio de `e1rms`
+    ({ejercicio_id: mejor 1RM estimado}); sale de los que tengan None o
+    de todos si no tiene peso corporal.
+    """
+    valido = bool(peso_corporal) and peso_corporal > 0
+    categoria = RankingFuerza.categoria_de(peso_corporal) if valido else None
+    relaciones = {
+        ejercicio_id: round(e1rm / peso_corporal, 3) if valido and e1rm else None
+        for ejercicio_id, e1rm in e1rms.items()
+    }
+
+    with transaction.atomic():
+        filas = {
+            fila.ejercicio_id: fila
+            for fila in RankingFuerza.objects.select_for_update().filter(
+                usuario_id=usuario_id, ejercicio_id__in=list(e1rms)
+            )
+        }
+        cambios = {
+            ejercicio_id: (filas[ejercicio_id].posicion if ejercicio_id in filas else None, relacion)
+            for ejercicio_id, relacion in relaciones.items()
+            if ejercicio_id in filas or relacion is not None
+        }
+        if not cambios:
+            return
+        otros = RankingFuerza.objects.exclude(usuario_id=usuario_id)
+        posiciones = _recolocar(otros, 'relacion', 'posicion', usuario_id, cambios)
+
+        # Quien cambia de categoría (o sale del ranking) deja hueco en la suya
+        salen = {}
+        for ejercicio_id, fila in filas.items():
+            if fila.categoria != categoria or relaciones[ejercicio_id] is None:
+                salen.setdefault(fila.categoria, {})[ejercicio_id] = (fila.posicion_categoria, None)
+        for categoria_anterior, cambios_categoria in salen.items():
+            _recolocar(otros.filter(categoria=categoria_anterior), 'e1rm', 'posicion_categoria',
+                       usuario_id, cambios_categoria)
+
+        entran = {
+            ejercicio_id: (
+                filas[ejercicio_id].posicion_categoria
+                if ejercicio_id in filas and filas[ejercicio_id].categoria == categoria else None,
+                e1rms[ejercicio_id],
+            )
+            for ejercicio_id, relacion in relaciones.items() if relacion is not None
+        }
+        posiciones_categoria = {}
+        if entran:
+            posiciones_categoria = _recolocar(otros.filter(categoria=categoria), 'e1rm', 'posicion_categoria',
+                                              usuario_id, entran)
+
+        # Guardar las filas del usuario
+        RankingFuerza.objects.filter(
+            usuario_id=usuario_id,
+            ejercicio_id__in=[ejercicio_id for ejercicio_id in filas if relaciones[ejercicio_id] is None]
+        ).delete()
+        cambiadas, nuevas = [], []
+        for ejercicio_id, posicion_categoria in posiciones_categoria.items():
+            fila = filas.get(ejercicio_id) or RankingFuerza(usuario_id=usuario_id, ejercicio_id=ejercicio_id)
+            fila.categoria = categoria
+            fila.e1rm = e1rms[ejercicio_id]
+            fila.peso_corporal = peso_corporal
+            fila.relacion = relaciones[ejercicio_id]
+            fila.posicion = posiciones[ejercicio_id]
+            fila.posicion_categoria = posicion_categoria
+            fila.actualizado = timezone.now()
+            (cambiadas if fila.pk else nuevas).append(fila)
+        RankingFuerza.objects.bulk_update(cambiadas, [
+            'categoria', 'e1rm', 'peso_corporal', 'relacion', 'posicion', 'posicion_categoria', 'actualizado'
+        ])
+        RankingFuerza.objects.bulk_create(nuevas)
+
+
+def _peso_corporal(usuario_id):
+    return Perfil.objects.filter(usuario_id=usuario_id).values_list('peso_corporal', flat=True).first()
+
+
+def record_e1rm_cambiado(usuario_id, ejercicio_id, e1rm):
+    """Al cambiar (o borrarse, e1rm=None) el récord de 1RM de un ejercicio"""
+    actualizar_rankings(usuario_id, {ejercicio_id: e1rm}, _peso_corporal(usuario_id))
+
+
+def actualizar_ranking_usuario(usuario_id, peso_corporal=None):
+    """Vuelve a colocar al usuario en todos sus ejercicios (cambio de peso o de récords en bloque)"""
+    if peso_corporal is None:
+        peso_corporal = _peso_corporal(usuario_id)
+    e1rms = dict.fromkeys(RankingFuerza.objects.filter(usuario_id=usuario_id).values_list('ejercicio_id', flat=True))
+    e1rms.update(RecordPersonal.objects.filter(
+        usuario_id=usuario_id, repeticiones_minimas=RecordPersonal.RANGO_E1RM
+    ).values_list('ejercicio_id', 'e1rm'))
+    actualizar_rankings(usuario_id, e1rms, peso_corporal)
+
+
+def reconstruir_rankings(ejercicio=None):
+    """Borra y vuelve a generar los rankings con los récords y pesos actuales"""
+    records = RecordPersonal.objects.filter(
+        repeticiones_minimas=RecordPersonal.RANGO_E1RM,
+        e1rm__gt=0,
+        usuario__perfil__peso_corporal__gt=0,
+    )
+    rankings = RankingFuerza.objects.all()
+    if ejercicio is not None:
+        records = records.filter(ejercicio=ejercicio)
+        rankings = rankings.filter(ejercicio=ejercicio)
+
+    por_ejercicio = {}
+    for usuario_id, ejercicio_id, e1rm, peso_corporal in records.values_list(
+        'usuario_id', 'ejercicio_id', 'e1rm', 'usuario__perfil__peso_corporal'
+    ).iterator(chunk_size=2000):
+        por_ejercicio.setdefault(ejercicio_id, []).append(RankingFuerza(
+            usuario_id=usuario_id,
+            ejercicio_id=ejercicio_id,
+            categoria=RankingFuerza.categoria_de(peso_corporal),
+            e1rm=e1rm,
+            peso_corporal=peso_corporal,
+            relacion=round(e1rm / peso_corporal, 3),
+        ))
+
+    nuevos = []
+    for filas in por_ejercicio.values():
+        filas.sort(key=lambda fila: (-fila.relacion, fila.usuario_id))
+        for posicion, fila in enumerate(filas, start=1):
+            fila.posicion = posicion
+        por_categoria = {}
+        for fila in sorted(filas, key=lambda fila: (-fila.e1rm, fila.usuario_id)):
+            por_categoria[fila.categoria] = fila.posicion_categoria = por_categoria.get(fila.categoria, 0) + 1
+        nuevos.extend(filas)
+
+    with transaction.atomic():
+        rankings.delete()
+        RankingFuerza.objects.bulk_create(nuevos, batch_size=1000)
+    return len(nuevos)
+
+
+# 📝 EXPLICACIÓN: Último rendimiento por ejercicio (sugerencia de carga)
+def _series_rendimiento(entrenamiento_id, ejercicio_id):
+    series = [
+        {'peso': peso, 'reps': reps, 'rpe': rpe, 'e1rm': e1rm}
+        for peso, reps, rpe, e1rm in SerieEjercicio.objects.filter(
+            entrenamiento_id=entrenamiento_id,
+            ejercicio_rutina__ejercicio_id=ejercicio_id
+        ).order_by('numero_serie', 'id').values_list('peso_kg', 'repeticiones', 'rpe', 'e1rm')
+    ]
+    if series:
+        return series
+    # La sesión anterior puede estar archivada (gym/archivo.py)
+    archivadas = sorted(
+        (serie for *_, serie in archivo.filas_archivadas(SesionArchivada.objects.filter(entrenamiento_id=entrenamiento_id))
+         if serie.ejercicio_id == ejercicio_id),
+        key=lambda serie: (serie.numero_serie, serie.id),
+    )
+    return [{'peso': serie.peso_kg, 'reps': serie.repeticiones, 'rpe': serie.rpe, 'e1rm': serie.e1rm} for serie in archivadas]
+
+
+def recalcular_ultimo_rendimiento(usuario_id, ejercicio_id):
+    """Busca la sesión más reciente del ejercicio en los resúmenes (índice usuario, ejercicio, fecha)"""
+    resumen = ResumenSesionEjercicio.objects.filter(
+        usuario_id=usuario_id,
+        ejercicio_id=ejercicio_id
+    ).order_by('-fecha', '-entrenamiento_id').values('entrenamiento_id', 'fecha').first()
+
+    if resumen is None:
+        UltimoRendimiento.objects.filter(usuario_id=usuario_id, ejercicio_id=ejercicio_id).delete()
+        return
+    UltimoRendimiento.objects.update_or_create(
+        usuario_id=usuario_id,
+        ejercicio_id=ejercicio_id,
+        defaults={
+            'entrenamiento_id': resumen['entrenamiento_id'],
+            'fecha': resumen['fecha'],
+            'series': _series_rendimiento(resumen['entrenamiento_id'], ejercicio_id),
+        }
+    )
+
+
+def actualizar_ultimo_rendimiento(entrenamiento, ejercicio_id):
+    """
+    Tras cambiar las series de un ejercicio en una sesión. Si hay una
+    sesión más reciente con ese ejercicio no hace falta tocar nada.
+    """
+    ultimo = UltimoRendimiento.objects.filter(
+        usuario_id=entrenamiento.usuario_id,
+        ejercicio_id=ejercicio_id
+    ).first()
+    if ultimo is not None and ultimo.entrenamiento_id not in (None, entrenamiento.id):
+        if (ultimo.fecha, ultimo.entrenamiento_id) > (entrenamiento.fecha, entrenamiento.id):
+            return
+
+    series = _series_rendimiento(entrenamiento.id, ejercicio_id)
+    if not series or (ultimo is not None and ultimo.entrenamiento_id is None):
+        # Se borraron sus series (o la sesión guardada): vale la anterior
+        recalcular_ultimo_rendimiento(entrenamiento.usuario_id, ejercicio_id)
+        return
+
+    if ultimo is None:
+        ultimo = UltimoRendimiento(usuario_id=entrenamiento.usuario_id, ejercicio_id=ejercicio_id)
+    ultimo.entrenamiento = entrenamiento
+    ultimo.fecha = entrenamiento.fecha
+    ultimo.series = series
+    ultimo.save()
+
+
+def _ejercicio_de(ejercicio_rutina_id):
+    return EjercicioRutina.objects.filter(
+        id=ejercicio_rutina_id
+    ).values_list('ejercicio_id', flat=True).first()
+
+
+def serie_guardada(serie, creada):
+    """Actualiza los agregados tras crear o editar una serie"""
+    entrenamiento = serie.entrenamiento
+    # Una serie nueva en una sesión archivada: vuelven todas a SerieEjercicio
+    archivo.reabrir([entrenamiento])
+    ejercicio_id = serie.ejercicio_rutina.ejercicio_id
+    volumen = serie.peso_kg * serie.repeticiones
+
+    with transaction.atomic():
+        actualizar_resumen_sesion(entrenamiento, ejercicio_id)
+        actualizar_records([serie], entrenamiento.usuario_id, ejercicio_id)
+        actualizar_ultimo_rendimiento(entrenamiento, ejercicio_id)
+        if creada:
+            _sumar_series(entrenamiento.usuario_id, 1, volumen)
+        elif volumen != serie._volumen_original:
+            _sumar_series(entrenamiento.usuario_id, 0, volumen - serie._volumen_original)
+
+        # Si la edición movió la serie a otra sesión/ejercicio, lo viejo también cambia
+        entrenamiento_id, ejercicio_rutina_id = serie._par_original
+        if entrenamiento_id is None:
+            return
+        if (entrenamiento_id, ejercicio_rutina_id) != (serie.entrenamiento_id, serie.ejercicio_rutina_id):
+            ejercicio_anterior_id = _ejercicio_de(ejercicio_rutina_id)
+            entrenamiento_anterior = Entrenamiento.objects.filter(id=entrenamiento_id).first()
+            if ejercicio_anterior_id and entrenamiento_anterior:
+                actualizar_resumen_sesion(entrenamiento_anterior, ejercicio_anterior_id)
+                actualizar_ultimo_rendimiento(entrenamiento_anterior, ejercicio_anterior_id)
+                if ejercicio_anterior_id != ejercicio_id:
+                    recalcular_records(entrenamiento_anterior.usuario_id, ejercicio_anterior_id)
+
+
+def serie_eliminada(serie):
+    """Actualiza los agregados tras borrar una serie"""
+    entrenamiento = Entrenamiento.objects.filter(id=serie.entrenamiento_id).first()
+    ejercicio_id = _ejercicio_de(serie.ejercicio_rutina_id)
+
+    # Borrado en cascada del entrenamiento o del ejercicio → sus resúmenes caen con él
+    if entrenamiento is None or ejercicio_id is None:
+        return
+
+    with transaction.atomic():
+        actualizar_resumen_sesion(entrenamiento, ejercicio_id)
+        actualizar_ultimo_rendimiento(entrenamiento, ejercicio_id)
+        _sumar_series(entrenamiento.usuario_id, -1, -(serie.peso_kg * serie.repeticiones))
+
+        # El borrado deja serie=NULL (SET_NULL) en los récords que apuntaban
+        # a ella; los de series archivadas tienen su id en serie_archivada
+        rangos = list(RecordPersonal.objects.filter(
+            usuario_id=entrenamiento.usuario_id,
+            ejercicio_id=ejercicio_id,
+            serie__isnull=True,
+            serie_archivada__isnull=True
+        ).values_list('repeticiones_minimas', flat=True))
+        if rangos:
+            recalcular_records(entrenamiento.usuario_id, ejercicio_id, rangos)
+
+
+def series_creadas_en_lote(entrenamiento, series):
+    """
+    Equivalente a serie_guardada() para series insertadas con bulk_create,
+    que no dispara señales. Agrupa por ejercicio: el coste depende de
+    cuántos ejercicios hay en el lote, no de cuántas series.
+    """
+    if not series:
+        return
+    archivo.reabrir([entrenamiento])
+
+    ejercicio_de = dict(EjercicioRutina.objects.filter(
+        id__in={serie.ejercicio_rutina_id for serie in series}
+    ).values_list('id', 'ejercicio_id'))
+
+    por_ejercicio = {}
+    for serie in series:
+        por_ejercicio.setdefault(ejercicio_de[serie.ejercicio_rutina_id], []).append(serie)
+
+    with transaction.atomic():
+        for ejercicio_id, series_ejercicio in por_ejercicio.items():
+            actualizar_resumen_sesion(entrenamiento, ejercicio_id)
+            actualizar_records(series_ejercicio, entrenamiento.usuario_id, ejercicio_id)
+            actualizar_ultimo_rendimiento(entrenamiento, ejercicio_id)
+        _sumar_series(
+            entrenamiento.usuario_id,
+            len(series),
+            sum(serie.peso_kg * serie.repeticiones for serie in series)
+        )
+    cache_progreso.invalidar_usuario(entrenamiento.usuario_id)
+
+
+# 📝 EXPLICACIÓN: Reconstrucción completa (comando reconstruir_agregados)
+# Las series archivadas (gym/archivo.py) se suman en Python a lo que
+# agrupa la base de datos con las series normales
+def _archivadas(usuario):
+    sesiones = SesionArchivada.objects.all()
+    if usuario is not None:
+        sesiones = sesiones.filter(entrenamiento__usuario=usuario)
+    return sesiones
+
+
+def _resumenes_archivados(usuario):
+    """Resúmenes de las sesiones archivadas, en el formato de los de la consulta agrupada"""
+    resumenes = {}
+    for entrenamiento_id, usuario_id, fecha, serie in archivo.filas_archivadas(_archivadas(usuario)):
+        fila = resumenes.get((entrenamiento_id, serie.ejercicio_id))
+        if fila is None:
+            fila = resumenes[entrenamiento_id, serie.ejercicio_id] = {
+                'entrenamiento_id': entrenamiento_id,
+                'entrenamiento__usuario_id': usuario_id,
+                'entrenamiento__fecha': fecha,
+                'ejercicio_rutina__ejercicio_id': serie.ejercicio_id,
+                'peso_maximo': serie.peso_kg, 'reps_totales': 0, 'series_completadas': 0,
+                'volumen_total': 0, 'e1rm_maximo': None,
+            }
+        fila['peso_maximo'] = max(fila['peso_maximo'], serie.peso_kg)
+        fila['reps_totales'] += serie.repeticiones
+        fila['series_completadas'] += 1
+        fila['volumen_total'] += serie.peso_kg * serie.repeticiones
+        if serie.e1rm is not None:
+            fila['e1rm_maximo'] = max(fila['e1rm_maximo'] or 0, serie.e1rm)
+    return resumenes.values()
+
+
+def reconstruir_resumenes(usuario=None):
+    """
+    Borra y vuelve a generar los resúmenes con una sola consulta agrupada.
+    Devuelve cuántos resúmenes se crearon.
+    """
+    resumenes = ResumenSesionEjercicio.objects.all()
+    series = SerieEjercicio.objects.all()
+    if usuario is not None:
+        resumenes = resumenes.filter(usuario=usuario)
+        series = series.filter(entrenamiento__usuario=usuario)
+
+    filas = series.values(
+        'entrenamiento_id',
+        'entrenamiento__usuario_id',
+        'entrenamiento__fecha',
+        'ejercicio_rutina__ejercicio_id',
+    ).annotate(
+        peso_maximo=Max('peso_kg'),
+        reps_totales=Sum('repeticiones'),
+        series_completadas=Count('id'),
+        volumen_total=Sum(F('peso_kg') * F('repeticiones'), output_field=FloatField()),
+        e1rm_maximo=Max('e1rm'),
+    ).order_by()
+
+    nuevos = [
+        ResumenSesionEjercicio(
+            usuario_id=fila['entrenamiento__usuario_id'],
+            entrenamiento_id=fila['entrenamiento_id'],
+            ejercicio_id=fila['ejercicio_rutina__ejercicio_id'],
+            fecha=fila['entrenamiento__fecha'],
+            peso_maximo=fila['peso_maximo'],
+            reps_totales=fila['reps_totales'],
+            series_completadas=fila['series_completadas'],
+            volumen_total=fila['volumen_total'],
+            e1rm_maximo=fila['e1rm_maximo'],
+        )
+        for fila in chain(filas.iterator(), _resumenes_archivados(usuario))
+    ]
+
+    with transaction.atomic():
+        resumenes.delete()
+        ResumenSesionEjercicio.objects.bulk_create(nuevos, batch_size=1000)
+    return len(nuevos)
+
+
+def reconstruir_records(usuario=None):
+    """
+    Regenera el libro de PRs recorriendo las series ya ordenadas de mejor
+    a peor por (usuario, ejercicio): una pasada por peso y otra por 1RM
+    estimado.
+    """
+    records = RecordPersonal.objects.all()
+    series = SerieEjercicio.objects.all()
+    if usuario is not None:
+        records = records.filter(usuario=usuario)
+        series = series.filter(entrenamiento__usuario=usuario)
+
+    campos = ['id', 'entrenamiento__usuario_id', 'ejercicio_rutina__ejercicio_id',
+              'peso_kg', 'repeticiones', 'e1rm', 'entrenamiento__fecha']
+    filas = series.values_list(*campos).order_by(
+        'entrenamiento__usuario_id',
+        'ejercicio_rutina__ejercicio_id',
+        '-peso_kg',
+        '-repeticiones',
+        'entrenamiento__fecha',
+        'id',
+    )
+
+    nuevos = []
+    clave_actual = None
+    pendientes = []
+    for serie_id, usuario_id, ejercicio_id, peso, reps, e1rm, fecha in filas.iterator():
+        if (usuario_id, ejercicio_id) != clave_actual:
+            clave_actual = (usuario_id, ejercicio_id)
+            pendientes = [0] + RecordPersonal.RANGOS_REPETICIONES
+        # La primera serie que cumple cada rango es la mejor de ese rango
+        for rango in [r for r in pendientes if reps >= r]:
+            pendientes.remove(rango)
+            nuevos.append(RecordPersonal(
+                usuario_id=usuario_id,
+                ejercicio_id=ejercicio_id,
+                repeticiones_minimas=rango,
+                peso_kg=peso,
+                repeticiones=reps,
+                e1rm=e1rm,
+                fecha=fecha,
+                serie_id=serie_id,
+            ))
+
+    # Segunda pasada para el 1RM estimado, ordenada por e1rm
+    filas = series.filter(e1rm__isnull=False).values_list(*campos).order_by(
+        'entrenamiento__usuario_id',
+        'ejercicio_rutina__ejercicio_id',
+        '-e1rm',
+        'entrenamiento__fecha',
+        'id',
+    )
+    clave_actual = None
+    for serie_id, usuario_id, ejercicio_id, peso, reps, e1rm, fecha in filas.iterator():
+        if (usuario_id, ejercicio_id) == clave_actual:
+            continue
+        clave_actual = (usuario_id, ejercicio_id)
+        nuevos.append(RecordPersonal(
+            usuario_id=usuario_id,
+            ejercicio_id=ejercicio_id,
+            repeticiones_minimas=RecordPersonal.RANGO_E1RM,
+            peso_kg=peso,
+            repeticiones=reps,
+            e1rm=e1rm,
+            fecha=fecha,
+            serie_id=serie_id,
+        ))
+
+    # Las series archivadas ganan si son mejores (a igualdad, la más antigua)
+    mejores = {(record.usuario_id, record.ejercicio_id, record.repeticiones_minimas): record for record in nuevos}
+    for _, usuario_id, fecha, serie in archivo.filas_archivadas(_archivadas(usuario)):
+        for rango in RANGOS_RECORD:
+            if not _cumple_rango(serie, rango):
+                continue
+            clave = (usuario_id, serie.ejercicio_id, rango)
+            actual = mejores.get(clave)
+            if actual is None or _orden_record(rango, serie.peso_kg, serie.repeticiones, serie.e1rm, fecha) > _orden_record(
+                rango, actual.peso_kg, actual.repeticiones, actual.e1rm, actual.fecha
+            ):
+                mejores[clave] = RecordPersonal(
+                    usuario_id=usuario_id, ejercicio_id=serie.ejercicio_id, repeticiones_minimas=rango,
+                    peso_kg=serie.peso_kg, repeticiones=serie.repeticiones, e1rm=serie.e1rm, fecha=fecha,
+                    serie_archivada=serie.id,
+                )
+    nuevos = list(mejores.values())
+
+    with transaction.atomic():
+        records.delete()
+        RecordPersonal.objects.bulk_create(nuevos, batch_size=1000)
+    return len(nuevos)
+
+
+def reconstruir_ultimos_rendimientos(usuario=None):
+    """
+    Regenera el último rendimiento de cada (usuario, ejercicio): la sesión
+    más reciente sale de los resúmenes, así que hay que reconstruirlos antes.
+    """
+    ultimos = UltimoRendimiento.objects.all()
+    resumenes = ResumenSesionEjercicio.objects.all()
+    if usuario is not None:
+        ultimos = ultimos.filter(usuario=usuario)
+        resumenes = resumenes.filter(usuario=usuario)
+
+    # La primera fila de cada (usuario, ejercicio) es su sesión más reciente
+    nuevos = {}
+    for usuario_id, ejercicio_id, entrenamiento_id, fecha in resumenes.values_list(
+        'usuario_id', 'ejercicio_id', 'entrenamiento_id', 'fecha'
+    ).order_by('usuario_id', 'ejercicio_id', '-fecha', '-entrenamiento_id').iterator():
+        if (usuario_id, ejercicio_id) not in nuevos:
+            nuevos[usuario_id, ejercicio_id] = UltimoRendimiento(
+                usuario_id=usuario_id, ejercicio_id=ejercicio_id,
+                entrenamiento_id=entrenamiento_id, fecha=fecha, series=[],
+            )
+
+    # Las series de esas sesiones, en tandas (SQLite limita los parámetros por consulta)
+    por_sesion = {(ultimo.entrenamiento_id, ultimo.ejercicio_id): ultimo for ultimo in nuevos.values()}
+    sesiones = sorted({entrenamiento_id for entrenamiento_id, _ in por_sesion})
+    for inicio in range(0, len(sesiones), 500):
+        series = SerieEjercicio.objects.filter(
+            entrenamiento_id__in=sesiones[inicio:inicio + 500]
+        ).values_list(
+            'entrenamiento_id', 'ejercicio_rutina__ejercicio_id', 'peso_kg', 'repeticiones', 'rpe', 'e1rm'
+        ).order_by('numero_serie', 'id')
+        for entrenamiento_id, ejercicio_id, peso, reps, rpe, e1rm in series:
+            ultimo = por_sesion.get((entrenamiento_id, ejercicio_id))
+            if ultimo is not None:
+                ultimo.series.append({'peso': peso, 'reps': reps, 'rpe': rpe, 'e1rm': e1rm})
+
+    # Las que se quedaron sin series son sesiones archivadas
+    sin_series = sorted({ultimo.entrenamiento_id for ultimo in nuevos.values() if not ultimo.series})
+    for inicio in range(0, len(sin_series), 500):
+        archivadas = SesionArchivada.objects.filter(entrenamiento_id__in=sin_series[inicio:inicio + 500])
+        filas = sorted(archivo.filas_archivadas(archivadas), key=lambda fila: (fila[3].numero_serie, fila[3].id))
+        for entrenamiento_id, _, _, serie in filas:
+            ultimo = por_sesion.get((entrenamiento_id, serie.ejercicio_id))
+            if ultimo is not None:
+                ultimo.series.append({'peso': serie.peso_kg, 'reps': serie.repeticiones, 'rpe': serie.rpe, 'e1rm': serie.e1rm})
+
+    with transaction.atomic():
+        ultimos.delete()
+        UltimoRendimiento.objects.bulk_create(nuevos.values(), batch_size=1000)
+    return len(nuevos)
+
+
+def reconstruir_estadisticas(usuario=None):
+    """
+    Recalcula los contadores de cada usuario con consultas agrupadas.
+    Devuelve (usuarios procesados, filas que estaban desviadas).
+    Usa los resúmenes para el ejercicio más frecuente, así que hay que
+    reconstruirlos antes.
+    """
+    entrenamientos = Entrenamiento.objects.all()
+    series = SerieEjercicio.objects.all()
+    if usuario is not None:
+        entrenamientos = entrenamientos.filter(usuario=usuario)
+        series = series.filter(entrenamiento__usuario=usuario)
+
+    calculadas = {}
+    for fila in entrenamientos.values('usuario_id').annotate(
+        total=Count('id'), primera=Min('fecha'), ultima=Max('fecha')
+    ).order_by():
+        calculadas[fila['usuario_id']] = EstadisticasUsuario(
+            usuario_id=fila['usuario_id'],
+            total_entrenamientos=fila['total'],
+            primera_fecha=fila['primera'],
+            ultima_fecha=fila['ultima'],
+        )
+
+    for fila in series.values('entrenamiento__usuario_id').annotate(
+        total=Count('id'),
+        volumen=Sum(F('peso_kg') * F('repeticiones'), output_field=FloatField()),
+    ).order_by():
+        estadisticas = calculadas[fila['entrenamiento__usuario_id']]
+        estadisticas.total_series = fila['total']
+        estadisticas.volumen_total = fila['volumen'] or 0
+
+    # Las sesiones archivadas guardan sus totales
+    for fila in _archivadas(usuario).values('entrenamiento__usuario_id').annotate(
+        total=Sum('series_totales'), volumen=Sum('volumen_total'),
+    ).order_by():
+        estadisticas = calculadas[fila['entrenamiento__usuario_id']]
+        estadisticas.total_series += fila['total']
+        estadisticas.volumen_total += fila['volumen']
+
+    # Ejercicio más frecuente: el primero de cada usuario en este orden
+    frecuencias = ResumenSesionEjercicio.objects.filter(
+        usuario_id__in=list(calculadas)
+    ).values('usuario_id', 'ejercicio_id').annotate(
+        sesiones=Count('id')
+    ).order_by('usuario_id', '-sesiones', 'ejercicio_id')
+    for fila in frecuencias:
+        estadisticas = calculadas[fila['usuario_id']]
+        if estadisticas.ejercicio_frecuente_id is None:
+            estadisticas.ejercicio_frecuente_id = fila['ejercicio_id']
+
+    campos = ['total_entrenamientos', 'total_series', 'volumen_total',
+              'primera_fecha', 'ultima_fecha', 'ejercicio_frecuente_id']
+    existentes = EstadisticasUsuario.objects.all()
+    if usuario is not None:
+        existentes = existentes.filter(usuario=usuario)
+
+    with transaction.atomic():
+        desviadas = 0
+        for actual in existentes.select_for_update():
+            nueva = calculadas.get(actual.usuario_id, EstadisticasUsuario(usuario_id=actual.usuario_id))
+            if any(getattr(actual, campo) != getattr(nueva, campo) for campo in campos):
+                desviadas += 1
+        existentes.delete()
+        EstadisticasUsuario.objects.bulk_create(calculadas.values(), batch_size=1000)
+    return len(calculadas), desviadas
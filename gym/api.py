@@ -0,0 +1,329 @@
+"""
+API JSON para clientes offline (app móvil).
+
+GET  api/sync/?desde=<marca>  → filas cambiadas desde la última sincronización
+POST api/sync/subir/          → entrenamientos y series en cola, en lotes
+
+El cliente registra las series en local y sincroniza de vez en cuando;
+cada fila subida lleva una `clave` generada por el cliente (p. ej. un UUID)
+para que reintentar un lote no duplique nada. Autenticación por sesión de
+Django: los POST necesitan la cabecera X-CSRFToken.
+"""
+import json
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_GET, require_POST
+
+from . import agregados, archivo
+from .models import (
+    Ejercicio, EjercicioRutina, Entrenamiento, RegistroEliminado, Rutina, SerieEjercicio, SesionArchivada,
+)
+from .sqlite import reintentar_si_bloqueada
+
+# Máximo de filas (entrenamientos + series) por petición de subida
+MAXIMO_LOTE = 500
+
+CAMPOS_EJERCICIO = ['id', 'nombre', 'descripcion', 'grupo_muscular', 'imagen']
+CAMPOS_RUTINA = ['id', 'nombre', 'descripcion', 'activa', 'fecha_actualizacion']
+CAMPOS_EJERCICIO_RUTINA = ['id', 'rutina_id', 'ejercicio_id', 'series', 'repeticiones', 'descanso', 'orden', 'actualizado']
+CAMPOS_ENTRENAMIENTO = ['id', 'clave_cliente', 'rutina_id', 'fecha', 'duracion_minutos', 'notas', 'actualizado']
+CAMPOS_SERIE = ['id', 'clave_cliente', 'entrenamiento_id', 'ejercicio_rutina_id', 'numero_serie',
+                'peso_kg', 'repeticiones', 'rpe', 'e1rm', 'actualizado']
+
+
+def api_login_required(vista):
+    """Como login_required, pero responde 401 en JSON en vez de redirigir"""
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'No autenticado'}, status=401)
+        return vista(request, *args, **kwargs)
+    return envoltura
+
+
+def _leer_marca(valor):
+    """Fecha ISO 8601, o None si no lo es (o es imposible, como 2025-13-40)"""
+    # En una URL sin codificar el '+' de la zona horaria llega como espacio
+    try:
+        return parse_datetime(valor.replace(' ', '+'))
+    except ValueError:
+        return None
+
+
+# 📝 EXPLICACIÓN: Descarga de cambios (delta)
+@require_GET
+@api_login_required
+def api_sync(request):
+    """
+    Devuelve las filas del usuario cambiadas desde `desde` (todas si no se
+    indica) y una `marca` nueva que el cliente guarda para la próxima vez.
+    """
+    # La marca se toma antes de consultar: lo que cambie durante la
+    # consulta vuelve a llegar la próxima vez (el cliente deduplica por id)
+    marca = timezone.now()
+
+    desde = None
+    if request.GET.get('desde'):
+        desde = _leer_marca(request.GET['desde'])
+        if desde is None:
+            return JsonResponse({'error': 'Marca "desde" inválida'}, status=400)
+
+    ejercicios = Ejercicio.objects.all()
+    rutinas = Rutina.objects.filter(usuario=request.user)
+    ejercicios_rutina = EjercicioRutina.objects.filter(rutina__usuario=request.user)
+    entrenamientos = Entrenamiento.objects.filter(usuario=request.user)
+    series = SerieEjercicio.objects.filter(entrenamiento__usuario=request.user)
+    archivadas = SesionArchivada.objects.filter(entrenamiento__usuario=request.user)
+    eliminados = RegistroEliminado.objects.filter(usuario_id=request.user.id)
+
+    if desde:
+        ejercicios = ejercicios.filter(fecha_creacion__gte=desde)
+        rutinas = rutinas.filter(fecha_actualizacion__gte=desde)
+        ejercicios_rutina = ejercicios_rutina.filter(actualizado__gte=desde)
+        entrenamientos = entrenamientos.filter(actualizado__gte=desde)
+        series = series.filter(actualizado__gte=desde)
+        # Una sesión archivada antes de `desde` no tiene series cambiadas después
+        archivadas = archivadas.filter(archivada__gte=desde)
+        eliminados = eliminados.filter(fecha__gte=desde)
+
+    # Las series archivadas (gym/archivo.py) salen igual que las demás
+    filas_series = list(series.order_by('id').values(*CAMPOS_SERIE))
+    filas_series += [
+        {'id': serie.id, 'clave_cliente': serie.clave_cliente, 'entrenamiento_id': entrenamiento_id,
+         'ejercicio_rutina_id': serie.ejercicio_rutina_id, 'numero_serie': serie.numero_serie,
+         'peso_kg': serie.peso_kg, 'repeticiones': serie.repeticiones, 'rpe': serie.rpe, 'e1rm': serie.e1rm,
+         'actualizado': serie.actualizado}
+        for entrenamiento_id, _, _, serie in archivo.filas_archivadas(archivadas)
+        if desde is None or serie.actualizado >= desde
+    ]
+    filas_series.sort(key=lambda fila: fila['id'])
+
+    return JsonResponse({
+        'marca': marca.isoformat(),
+        'ejercicios': list(ejercicios.order_by('id').values(*CAMPOS_EJERCICIO)),
+        'rutinas': list(rutinas.order_by('id').values(*CAMPOS_RUTINA)),
+        'ejercicios_rutina': list(ejercicios_rutina.order_by('id').values(*CAMPOS_EJERCICIO_RUTINA)),
+        'entrenamientos': list(entrenamientos.order_by('id').values(*CAMPOS_ENTRENAMIENTO)),
+        'series': filas_series,
+        'eliminados': list(eliminados.order_by('id').values('modelo', 'objeto_id')),
+    })
+
+
+# 📝 EXPLICACIÓN: Validación de los datos que manda el cliente
+class DatosInvalidos(Exception):
+    pass
+
+
+def _numero(fila, campo, tipo, minimo, maximo, obligatorio=True):
+    valor = fila.get(campo)
+    if valor is None:
+        if obligatorio:
+            raise DatosInvalidos(f'Falta "{campo}"')
+        return None
+    try:
+        valor = tipo(valor)
+    except (TypeError, ValueError):
+        raise DatosInvalidos(f'"{campo}" no es un número')
+    if not minimo <= valor <= maximo:
+        raise DatosInvalidos(f'"{campo}" fuera de rango ({minimo}-{maximo})')
+    return valor
+
+
+def _id(fila, campo):
+    """Id que referencia el cliente: un entero o nada (una lista o un objeto no sirven de clave)"""
+    valor = fila.get(campo)
+    if valor is not None and (isinstance(valor, bool) or not isinstance(valor, int)):
+        raise DatosInvalidos(f'"{campo}" tiene que ser un id numérico')
+    return valor
+
+
+def _clave(fila):
+    clave = fila.get('clave')
+    if not isinstance(clave, str) or not 0 < len(clave) <= 64:
+        raise DatosInvalidos('Cada fila necesita una "clave" de 1 a 64 caracteres')
+    return clave
+
+
+def _claves_existentes(modelo, claves, usuario, campo_usuario):
+    """clave → id de las filas que ya se subieron antes (reintento)"""
+    existentes = {}
+    for clave, objeto_id, usuario_id in modelo.objects.filter(
+        clave_cliente__in=claves
+    ).values_list('clave_cliente', 'id', campo_usuario):
+        if usuario_id != usuario.id:
+            raise DatosInvalidos(f'La clave {clave} ya está en uso')
+        existentes[clave] = objeto_id
+    return existentes
+
+
+def _preparar_entrenamientos(usuario, filas):
+    claves = [_clave(fila) for fila in filas]
+    rutina_ids = [_id(fila, 'rutina_id') for fila in filas]
+    existentes = _claves_existentes(Entrenamiento, claves, usuario, 'usuario_id')
+    rutinas = set(Rutina.objects.filter(
+        usuario=usuario,
+        id__in=[rutina_id for rutina_id in rutina_ids if rutina_id is not None]
+    ).values_list('id', flat=True))
+
+    nuevos = []
+    for clave, rutina_id, fila in zip(claves, rutina_ids, filas):
+        if clave in existentes:
+            continue
+        if rutina_id not in rutinas:
+            raise DatosInvalidos(f'Entrenamiento {clave}: rutina desconocida')
+        fecha = timezone.now()
+        if fila.get('fecha'):
+            fecha = _leer_marca(str(fila['fecha']))
+            if fecha is None:
+                raise DatosInvalidos(f'Entrenamiento {clave}: fecha inválida')
+        nuevos.append(Entrenamiento(
+            usuario=usuario,
+            rutina_id=rutina_id,
+            fecha=fecha,
+            duracion_minutos=_numero(fila, 'duracion_minutos', int, 0, 1440, obligatorio=False) or 0,
+            notas=str(fila.get('notas', '')),
+            clave_cliente=clave,
+        ))
+    return existentes, nuevos
+
+
+def _preparar_series(usuario, filas, entrenamientos_por_clave):
+    claves = [_clave(fila) for fila in filas]
+    for fila in filas:
+        if not isinstance(fila.get('entrenamiento_clave'), (str, type(None))):
+            raise DatosInvalidos('"entrenamiento_clave" tiene que ser texto')
+    entrenamiento_ids = [_id(fila, 'entrenamiento_id') for fila in filas]
+    ejercicio_rutina_ids = [_id(fila, 'ejercicio_rutina_id') for fila in filas]
+    existentes = _claves_existentes(SerieEjercicio, claves, usuario, 'entrenamiento__usuario_id')
+
+    # Entrenamientos referidos por id (los nuevos del lote van por clave)
+    entrenamientos = Entrenamiento.objects.filter(
+        usuario=usuario,
+        id__in=[entrenamiento_id for entrenamiento_id in entrenamiento_ids if entrenamiento_id is not None]
+    ).in_bulk()
+    for entrenamiento in entrenamientos_por_clave.values():
+        entrenamientos[entrenamiento.id] = entrenamiento
+
+    nuevas = []
+    for clave, entrenamiento_id, ejercicio_rutina_id, fila in zip(claves, entrenamiento_ids, ejercicio_rutina_ids, filas):
+        if clave in existentes:
+            continue
+        if fila.get('entrenamiento_clave') in entrenamientos_por_clave:
+            entrenamiento = entrenamientos_por_clave[fila['entrenamiento_clave']]
+        else:
+            entrenamiento = entrenamientos.get(entrenamiento_id)
+        if entrenamiento is None:
+            raise DatosInvalidos(f'Serie {clave}: entrenamiento desconocido')
+        nuevas.append(SerieEjercicio(
+            entrenamiento=entrenamiento,
+            ejercicio_rutina_id=ejercicio_rutina_id,
+            numero_serie=_numero(fila, 'numero_serie', int, 1, 100, obligatorio=False) or 0,
+            peso_kg=_numero(fila, 'peso_kg', float, 0, 1000),
+            repeticiones=_numero(fila, 'repeticiones', int, 0, 1000),
+            rpe=_numero(fila, 'rpe', int, 1, 10, obligatorio=False),
+            clave_cliente=clave,
+        ))
+        nuevas[-1].calcular_e1rm()  # bulk_create no pasa por save()
+
+    # Seguridad: cada serie tiene que ser de un ejercicio de la rutina de su entrenamiento
+    validos = set(EjercicioRutina.objects.filter(
+        rutina_id__in={serie.entrenamiento.rutina_id for serie in nuevas}
+    ).values_list('id', 'rutina_id'))
+    for serie in nuevas:
+        if (serie.ejercicio_rutina_id, serie.entrenamiento.rutina_id) not in validos:
+            raise DatosInvalidos(f'Serie {serie.clave_cliente}: ejercicio fuera de la rutina')
+    return existentes, nuevas
+
+
+def _numerar_series(nuevas):
+    """Las series que llegan sin numero_serie van detrás de las que ya hay"""
+    sin_numero = [serie for serie in nuevas if not serie.numero_serie]
+    if not sin_numero:
+        return
+    hechas = {}
+    for fila in SerieEjercicio.objects.filter(
+        entrenamiento_id__in={serie.entrenamiento.id for serie in sin_numero if serie.entrenamiento.id}
+    ).values('entrenamiento_id', 'ejercicio_rutina_id').annotate(total=Count('id')).order_by():
+        hechas[(fila['entrenamiento_id'], fila['ejercicio_rutina_id'])] = fila['total']
+    for serie in nuevas:
+        par = (serie.entrenamiento.id, serie.ejercicio_rutina_id)
+        hechas[par] = hechas.get(par, 0) + 1
+        if not serie.numero_serie:
+            serie.numero_serie = hechas[par]
+
+
+# 📝 EXPLICACIÓN: Subida de la cola del cliente
+@require_POST
+@api_login_required
+@reintentar_si_bloqueada
+def api_subir(request):
+    """
+    Recibe {"entrenamientos": [...], "series": [...]} y lo guarda todo o
+    nada. Las claves que ya existían se ignoran y se devuelven con su id,
+    así un reintento tras un corte de red es seguro.
+    """
+    try:
+        datos = json.loads(request.body)
+        filas_entrenamientos = datos.get('entrenamientos', [])
+        filas_series = datos.get('series', [])
+        if not isinstance(filas_entrenamientos, list) or not isinstance(filas_series, list):
+            raise ValueError
+        if not all(isinstance(fila, dict) for fila in filas_entrenamientos + filas_series):
+            raise ValueError
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'JSON inválido'}, status=400)
+
+    if len(filas_entrenamientos) + len(filas_series) > MAXIMO_LOTE:
+        return JsonResponse({'error': f'Máximo {MAXIMO_LOTE} filas por lote'}, status=413)
+
+    try:
+        with transaction.atomic():
+            entrenamientos_existentes, nuevos_entrenamientos = _preparar_entrenamientos(
+                request.user, filas_entrenamientos
+            )
+            Entrenamiento.objects.bulk_create(nuevos_entrenamientos)
+            agregados.entrenamientos_creados_en_lote(request.user.id, nuevos_entrenamientos)
+
+            # Entrenamientos del lote (nuevos y reintentados) por clave
+            entrenamientos_por_clave = {e.clave_cliente: e for e in nuevos_entrenamientos}
+            entrenamientos_por_clave.update(
+                (e.clave_cliente, e) for e in Entrenamiento.objects.filter(id__in=entrenamientos_existentes.values())
+            )
+
+            series_existentes, nuevas_series = _preparar_series(
+                request.user, filas_series, entrenamientos_por_clave
+            )
+            # Las series archivadas también cuentan al numerar
+            archivo.reabrir({serie.entrenamiento.id: serie.entrenamiento for serie in nuevas_series}.values())
+            _numerar_series(nuevas_series)
+            SerieEjercicio.objects.bulk_create(nuevas_series)
+
+            # bulk_create no dispara señales: agregados y cursor a mano
+            por_entrenamiento = {}
+            for serie in nuevas_series:
+                por_entrenamiento.setdefault(serie.entrenamiento.id, []).append(serie)
+            for series in por_entrenamiento.values():
+                agregados.series_creadas_en_lote(series[0].entrenamiento, series)
+            for entrenamiento in {serie.entrenamiento.id: serie.entrenamiento for serie in nuevas_series}.values():
+                entrenamiento.iniciar_cursor()
+    except DatosInvalidos as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    except IntegrityError:
+        # Dos subidas simultáneas con la misma clave: el cliente reintenta
+        return JsonResponse({'error': 'Conflicto, reintenta el lote'}, status=409)
+
+    return JsonResponse({
+        'entrenamientos': {
+            **entrenamientos_existentes,
+            **{e.clave_cliente: e.id for e in nuevos_entrenamientos},
+        },
+        'series': {
+            **series_existentes,
+            **{s.clave_cliente: s.id for s in nuevas_series},
+        },
+    })
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class GymConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gym'
+    
+    def ready(self):
+        # Conectar las señales que mantienen los agregados precalculados
+        from . import signals  # noqa: F401
+        # PRAGMA de SQLite en cada conexión nueva (perfil de producción)
+        from . import sqlite  # noqa: F401
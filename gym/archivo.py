@@ -0,0 +1,328 @@
+"""
+Archivo de sesiones antiguas (historial frío).
+
+Casi todas las series tienen más de un año y solo se leen ya agregadas
+(resúmenes, récords, estadísticas), pero cada una ocupa una fila de
+SerieEjercicio más su entrada en cada índice (entrenamiento,
+ejercicio_rutina, clave_cliente, actualizado). archivar() empaqueta las
+series de cada sesión anterior a GYM_ARCHIVO_DIAS en una sola fila
+SesionArchivada:
+
+- `datos`: las series columna a columna (struct, little-endian: ids,
+  ejercicio_rutina, ejercicio, número, peso, reps, RPE, 1RM, actualizado)
+  más las claves de cliente en JSON, todo comprimido con zlib,
+- `series_totales` y `volumen_total`, que es lo que muestra el historial.
+
+El Entrenamiento se queda (con archivado=True) y sus resúmenes, récords y
+estadísticas no cambian: el progreso se lee igual que antes. Los récords
+de una serie archivada guardan su id en RecordPersonal.serie_archivada:
+borrar otra serie del ejercicio no obliga a buscarlos de nuevo. Lo que
+necesita las series una a una (resumen de la sesión, exportar,
+sincronización, reconstruir agregados, buscar un récord) lee también las
+archivadas con filas_archivadas() / series_de(). Guardar una serie en una
+sesión archivada, o mover su cursor, la desarchiva antes (reabrir()):
+el cursor y la numeración de series cuentan las filas de SerieEjercicio. Borrar
+una sesión archivada resta sus totales y vuelve a buscar los récords que
+eran de sus series (agregados.paquete_por_eliminar).
+
+desarchivar() devuelve las series a SerieEjercicio con sus ids, claves y
+fechas originales: `python manage.py archivar_historial --desarchivar`.
+
+Archivar y desarchivar escriben con SQL directo, sin señales: los
+agregados no cambian, solo dónde están guardadas las series.
+"""
+import json
+import math
+import struct
+import zlib
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import groupby
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import cache_progreso
+from .models import EjercicioRutina, Entrenamiento, RecordPersonal, SerieEjercicio, SesionArchivada
+
+# Sesiones por transacción al archivar o desarchivar
+LOTE = 200
+
+FORMATO = 1
+_CABECERA = struct.Struct('<BI')  # formato, número de series
+# Columnas de tamaño fijo, en este orden dentro del paquete
+_COLUMNAS = [
+    ('id', 'q'), ('ejercicio_rutina_id', 'q'), ('ejercicio_id', 'q'), ('numero_serie', 'i'),
+    ('peso_kg', 'd'), ('repeticiones', 'i'), ('rpe', 'i'), ('e1rm', 'd'), ('actualizado', 'q'),
+]
+_EPOCA = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+SerieArchivada = namedtuple('SerieArchivada', [nombre for nombre, _ in _COLUMNAS] + ['clave_cliente'])
+
+
+def dias_por_defecto():
+    return getattr(settings, 'GYM_ARCHIVO_DIAS', 365)
+
+
+# 📝 EXPLICACIÓN: Formato del paquete
+def empaquetar(series):
+    """Lista de SerieArchivada → bytes. RPE vacío = 0 y 1RM vacío = NaN"""
+    numero = len(series)
+    partes = [_CABECERA.pack(FORMATO, numero)]
+    for nombre, formato in _COLUMNAS:
+        valores = [getattr(serie, nombre) for serie in series]
+        if nombre == 'rpe':
+            valores = [valor or 0 for valor in valores]
+        elif nombre == 'e1rm':
+            valores = [math.nan if valor is None else valor for valor in valores]
+        elif nombre == 'actualizado':
+            valores = [(valor - _EPOCA) // timedelta(microseconds=1) for valor in valores]
+        partes.append(struct.pack(f'<{numero}{formato}', *valores))
+    partes.append(json.dumps([serie.clave_cliente for serie in series]).encode())
+    return zlib.compress(b''.join(partes))
+
+
+def desempaquetar(datos):
+    """bytes → lista de SerieArchivada, en el orden en que se empaquetaron"""
+    crudo = zlib.decompress(datos)
+    formato_guardado, numero = _CABECERA.unpack_from(crudo)
+    if formato_guardado != FORMATO:
+        raise ValueError(f'Formato de archivo desconocido: {formato_guardado}')
+
+    posicion = _CABECERA.size
+    columnas = []
+    for nombre, formato in _COLUMNAS:
+        estructura = struct.Struct(f'<{numero}{formato}')
+        valores = estructura.unpack_from(crudo, posicion)
+        posicion += estructura.size
+        if nombre == 'rpe':
+            valores = [valor or None for valor in valores]
+        elif nombre == 'e1rm':
+            valores = [None if math.isnan(valor) else valor for valor in valores]
+        elif nombre == 'actualizado':
+            valores = [_EPOCA + timedelta(microseconds=valor) for valor in valores]
+        columnas.append(valores)
+    columnas.append(json.loads(crudo[posicion:]))
+    return [SerieArchivada(*fila) for fila in zip(*columnas)]
+
+
+# 📝 EXPLICACIÓN: Lectura
+def filas_archivadas(sesiones):
+    """
+    (entrenamiento_id, usuario_id, fecha, SerieArchivada) de cada serie de
+    las SesionArchivada de `sesiones`, sesión a sesión.
+    """
+    for entrenamiento_id, usuario_id, fecha, datos in sesiones.values_list(
+        'entrenamiento_id', 'entrenamiento__usuario_id', 'entrenamiento__fecha', 'datos'
+    ).iterator(chunk_size=LOTE):
+        for serie in desempaquetar(datos):
+            yield entrenamiento_id, usuario_id, fecha, serie
+
+
+def series_de(entrenamiento):
+    """
+    Las series archivadas de una sesión como SerieEjercicio sin guardar,
+    con su ejercicio_rutina y ejercicio cargados (dos consultas)
+    """
+    datos = SesionArchivada.objects.filter(entrenamiento=entrenamiento).values_list('datos', flat=True).first()
+    if datos is None:
+        return []
+    filas = desempaquetar(datos)
+    ejercicios_rutina = EjercicioRutina.objects.select_related('ejercicio').in_bulk(
+        {fila.ejercicio_rutina_id for fila in filas}
+    )
+    return [
+        SerieEjercicio(
+            id=fila.id, entrenamiento=entrenamiento, ejercicio_rutina=ejercicios_rutina[fila.ejercicio_rutina_id],
+            numero_serie=fila.numero_serie, peso_kg=fila.peso_kg, repeticiones=fila.repeticiones,
+            rpe=fila.rpe, e1rm=fila.e1rm, clave_cliente=fila.clave_cliente, actualizado=fila.actualizado,
+        )
+        for fila in filas
+        # Un ejercicio quitado de la rutina se lleva sus series (como el CASCADE)
+        if fila.ejercicio_rutina_id in ejercicios_rutina
+    ]
+
+
+# 📝 EXPLICACIÓN: Escritura (SQL directo y por tandas de sesiones)
+def _tandas(ids, lote):
+    for inicio in range(0, len(ids), lote):
+        yield ids[inicio:inicio + lote]
+
+
+def _borrar_series(entrenamiento_ids):
+    nombre = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {} WHERE {} IN ({})'.format(
+            nombre(SerieEjercicio._meta.db_table),
+            nombre(SerieEjercicio._meta.get_field('entrenamiento').column),
+            ', '.join(['%s'] * len(entrenamiento_ids)),
+        ), entrenamiento_ids)
+
+
+COLUMNAS_SERIE = [
+    'id', 'entrenamiento_id', 'ejercicio_rutina_id', 'numero_serie', 'peso_kg', 'repeticiones', 'rpe', 'e1rm',
+    'clave_cliente', 'actualizado',
+]
+
+
+def _insertar_series(filas):
+    nombre = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        nombre(SerieEjercicio._meta.db_table),
+        ', '.join(nombre(SerieEjercicio._meta.get_field(campo).column) for campo in COLUMNAS_SERIE),
+        ', '.join(['%s'] * len(COLUMNAS_SERIE)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, filas)
+
+
+def archivar(dias=None, usuario=None, lote=LOTE):
+    """
+    Empaqueta las series de las sesiones con más de `dias` días. Devuelve
+    (sesiones, series) archivadas. Las sesiones sin series se quedan como están.
+    """
+    limite = timezone.now() - timedelta(days=dias_por_defecto() if dias is None else dias)
+    candidatas = Entrenamiento.objects.filter(fecha__lt=limite, archivado=False)
+    if usuario is not None:
+        candidatas = candidatas.filter(usuario=usuario)
+    ids = list(candidatas.order_by('id').values_list('id', flat=True))
+
+    sesiones = series = 0
+    usuarios = set()
+    for tanda in _tandas(ids, lote):
+        with transaction.atomic():
+            filas = SerieEjercicio.objects.filter(entrenamiento_id__in=tanda).values_list(
+                'entrenamiento_id', 'entrenamiento__usuario_id', 'id', 'ejercicio_rutina_id',
+                'ejercicio_rutina__ejercicio_id', 'numero_serie', 'peso_kg', 'repeticiones', 'rpe', 'e1rm',
+                'actualizado', 'clave_cliente',
+            ).order_by('entrenamiento_id', 'ejercicio_rutina__orden', 'numero_serie', 'id')
+
+            nuevas = []
+            for (entrenamiento_id, usuario_id), grupo in groupby(filas, key=lambda fila: fila[:2]):
+                paquete = [SerieArchivada(*fila[2:]) for fila in grupo]
+                nuevas.append(SesionArchivada(
+                    entrenamiento_id=entrenamiento_id,
+                    series_totales=len(paquete),
+                    volumen_total=sum(serie.peso_kg * serie.repeticiones for serie in paquete),
+                    datos=empaquetar(paquete),
+                ))
+                usuarios.add(usuario_id)
+                series += len(paquete)
+            if not nuevas:
+                continue
+
+            archivadas = [sesion.entrenamiento_id for sesion in nuevas]
+            SesionArchivada.objects.bulk_create(nuevas)
+            Entrenamiento.objects.filter(id__in=archivadas).update(archivado=True)
+            # Los récords dejan de apuntar a la fila pero se quedan con su id
+            # (desarchivar los vuelve a enlazar)
+            RecordPersonal.objects.filter(serie__entrenamiento_id__in=archivadas).update(
+                serie_archivada=F('serie'), serie=None
+            )
+            _borrar_series(archivadas)
+            sesiones += len(nuevas)
+
+    for usuario_id in usuarios:
+        cache_progreso.invalidar_usuario(usuario_id)
+    return sesiones, series
+
+
+def _enlazar_records(usuario_ids, restauradas):
+    """
+    Vuelve a poner la serie en los récords que la perdieron al archivar.
+    `restauradas`: {id archivado: id de la fila restaurada, o None si no volvió}
+    """
+    enlazados = list(RecordPersonal.objects.filter(
+        usuario_id__in=usuario_ids, serie_archivada__in=restauradas
+    ))
+    for record in enlazados:
+        # Sin fila (su ejercicio ya no está en la rutina) el récord queda
+        # sin serie y el próximo borrado del ejercicio lo vuelve a buscar
+        record.serie_id = restauradas[record.serie_archivada]
+        record.serie_archivada = None
+    RecordPersonal.objects.bulk_update(enlazados, ['serie', 'serie_archivada'])
+
+
+def reabrir(entrenamientos):
+    """
+    Desarchiva las sesiones archivadas de `entrenamientos` (instancias) antes
+    de escribir en ellas y las marca como no archivadas. Sin ninguna
+    archivada no hace consultas.
+    """
+    archivadas = [entrenamiento for entrenamiento in entrenamientos if entrenamiento.archivado]
+    if not archivadas:
+        return
+    desarchivar(entrenamientos=[entrenamiento.id for entrenamiento in archivadas])
+    for entrenamiento in archivadas:
+        entrenamiento.archivado = False
+
+
+def desarchivar(usuario=None, entrenamientos=None, lote=LOTE):
+    """
+    Devuelve a SerieEjercicio las series archivadas (de un usuario, de unos
+    entrenamientos o todas). Devuelve (sesiones, series) desarchivadas.
+    """
+    archivadas = SesionArchivada.objects.all()
+    if usuario is not None:
+        archivadas = archivadas.filter(entrenamiento__usuario=usuario)
+    if entrenamientos is not None:
+        archivadas = archivadas.filter(entrenamiento_id__in=entrenamientos)
+    ids = list(archivadas.order_by('entrenamiento_id').values_list('entrenamiento_id', flat=True))
+
+    sesiones = series = 0
+    usuarios = set()
+    for tanda in _tandas(ids, lote):
+        with transaction.atomic():
+            filas = list(filas_archivadas(SesionArchivada.objects.filter(entrenamiento_id__in=tanda)))
+            existentes = set(EjercicioRutina.objects.filter(
+                id__in={serie.ejercicio_rutina_id for *_, serie in filas}
+            ).values_list('id', flat=True))
+            adaptar = connection.ops.adapt_datetimefield_value
+
+            # Los ids de SQLite (AUTOINCREMENT) y de las secuencias de otros
+            # motores no se reutilizan, pero una serie insertada con id
+            # explícito (loaddata, una copia restaurada) puede ocupar el de
+            # una archivada: esas vuelven con otro id
+            ocupados = set(SerieEjercicio.objects.filter(
+                id__in=[serie.id for *_, serie in filas]
+            ).values_list('id', flat=True))
+
+            nuevas = []
+            con_id_nuevo = []
+            restauradas = {}
+            usuarios_tanda = set()
+            for entrenamiento_id, usuario_id, _, serie in filas:
+                usuarios_tanda.add(usuario_id)
+                # Un ejercicio quitado de la rutina se lleva sus series (como el CASCADE)
+                if serie.ejercicio_rutina_id not in existentes:
+                    restauradas[serie.id] = None
+                    continue
+                if serie.id in ocupados:
+                    con_id_nuevo.append((serie.id, SerieEjercicio(
+                        entrenamiento_id=entrenamiento_id, ejercicio_rutina_id=serie.ejercicio_rutina_id,
+                        numero_serie=serie.numero_serie, peso_kg=serie.peso_kg, repeticiones=serie.repeticiones,
+                        rpe=serie.rpe, e1rm=serie.e1rm, clave_cliente=serie.clave_cliente,
+                    )))
+                else:
+                    nuevas.append((
+                        serie.id, entrenamiento_id, serie.ejercicio_rutina_id, serie.numero_serie, serie.peso_kg,
+                        serie.repeticiones, serie.rpe, serie.e1rm, serie.clave_cliente, adaptar(serie.actualizado),
+                    ))
+                    restauradas[serie.id] = serie.id
+
+            _insertar_series(nuevas)
+            # bulk_create pone actualizado=ahora: los clientes reciben el id nuevo
+            SerieEjercicio.objects.bulk_create([serie for _, serie in con_id_nuevo])
+            restauradas.update((id_archivado, serie.id) for id_archivado, serie in con_id_nuevo)
+            _enlazar_records(usuarios_tanda, restauradas)
+            SesionArchivada.objects.filter(entrenamiento_id__in=tanda).delete()
+            Entrenamiento.objects.filter(id__in=tanda).update(archivado=False)
+            sesiones += len(tanda)
+            series += len(nuevas) + len(con_id_nuevo)
+            usuarios |= usuarios_tanda
+
+    for usuario_id in usuarios:
+        cache_progreso.invalidar_usuario(usuario_id)
+    return sesiones, series
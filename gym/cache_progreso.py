@@ -0,0 +1,96 @@
+"""
+Caché de los cálculos de progreso por usuario.
+
+Cada usuario tiene una "marca" (watermark) en la caché que cambia cada vez
+que se escribe una SerieEjercicio, un Entrenamiento o su Perfil (ver
+gym/signals.py). Cada resultado se guarda junto a la marca con la que se
+calculó; si no coincide con la actual, se recalcula. La marca y el
+resultado se leen con un solo get_many(), así que una visita repetida
+cuesta una ida a la caché.
+
+aobtener_o_calcular() es la versión para vistas async (gym/progreso_async.py).
+
+Funciona con cualquier backend de Django: LocMemCache (un proceso) o
+FileBasedCache (varios procesos que comparten disco). Ver CACHES en
+gymprogress/settings.py para el tamaño máximo y el TTL.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _clave_marca(usuario_id):
+    return f'gym:marca:{usuario_id}'
+
+
+def _nueva_marca():
+    # Nanosegundos: sirve de versión y de fecha de última modificación
+    return time.time_ns()
+
+
+def marca_usuario(usuario_id):
+    """Marca actual de los datos del usuario (la crea si no hay)"""
+    marca = cache.get(_clave_marca(usuario_id))
+    if marca is None:
+        marca = _crear_marca(usuario_id)
+    return marca
+
+
+def _crear_marca(usuario_id):
+    # add() no pisa la marca si otro proceso la creó a la vez
+    cache.add(_clave_marca(usuario_id), _nueva_marca(), timeout=None)
+    return cache.get(_clave_marca(usuario_id))
+
+
+def invalidar_usuario(usuario_id):
+    """
+    Cambia la marca del usuario: todo lo cacheado con la anterior deja de
+    valer. Se vuelve a cambiar al confirmar la transacción, por si alguien
+    recalculó en medio con datos aún sin confirmar.
+    """
+    def cambiar_marca():
+        cache.set(_clave_marca(usuario_id), _nueva_marca(), timeout=None)
+
+    cambiar_marca()
+    transaction.on_commit(cambiar_marca)
+
+
+def obtener_o_calcular(usuario_id, nombre, calcular):
+    """
+    Devuelve el resultado cacheado de `nombre` si se calculó con la marca
+    actual; si no, llama a calcular() y lo guarda.
+    """
+    clave = f'gym:{nombre}:{usuario_id}'
+    guardados = cache.get_many([_clave_marca(usuario_id), clave])
+
+    marca = guardados.get(_clave_marca(usuario_id))
+    if marca is None:
+        marca = _crear_marca(usuario_id)
+
+    guardado = guardados.get(clave)
+    if guardado is not None and guardado[0] == marca:
+        return guardado[1]
+
+    datos = calcular()
+    cache.set(clave, (marca, datos))
+    return datos
+
+
+async def aobtener_o_calcular(usuario_id, nombre, calcular):
+    """Como obtener_o_calcular(), pero `calcular` es una corrutina"""
+    clave = f'gym:{nombre}:{usuario_id}'
+    guardados = await cache.aget_many([_clave_marca(usuario_id), clave])
+
+    marca = guardados.get(_clave_marca(usuario_id))
+    if marca is None:
+        await cache.aadd(_clave_marca(usuario_id), _nueva_marca(), timeout=None)
+        marca = await cache.aget(_clave_marca(usuario_id))
+
+    guardado = guardados.get(clave)
+    if guardado is not None and guardado[0] == marca:
+        return guardado[1]
+
+    datos = await calcular()
+    await cache.aset(clave, (marca, datos))
+    return datos
@@ -0,0 +1,147 @@
+"""
+Catálogo de ejercicios en memoria y búsqueda mientras se escribe.
+
+Cada proceso guarda el catálogo completo (id, nombre, grupo, imagen) y un
+índice ordenado de palabras normalizadas ('press banca barra' → 'banca',
+'barra', 'press'). Buscar "pre" es una búsqueda binaria (bisect) en ese
+índice: no hay consulta SQL ni se recorre el catálogo entero.
+
+El catálogo lleva una versión guardada en la caché de Django
+(`gym:catalogo:version`). Cada escritura de un Ejercicio la cambia
+(gym/signals.py; quien use bulk_create llama a invalidar()) y cada
+proceso recarga su copia la próxima vez que la use. Con FileBasedCache
+(GYM_CACHE_DIR) la versión la comparten todos los procesos.
+
+JSON: api/ejercicios/buscar/?q=pre&grupo=pecho&limite=20
+El formulario de agregar ejercicio a una rutina lo usa en vez de un
+<select> con todo el catálogo (ver BuscadorEjercicio en gym/forms.py).
+"""
+import re
+import time
+import unicodedata
+from bisect import bisect_left
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from .api import api_login_required
+from .models import Ejercicio
+
+CLAVE_VERSION = 'gym:catalogo:version'
+LIMITE_POR_DEFECTO = 20
+MAXIMO_LIMITE = 100
+
+NOMBRES_GRUPOS = dict(Ejercicio.GRUPO_MUSCULAR_CHOICES)
+
+
+def normalizar(nombre):
+    """'Press Banca (Barra)' → 'press banca barra': sin tildes, mayúsculas ni signos"""
+    nombre = unicodedata.normalize('NFKD', nombre or '').encode('ascii', 'ignore').decode()
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', nombre.lower()).split())
+
+
+class Catalogo:
+    """Foto del catálogo de una versión: ejercicios por id e índice de palabras"""
+
+    def __init__(self, version, ejercicios):
+        self.version = version
+        # Orden alfabético: es el orden de los resultados a igualdad de relevancia
+        self.ejercicios = sorted(ejercicios, key=lambda ejercicio: (normalizar(ejercicio['nombre']), ejercicio['id']))
+        self.por_id = {ejercicio['id']: ejercicio for ejercicio in self.ejercicios}
+        self.nombres = [normalizar(ejercicio['nombre']) for ejercicio in self.ejercicios]
+        # (palabra, posición en self.ejercicios), ordenado para bisect
+        self.palabras = sorted(
+            (palabra, posicion)
+            for posicion, nombre in enumerate(self.nombres)
+            for palabra in set(nombre.split())
+        )
+
+    def _con_prefijo(self, prefijo):
+        """Posiciones de los ejercicios con alguna palabra que empieza por `prefijo`"""
+        posiciones = set()
+        inicio = bisect_left(self.palabras, (prefijo, -1))
+        for palabra, posicion in self.palabras[inicio:]:
+            if not palabra.startswith(prefijo):
+                break
+            posiciones.add(posicion)
+        return posiciones
+
+    def buscar(self, texto='', grupo=None, limite=LIMITE_POR_DEFECTO):
+        """
+        Ejercicios en los que cada palabra de `texto` es el principio de
+        alguna palabra del nombre ("pre ban" → "Press Banca"). Primero los
+        que empiezan por el texto, luego el resto, en orden alfabético.
+        """
+        consulta = normalizar(texto)
+        if consulta:
+            # Se parte de la palabra más larga: es la que deja menos candidatos
+            primera, *resto = sorted(consulta.split(), key=len, reverse=True)
+            candidatos = sorted(self._con_prefijo(primera))
+            candidatos = [
+                posicion for posicion in candidatos
+                if all(any(palabra.startswith(prefijo) for palabra in self.nombres[posicion].split()) for prefijo in resto)
+            ]
+        else:
+            candidatos = range(len(self.ejercicios))
+
+        if grupo:
+            candidatos = [posicion for posicion in candidatos if self.ejercicios[posicion]['grupo_muscular'] == grupo]
+        if consulta:
+            candidatos = sorted(candidatos, key=lambda posicion: not self.nombres[posicion].startswith(consulta))
+        return [self.ejercicios[posicion] for posicion in candidatos[:limite]]
+
+
+_catalogo = None
+
+
+def _version():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        # add() no pisa la versión si otro proceso la creó a la vez
+        cache.add(CLAVE_VERSION, time.time_ns(), timeout=None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+def obtener():
+    """Catálogo al día: una ida a la caché y, solo si ha cambiado, una consulta"""
+    global _catalogo
+    version = _version()
+    catalogo = _catalogo
+    if catalogo is None or catalogo.version != version:
+        # La versión se lee antes que los datos: si cambian en medio, la
+        # próxima vez no coincidirá y se volverá a cargar
+        catalogo = _catalogo = Catalogo(version, list(
+            Ejercicio.objects.values('id', 'nombre', 'grupo_muscular', 'imagen')
+        ))
+    return catalogo
+
+
+def invalidar():
+    """Cambia la versión del catálogo (también al confirmar la transacción)"""
+    def cambiar_version():
+        cache.set(CLAVE_VERSION, time.time_ns(), timeout=None)
+
+    cambiar_version()
+    transaction.on_commit(cambiar_version)
+
+
+# 📝 EXPLICACIÓN: Búsqueda para el autocompletado (?q=pre&grupo=pecho&limite=20)
+@require_GET
+@api_login_required
+def api_buscar_ejercicios(request):
+    grupo = request.GET.get('grupo') or None
+    if grupo and grupo not in NOMBRES_GRUPOS:
+        return JsonResponse({'error': f'Grupo muscular "{grupo}" desconocido'}, status=400)
+
+    limite = request.GET.get('limite', str(LIMITE_POR_DEFECTO))
+    if not limite.isdigit() or not 1 <= int(limite) <= MAXIMO_LIMITE:
+        return JsonResponse({'error': f'"limite" tiene que estar entre 1 y {MAXIMO_LIMITE}'}, status=400)
+
+    resultados = obtener().buscar(request.GET.get('q', ''), grupo, int(limite))
+    return JsonResponse({'resultados': [
+        {**ejercicio, 'grupo_nombre': NOMBRES_GRUPOS.get(ejercicio['grupo_muscular'], '')}
+        for ejercicio in resultados
+    ]})
@@ -0,0 +1,115 @@
+"""
+Exportación del historial completo de un usuario (CSV o JSON Lines).
+
+Una fila por serie con los datos de su entrenamiento y ejercicio; los
+entrenamientos sin series salen en una fila con las columnas de la serie
+vacías. Se genera a trozos sobre una sola consulta con values_list() +
+iterator(): ni se cargan todas las filas en memoria ni se crea una
+instancia de modelo por serie, así que la memoria no depende del tamaño
+del historial. La vista responde con StreamingHttpResponse y el comando
+`exportar_historial` escribe a un fichero con los mismos generadores.
+"""
+import csv
+import json
+
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.utils import timezone
+
+from . import archivo
+from .models import Ejercicio, Entrenamiento, Perfil
+
+COLUMNAS = [
+    'entrenamiento_id', 'fecha', 'rutina', 'duracion_minutos', 'notas',
+    'ejercicio', 'grupo_muscular', 'numero_serie', 'peso_kg', 'repeticiones', 'rpe', 'e1rm',
+    'peso_corporal',
+]
+
+# Filas que se piden a la base de datos de cada vez y que van en cada trozo de la respuesta
+FILAS_POR_LOTE = 2000
+
+FORMATOS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson; charset=utf-8', 'jsonl'),
+}
+
+
+def filas_historial(usuario, lote=FILAS_POR_LOTE):
+    """Tuplas en el orden de COLUMNAS, de la sesión más antigua a la más reciente"""
+    peso_corporal = Perfil.objects.filter(usuario=usuario).values_list('peso_corporal', flat=True).first()
+
+    # Desde Entrenamiento: LEFT JOIN con las series, así salen también las sesiones vacías.
+    # Una sesión archivada (gym/archivo.py) sale en una fila con sus series empaquetadas
+    filas = Entrenamiento.objects.filter(usuario=usuario).values_list(
+        'id', 'fecha', 'rutina__nombre', 'duracion_minutos', 'notas',
+        'series__ejercicio_rutina__ejercicio__nombre',
+        'series__ejercicio_rutina__ejercicio__grupo_muscular',
+        'series__numero_serie', 'series__peso_kg', 'series__repeticiones', 'series__rpe', 'series__e1rm',
+        'archivo__datos',
+    ).order_by('fecha', 'id', 'series__ejercicio_rutina__orden', 'series__numero_serie', 'series__id')
+
+    ejercicios = None
+    for fila in filas.iterator(chunk_size=lote):
+        sesion = fila[:1] + (timezone.localtime(fila[1]).isoformat(),) + fila[2:5]
+        if fila[-1] is None:
+            yield sesion + fila[5:-1] + (peso_corporal,)
+            continue
+        if ejercicios is None:
+            ejercicios = {
+                ejercicio_id: (nombre, grupo)
+                for ejercicio_id, nombre, grupo in Ejercicio.objects.values_list('id', 'nombre', 'grupo_muscular')
+            }
+        for serie in archivo.desempaquetar(fila[-1]):
+            yield sesion + ejercicios.get(serie.ejercicio_id, (None, None)) + (
+                serie.numero_serie, serie.peso_kg, serie.repeticiones, serie.rpe, serie.e1rm, peso_corporal,
+            )
+
+
+def _por_lotes(lineas, lote):
+    """Junta las líneas en trozos: un write() por línea haría la descarga mucho más lenta"""
+    trozo = []
+    for linea in lineas:
+        trozo.append(linea)
+        if len(trozo) >= lote:
+            yield ''.join(trozo)
+            trozo = []
+    if trozo:
+        yield ''.join(trozo)
+
+
+class _Eco:
+    """Falso fichero para csv.writer: devuelve la línea en vez de guardarla"""
+    def write(self, valor):
+        return valor
+
+
+def lineas_csv(filas):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(COLUMNAS)
+    for fila in filas:
+        yield escritor.writerow(fila)
+
+
+def lineas_jsonl(filas):
+    for fila in filas:
+        yield json.dumps(dict(zip(COLUMNAS, fila)), ensure_ascii=False) + '\n'
+
+
+def exportar(usuario, formato, lote=FILAS_POR_LOTE):
+    """Generador de trozos de texto con todo el historial en el formato pedido"""
+    lineas = lineas_csv if formato == 'csv' else lineas_jsonl
+    return _por_lotes(lineas(filas_historial(usuario, lote)), lote)
+
+
+# 📝 EXPLICACIÓN: Descarga del historial: /entrenamientos/exportar/?formato=csv|jsonl
+@login_required
+def exportar_historial(request):
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS:
+        return HttpResponseBadRequest('Formato no válido: usa csv o jsonl')
+
+    tipo, extension = FORMATOS[formato]
+    respuesta = StreamingHttpResponse(exportar(request.user, formato), content_type=tipo)
+    nombre = f'gymprogress-{request.user.username}-{timezone.localdate():%Y%m%d}.{extension}'
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    return respuesta
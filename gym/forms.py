@@ -1,4 +1,6 @@
 from django import forms
+from django.urls import reverse
+from . import catalogo
 from .models import Rutina, Ejercicio, EjercicioRutina
 
 # 📝 EXPLICACIÓN: ¿Por qué crear un Form?
@@ -33,6 +35,29 @@ class RutinaForm(forms.ModelForm):
             }),
         }
         
+class BuscadorEjercicio(forms.Widget):
+    # 📝 EXPLICACIÓN: Un <select> con todo el catálogo pesa demasiado cuando
+    # hay miles de ejercicios. Este widget es un campo oculto con el id y un
+    # buscador que va pidiendo resultados a api/ejercicios/buscar/ mientras
+    # se escribe. Al dibujarlo solo se busca el nombre del ejercicio elegido
+    # (en el catálogo en memoria, sin consultas)
+    template_name = 'widgets/buscador_ejercicio.html'
+    
+    def get_context(self, name, value, attrs):
+        contexto = super().get_context(name, value, attrs)
+        elegido = None
+        if value not in (None, ''):
+            try:
+                elegido = catalogo.obtener().por_id.get(int(value))
+            except (TypeError, ValueError):
+                pass
+        contexto['widget'].update({
+            'elegido': elegido,
+            'grupos': Ejercicio.GRUPO_MUSCULAR_CHOICES,
+            'url_busqueda': reverse('api_buscar_ejercicios'),
+        })
+        return contexto
+
 class EjercicioRutinaForm(forms.ModelForm):
     # 📝 EXPLICACIÓN: Este form es para agregar ejercicios a una rutina específica
     
@@ -51,7 +76,7 @@ class EjercicioRutinaForm(forms.ModelForm):
         
         # Personalizar widgets
         widgets = {
-            'ejercicio': forms.Select(attrs={
+            'ejercicio': BuscadorEjercicio(attrs={
                 'class': 'form-control dark-input'
             }),
             'series': forms.NumberInput(attrs={
@@ -74,4 +99,76 @@ class EjercicioRutinaForm(forms.ModelForm):
                 'class': 'form-control dark-input',
                 'min': 0
             }),
-        }
\ No newline at end of file
+        }
+
+class SerieLoteForm(forms.Form):
+    # 📝 EXPLICACIÓN: Una fila del registro por lotes (una serie)
+    # Las filas que se dejan vacías se ignoran
+    ejercicio_rutina = forms.IntegerField(widget=forms.HiddenInput)
+    peso = forms.FloatField(
+        required=False,
+        min_value=0,
+        widget=forms.NumberInput(attrs={
+            'class': 'form-control dark-input',
+            'step': 0.5,
+            'placeholder': 'kg'
+        })
+    )
+    repeticiones = forms.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=50,
+        widget=forms.NumberInput(attrs={
+            'class': 'form-control dark-input',
+            'placeholder': 'reps'
+        })
+    )
+    rpe = forms.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=10,
+        widget=forms.NumberInput(attrs={
+            'class': 'form-control dark-input',
+            'placeholder': 'RPE'
+        })
+    )
+    
+    def clean(self):
+        datos = super().clean()
+        peso = datos.get('peso')
+        repeticiones = datos.get('repeticiones')
+        # Una serie a medias (peso sin reps o al revés) es un error
+        if (peso is None) != (repeticiones is None):
+            raise forms.ValidationError('Indica peso y repeticiones, o deja la fila vacía')
+        return datos
+    
+    @property
+    def esta_vacia(self):
+        return self.cleaned_data.get('peso') is None
+
+
+class BaseSerieLoteFormSet(forms.BaseFormSet):
+    # 📝 EXPLICACIÓN: Validación conjunta de todas las series del lote
+    def __init__(self, *args, ejercicios_validos=(), **kwargs):
+        self.ejercicios_validos = set(ejercicios_validos)
+        super().__init__(*args, **kwargs)
+    
+    def clean(self):
+        if any(self.errors):
+            return
+        
+        llenas = [form for form in self.forms if not form.esta_vacia]
+        if not llenas:
+            raise forms.ValidationError('No hay ninguna serie para guardar')
+        
+        # Seguridad: solo ejercicios de la rutina de este entrenamiento
+        for form in llenas:
+            if form.cleaned_data['ejercicio_rutina'] not in self.ejercicios_validos:
+                raise forms.ValidationError('Hay series de un ejercicio que no pertenece a la rutina')
+    
+    @property
+    def series_llenas(self):
+        return [form.cleaned_data for form in self.forms if not form.esta_vacia]
+
+
+SerieLoteFormSet = forms.formset_factory(SerieLoteForm, formset=BaseSerieLoteFormSet, extra=0)
@@ -0,0 +1,69 @@
+"""
+Estimación del 1RM (peso máximo para una repetición) a partir de una serie.
+
+- Epley:    peso × (1 + reps / 30)
+- Brzycki:  peso × 36 / (37 − reps)
+- RPE:      tabla de porcentajes del 1RM según repeticiones y RPE. Un RPE
+            de 8 son 2 repeticiones en reserva: 5 reps a RPE 8 pesan como
+            7 reps a RPE 10.
+
+El 1RM estimado se calcula una vez al guardar la serie
+(SerieEjercicio.e1rm) y las vistas solo lo leen.
+"""
+
+# % del 1RM que se mueve a RPE 10 (al fallo) para cada número de
+# repeticiones (tabla RPE de Tuchscherer). Más allá de 12 la tabla deja de
+# ser fiable y se usan las fórmulas.
+PORCENTAJE_AL_FALLO = {
+    1: 1.000, 2: 0.955, 3: 0.922, 4: 0.892, 5: 0.863, 6: 0.837,
+    7: 0.811, 8: 0.786, 9: 0.762, 10: 0.739, 11: 0.707, 12: 0.680,
+}
+
+# Por debajo de RPE 6 la percepción del esfuerzo es poco fiable
+RPE_MINIMO_FIABLE = 6
+
+
+def epley(peso, repeticiones):
+    if repeticiones == 1:
+        return peso
+    return peso * (1 + repeticiones / 30)
+
+
+def brzycki(peso, repeticiones):
+    if repeticiones >= 37:  # la fórmula se dispara
+        return None
+    return peso * 36 / (37 - repeticiones)
+
+
+def porcentaje_rpe(repeticiones, rpe):
+    """% del 1RM para esas reps a ese RPE, o None si la tabla no lo cubre"""
+    if rpe is None or not RPE_MINIMO_FIABLE <= rpe <= 10:
+        return None
+    return PORCENTAJE_AL_FALLO.get(repeticiones + (10 - rpe))
+
+
+def estimar_1rm(peso, repeticiones, rpe=None):
+    """
+    1RM estimado de una serie, redondeado a 0.1 kg. Usa la tabla RPE si la
+    serie tiene un RPE fiable; si no, la media de Epley y Brzycki hasta 10
+    repeticiones (Brzycki se desvía por encima) y Epley a partir de ahí.
+    None si no hay peso o repeticiones.
+    """
+    if not peso or not repeticiones or peso <= 0 or repeticiones <= 0:
+        return None
+
+    porcentaje = porcentaje_rpe(repeticiones, rpe)
+    if porcentaje:
+        return round(peso / porcentaje, 1)
+    if repeticiones <= 10:
+        return round((epley(peso, repeticiones) + brzycki(peso, repeticiones)) / 2, 1)
+    return round(epley(peso, repeticiones), 1)
+
+
+def peso_para(e1rm, repeticiones, rpe):
+    """Peso con el que salen `repeticiones` a ese RPE dado un 1RM estimado"""
+    porcentaje = porcentaje_rpe(repeticiones, rpe)
+    if porcentaje is None:
+        # Fuera de la tabla: Epley al revés, con las reps en reserva sumadas
+        porcentaje = 1 / (1 + (repeticiones + 10 - (rpe or 10)) / 30)
+    return e1rm * porcentaje
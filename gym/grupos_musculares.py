@@ -0,0 +1,134 @@
+"""
+Series y volumen por grupo muscular y semana (equilibrio del entrenamiento).
+
+Una sola consulta agregada sobre ResumenSesionEjercicio (una fila por
+sesión y ejercicio, ver gym/agregados.py) unida a Ejercicio y agrupada por
+semana (TruncWeek) y grupo muscular. Usa el índice (usuario, fecha) de los
+resúmenes: un año son ~52 × 7 filas de resultado, sin una consulta por
+semana ni por ejercicio. Las semanas sin entrenar se rellenan aquí con
+ceros.
+
+Página: progreso/grupos/  ·  JSON: api/progreso/grupos/  (?semanas=52)
+"""
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.decorators import login_required
+from django.db.models import Sum
+from django.db.models.functions import TruncWeek
+from django.http import JsonResponse
+from django.shortcuts import render
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+
+from . import cache_progreso
+from .api import api_login_required
+from .models import Ejercicio, ResumenSesionEjercicio
+
+SEMANAS_POR_DEFECTO = 52
+MAXIMO_SEMANAS = 260
+
+NOMBRES_GRUPOS = dict(Ejercicio.GRUPO_MUSCULAR_CHOICES)
+
+
+def _primer_lunes(semanas):
+    """Inicio (lunes a las 00:00, hora local) de la primera de las últimas `semanas` semanas"""
+    hoy = timezone.localdate()
+    lunes = hoy - timedelta(days=hoy.weekday() + 7 * (semanas - 1))
+    return timezone.make_aware(datetime.combine(lunes, time.min))
+
+
+def volumen_por_grupo(usuario_id, semanas=SEMANAS_POR_DEFECTO):
+    """
+    {'grupos': [...], 'semanas': [{'inicio', 'grupos': {grupo: {'series', 'volumen'}}}],
+     'totales': {grupo: {'series', 'volumen', 'series_por_semana', 'porcentaje_series'}}}
+    con las semanas de la más antigua a la actual.
+    """
+    inicio = _primer_lunes(semanas)
+    filas = ResumenSesionEjercicio.objects.filter(
+        usuario_id=usuario_id, fecha__gte=inicio
+    ).annotate(
+        semana=TruncWeek('fecha')
+    ).values('semana', 'ejercicio__grupo_muscular').annotate(
+        series=Sum('series_completadas'),
+        volumen=Sum('volumen_total'),
+    ).order_by()
+
+    por_semana = {}
+    totales = {}
+    for fila in filas:
+        grupo = fila['ejercicio__grupo_muscular']
+        por_semana.setdefault(fila['semana'].date(), {})[grupo] = {
+            'series': fila['series'], 'volumen': round(fila['volumen'], 1),
+        }
+        total = totales.setdefault(grupo, {'series': 0, 'volumen': 0})
+        total['series'] += fila['series']
+        total['volumen'] += fila['volumen']
+
+    # Grupos en el orden del catálogo (pecho, espalda, piernas...)
+    grupos = [grupo for grupo in NOMBRES_GRUPOS if grupo in totales]
+    series_totales = sum(total['series'] for total in totales.values())
+    for total in totales.values():
+        total['volumen'] = round(total['volumen'], 1)
+        total['series_por_semana'] = round(total['series'] / semanas, 1)
+        total['porcentaje_series'] = round(100 * total['series'] / series_totales) if series_totales else 0
+
+    vacio = {'series': 0, 'volumen': 0}
+    lista_semanas = []
+    for numero in range(semanas):
+        lunes = inicio.date() + timedelta(weeks=numero)
+        datos = por_semana.get(lunes, {})
+        lista_semanas.append({
+            'inicio': lunes.isoformat(),
+            'grupos': {grupo: datos.get(grupo, vacio) for grupo in grupos},
+        })
+
+    return {
+        'grupos': grupos,
+        'semanas': lista_semanas,
+        'totales': {grupo: totales[grupo] for grupo in grupos},
+    }
+
+
+def _leer_semanas(request):
+    """Número de semanas pedido o None si no es válido"""
+    semanas = request.GET.get('semanas', str(SEMANAS_POR_DEFECTO))
+    if not semanas.isdigit() or not 1 <= int(semanas) <= MAXIMO_SEMANAS:
+        return None
+    return int(semanas)
+
+
+def _calcular(usuario_id, semanas):
+    # La ventana depende de hoy: con el lunes inicial en la clave, al
+    # cambiar de semana no se sirve la ventana anterior
+    primer_lunes = _primer_lunes(semanas).date().isoformat()
+    return cache_progreso.obtener_o_calcular(
+        usuario_id, f'grupos:{semanas}:{primer_lunes}', lambda: volumen_por_grupo(usuario_id, semanas)
+    )
+
+
+# 📝 EXPLICACIÓN: Página con el equilibrio entre grupos musculares
+@login_required
+def progreso_grupos(request):
+    semanas = _leer_semanas(request) or SEMANAS_POR_DEFECTO
+    datos = _calcular(request.user.id, semanas)
+
+    # La tabla va de la semana actual hacia atrás y con los nombres bonitos
+    return render(request, 'progreso/grupos.html', {
+        'semanas': semanas,
+        'grupos': [(grupo, NOMBRES_GRUPOS[grupo]) for grupo in datos['grupos']],
+        'totales': [datos['totales'][grupo] for grupo in datos['grupos']],
+        'filas': [
+            (semana['inicio'], [semana['grupos'][grupo] for grupo in datos['grupos']])
+            for semana in reversed(datos['semanas'])
+        ],
+    })
+
+
+# 📝 EXPLICACIÓN: Lo mismo en JSON para gráficos
+@require_GET
+@api_login_required
+def api_volumen_grupos(request):
+    semanas = _leer_semanas(request)
+    if semanas is None:
+        return JsonResponse({'error': f'"semanas" tiene que estar entre 1 y {MAXIMO_SEMANAS}'}, status=400)
+    return JsonResponse(_calcular(request.user.id, semanas))
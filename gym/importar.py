@@ -0,0 +1,422 @@
+"""
+Importación de historial desde CSV (exportaciones de otras apps o de la
+propia, ver gym/exportar.py).
+
+- El CSV se lee fila a fila (csv.DictReader sobre el fichero), nunca
+  entero en memoria.
+- Cada LOTE filas se guardan en una transacción: rutinas, ejercicios de
+  rutina y entrenamientos nuevos con bulk_create y las series con un
+  solo INSERT por lotes. Nada de eso dispara señales, así que los
+  agregados (resúmenes, récords, estadísticas...) se reconstruyen una
+  sola vez al final.
+- Todo lo creado apunta a la Importacion. Si algo falla a medias se borra
+  lo que ya se había guardado: o entra el historial entero o nada.
+- Si el proceso muere (se reinicia el servidor, se agota el tiempo del
+  worker) no llega a ejecutarse el `except`: la importación se queda
+  'en_curso'. La siguiente importación del usuario, o el comando
+  `limpiar_importaciones`, deshace las que llevan INTERRUMPIDA_TRAS sin
+  guardar ningún lote.
+- Los nombres de ejercicio se buscan en el catálogo (Ejercicio) sin
+  mayúsculas ni tildes y con alias de los nombres en inglés habituales.
+  Las filas con ejercicios que no existen se omiten y se cuentan.
+"""
+import csv
+import re
+from datetime import datetime, timedelta
+
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.db import connection, transaction
+from django.shortcuts import redirect, render
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import agregados, cache_progreso
+from .catalogo import normalizar
+from .fuerza import estimar_1rm
+from .models import (
+    Ejercicio, EjercicioRutina, Entrenamiento, Importacion, RegistroEliminado, Rutina, SerieEjercicio,
+)
+from .signals import senales_suspendidas
+
+# Filas del CSV por transacción
+LOTE = 5000
+
+# Una importación 'en_curso' sin guardar nada en este tiempo se dio por muerta
+INTERRUMPIDA_TRAS = timedelta(hours=1)
+
+# Nombre de columna en la app → nombres con los que aparece en cada exportación
+# (la propia, Strong y Hevy), ya en minúsculas
+COLUMNAS = {
+    'fecha': ['fecha', 'date', 'start_time'],
+    'rutina': ['rutina', 'workout name', 'title'],
+    'ejercicio': ['ejercicio', 'exercise name', 'exercise_title'],
+    'numero_serie': ['numero_serie', 'set order', 'set_index'],
+    'peso_kg': ['peso_kg', 'weight_kg', 'weight', 'peso'],
+    'repeticiones': ['repeticiones', 'reps'],
+    'rpe': ['rpe'],
+    'duracion_minutos': ['duracion_minutos', 'duration'],
+    'notas': ['notas', 'workout notes', 'description'],
+}
+OBLIGATORIAS = ['fecha', 'ejercicio', 'peso_kg', 'repeticiones']
+
+# Nombres habituales en inglés → nombre del catálogo (ambos normalizados)
+ALIAS_EJERCICIOS = {
+    'bench press': 'press banca',
+    'incline bench press': 'press inclinado con mancuernas',
+    'incline dumbbell press': 'press inclinado con mancuernas',
+    'chest fly': 'aperturas',
+    'dumbbell fly': 'aperturas',
+    'pull up': 'dominadas lastradas',
+    'weighted pull up': 'dominadas lastradas',
+    'bent over row': 'remo con barra',
+    'barbell row': 'remo con barra',
+    'lat pulldown': 'jalon al pecho',
+    'squat': 'sentadilla',
+    'back squat': 'sentadilla',
+    'deadlift': 'peso muerto',
+    'leg press': 'prensa',
+    'lunge': 'zancadas',
+    'overhead press': 'press militar',
+    'military press': 'press militar',
+    'lateral raise': 'elevaciones laterales',
+    'bicep curl': 'curl de biceps',
+    'biceps curl': 'curl de biceps',
+    'triceps extension': 'extensiones de triceps',
+    'plank': 'plancha lastrada',
+    'ab wheel': 'rueda abdominal',
+}
+
+# Formatos de fecha que no son ISO (parse_datetime ya entiende los ISO)
+FORMATOS_FECHA = ['%Y-%m-%d %H:%M', '%d/%m/%Y %H:%M', '%d %b %Y, %H:%M', '%Y-%m-%d', '%d/%m/%Y']
+
+
+class ErrorImportacion(Exception):
+    """El fichero no se puede importar (p. ej. le faltan columnas)"""
+
+
+def _catalogo():
+    catalogo = {normalizar(nombre): ejercicio_id for ejercicio_id, nombre in Ejercicio.objects.values_list('id', 'nombre')}
+    for alias, nombre in ALIAS_EJERCICIOS.items():
+        if nombre in catalogo:
+            catalogo.setdefault(alias, catalogo[nombre])
+    return catalogo
+
+
+def _buscar_ejercicio(catalogo, nombre):
+    # Strong y Hevy añaden el material entre paréntesis: "Squat (Barbell)"
+    for candidato in (nombre, re.sub(r'\(.*?\)', '', nombre)):
+        ejercicio_id = catalogo.get(normalizar(candidato))
+        if ejercicio_id:
+            return ejercicio_id
+    return None
+
+
+def _fecha(texto):
+    texto = texto.strip()
+    fecha = parse_datetime(texto)
+    if fecha is None:
+        for formato in FORMATOS_FECHA:
+            try:
+                fecha = datetime.strptime(texto, formato)
+                break
+            except ValueError:
+                continue
+        else:
+            return None
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+
+def _minutos(texto):
+    """'45', '1h 5m' o '65 min' → minutos"""
+    texto = (texto or '').strip().lower()
+    if texto.isdigit():
+        return int(texto)
+    horas = re.search(r'(\d+)\s*h', texto)
+    minutos = re.search(r'(\d+)\s*m', texto)
+    return (int(horas.group(1)) * 60 if horas else 0) + (int(minutos.group(1)) if minutos else 0)
+
+
+def _columnas(cabecera):
+    """Nombre de la app → nombre de la columna en este CSV"""
+    presentes = {(columna or '').strip().lower(): columna for columna in cabecera or []}
+    columnas = {}
+    for campo, nombres in COLUMNAS.items():
+        for nombre in nombres:
+            if nombre in presentes:
+                columnas[campo] = presentes[nombre]
+                break
+    faltan = [campo for campo in OBLIGATORIAS if campo not in columnas]
+    if faltan:
+        raise ErrorImportacion(f'Faltan columnas en el CSV: {", ".join(faltan)}')
+    return columnas
+
+
+class _Importador:
+    """Lo ya creado en esta importación, para no repetir rutinas ni sesiones entre lotes"""
+
+    def __init__(self, importacion):
+        self.importacion = importacion
+        self.usuario_id = importacion.usuario_id
+        self.catalogo = _catalogo()
+        self.rutinas = {}                # nombre → id
+        self.ejercicios_rutina = {}      # (rutina_id, ejercicio_id) → id
+        self.entrenamientos = {}         # (fecha, rutina) → id
+        self.series_por_ejercicio = {}   # (entrenamiento_id, ejercicio_rutina_id) → última serie
+        # Cada sesión repite su fecha y sus ejercicios en muchas filas: se interpretan una vez
+        self.fechas = {}                 # texto → datetime
+        self.ejercicios = {}             # nombre en el CSV → id
+
+    def leer(self, fila, columnas):
+        """Fila del CSV → dict con los datos de la serie, o None si hay que omitirla"""
+        def valor(campo):
+            return (fila.get(columnas[campo]) or '').strip() if campo in columnas else ''
+
+        nombre_ejercicio = valor('ejercicio')
+        if not nombre_ejercicio:  # p. ej. entrenamientos sin series de gym/exportar.py
+            return None
+        if nombre_ejercicio not in self.ejercicios:
+            self.ejercicios[nombre_ejercicio] = _buscar_ejercicio(self.catalogo, nombre_ejercicio)
+        ejercicio_id = self.ejercicios[nombre_ejercicio]
+        if ejercicio_id is None:
+            desconocidos = self.importacion.ejercicios_desconocidos
+            desconocidos[nombre_ejercicio] = desconocidos.get(nombre_ejercicio, 0) + 1
+            return None
+
+        texto_fecha = valor('fecha')
+        if texto_fecha not in self.fechas:
+            self.fechas[texto_fecha] = _fecha(texto_fecha)
+        fecha = self.fechas[texto_fecha]
+        try:
+            peso = float(valor('peso_kg') or 0)
+            repeticiones = int(float(valor('repeticiones') or 0))
+            rpe = round(float(valor('rpe'))) if valor('rpe') else None
+            numero_serie = int(float(valor('numero_serie'))) if valor('numero_serie') else None
+        except ValueError:
+            return None
+        # Sin fecha o sin repeticiones (cardio, series de tiempo) no es una serie de fuerza
+        if fecha is None or repeticiones <= 0 or peso < 0:
+            return None
+
+        return {
+            'fecha': fecha,
+            'rutina': valor('rutina')[:100] or 'Importada',
+            'duracion_minutos': _minutos(valor('duracion_minutos')),
+            'notas': valor('notas'),
+            'ejercicio_id': ejercicio_id,
+            'numero_serie': numero_serie,
+            'peso_kg': peso,
+            'repeticiones': repeticiones,
+            'rpe': min(10, max(1, rpe)) if rpe is not None else None,
+        }
+
+    def guardar(self, filas):
+        """Un lote de filas ya leídas: todo con bulk_create en una transacción"""
+        importacion = self.importacion
+        with transaction.atomic():
+            nuevas = {fila['rutina'] for fila in filas} - set(self.rutinas)
+            for rutina in Rutina.objects.bulk_create([
+                Rutina(usuario_id=self.usuario_id, nombre=nombre, importacion=importacion,
+                       descripcion=f'Importada de {importacion.nombre_fichero}'[:200])
+                for nombre in sorted(nuevas)
+            ]):
+                self.rutinas[rutina.nombre] = rutina.id
+
+            nuevos = []
+            for fila in filas:
+                clave = (self.rutinas[fila['rutina']], fila['ejercicio_id'])
+                if clave not in self.ejercicios_rutina:
+                    self.ejercicios_rutina[clave] = None
+                    nuevos.append(EjercicioRutina(
+                        rutina_id=clave[0], ejercicio_id=clave[1],
+                        orden=sum(1 for rutina_id, _ in self.ejercicios_rutina if rutina_id == clave[0]),
+                    ))
+            for ejercicio_rutina in EjercicioRutina.objects.bulk_create(nuevos):
+                self.ejercicios_rutina[ejercicio_rutina.rutina_id, ejercicio_rutina.ejercicio_id] = ejercicio_rutina.id
+
+            nuevos = {}
+            for fila in filas:
+                clave = (fila['fecha'], fila['rutina'])
+                if clave not in self.entrenamientos and clave not in nuevos:
+                    nuevos[clave] = Entrenamiento(
+                        usuario_id=self.usuario_id, rutina_id=self.rutinas[fila['rutina']],
+                        fecha=fila['fecha'], duracion_minutos=fila['duracion_minutos'], notas=fila['notas'],
+                        ejercicios_pendientes=[], importacion=importacion,
+                    )
+            Entrenamiento.objects.bulk_create(nuevos.values())
+            for clave, entrenamiento in nuevos.items():
+                self.entrenamientos[clave] = entrenamiento.id
+
+            actualizado = connection.ops.adapt_datetimefield_value(timezone.now())
+            series = []
+            for fila in filas:
+                entrenamiento_id = self.entrenamientos[fila['fecha'], fila['rutina']]
+                ejercicio_rutina_id = self.ejercicios_rutina[self.rutinas[fila['rutina']], fila['ejercicio_id']]
+                clave = (entrenamiento_id, ejercicio_rutina_id)
+                numero_serie = fila['numero_serie'] or self.series_por_ejercicio.get(clave, 0) + 1
+                self.series_por_ejercicio[clave] = numero_serie
+                series.append((
+                    entrenamiento_id, ejercicio_rutina_id, numero_serie, fila['peso_kg'], fila['repeticiones'],
+                    fila['rpe'], estimar_1rm(fila['peso_kg'], fila['repeticiones'], fila['rpe']), actualizado,
+                ))
+            _insertar_series(series)
+
+            importacion.entrenamientos += len(nuevos)
+            importacion.series += len(series)
+            importacion.save(update_fields=[
+                'entrenamientos', 'series', 'filas_omitidas', 'ejercicios_desconocidos', 'actualizado',
+            ])
+
+
+# 📝 EXPLICACIÓN: Las series son casi todas las filas. bulk_create crea una
+# instancia de modelo por serie y prepara cada valor campo a campo (más de
+# la mitad del tiempo de importar 100k series); un INSERT con executemany
+# sobre tuplas hace lo mismo sin ese coste. Como bulk_create, no dispara
+# señales ni save(): el 1RM estimado ya va calculado en la tupla.
+COLUMNAS_SERIE = [
+    'entrenamiento_id', 'ejercicio_rutina_id', 'numero_serie', 'peso_kg', 'repeticiones', 'rpe', 'e1rm', 'actualizado',
+]
+
+
+def _insertar_series(series):
+    nombre = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        nombre(SerieEjercicio._meta.db_table),
+        ', '.join(nombre(SerieEjercicio._meta.get_field(campo).column) for campo in COLUMNAS_SERIE),
+        ', '.join(['%s'] * len(COLUMNAS_SERIE)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, series)
+
+
+def _deshacer(importacion):
+    """Borra lo que llegó a guardarse, por tandas y sin señales fila a fila"""
+    usuario_id = importacion.usuario_id
+    entrenamientos = list(Entrenamiento.objects.filter(importacion=importacion).values_list('id', flat=True))
+    for inicio in range(0, len(entrenamientos), 500):
+        tanda = entrenamientos[inicio:inicio + 500]
+        with transaction.atomic(), senales_suspendidas():
+            # Un cliente pudo sincronizar estas filas mientras se importaban
+            marcas = [
+                RegistroEliminado(usuario_id=usuario_id, modelo='serie', objeto_id=serie_id)
+                for serie_id in SerieEjercicio.objects.filter(entrenamiento_id__in=tanda).values_list('id', flat=True)
+            ] + [RegistroEliminado(usuario_id=usuario_id, modelo='entrenamiento', objeto_id=entrenamiento_id)
+                 for entrenamiento_id in tanda]
+            RegistroEliminado.objects.bulk_create(marcas, batch_size=1000)
+            Entrenamiento.objects.filter(id__in=tanda).delete()
+
+    with transaction.atomic(), senales_suspendidas():
+        rutinas = Rutina.objects.filter(importacion=importacion)
+        RegistroEliminado.objects.bulk_create(
+            [RegistroEliminado(usuario_id=usuario_id, modelo='ejercicio_rutina', objeto_id=ejercicio_rutina_id)
+             for ejercicio_rutina_id in EjercicioRutina.objects.filter(rutina__in=rutinas).values_list('id', flat=True)]
+            + [RegistroEliminado(usuario_id=usuario_id, modelo='rutina', objeto_id=rutina_id)
+               for rutina_id in rutinas.values_list('id', flat=True)],
+            batch_size=1000,
+        )
+        rutinas.delete()
+
+
+def _reconstruir_agregados(usuario):
+    agregados.reconstruir_resumenes(usuario)
+    agregados.reconstruir_records(usuario)
+    agregados.reconstruir_ultimos_rendimientos(usuario)
+    agregados.reconstruir_estadisticas(usuario)
+    agregados.actualizar_ranking_usuario(usuario.id)
+    cache_progreso.invalidar_usuario(usuario.id)
+
+
+def importar_csv(usuario, lineas, nombre_fichero='', lote=LOTE):
+    """
+    Importa un CSV (cualquier iterable de líneas de texto) al historial del
+    usuario. Devuelve la Importacion con el resultado; si falla la deja
+    como 'fallida', deshace lo guardado y relanza el error.
+    """
+    limpiar_interrumpidas(usuario)
+    importacion = Importacion.objects.create(usuario=usuario, nombre_fichero=nombre_fichero[:255])
+    try:
+        lector = csv.DictReader(lineas)
+        columnas = _columnas(lector.fieldnames)
+        importador = _Importador(importacion)
+
+        filas = []
+        for fila in lector:
+            datos = importador.leer(fila, columnas)
+            if datos is None:
+                importacion.filas_omitidas += 1
+                continue
+            filas.append(datos)
+            if len(filas) >= lote:
+                importador.guardar(filas)
+                filas = []
+        if filas:
+            importador.guardar(filas)
+        # Dentro del try: si la reconstrucción falla a medias también se deshace todo
+        _reconstruir_agregados(usuario)
+    except (csv.Error, UnicodeDecodeError) as error:
+        _fallida(importacion, error)
+        raise ErrorImportacion(f'El fichero no es un CSV válido en UTF-8: {error}') from error
+    except Exception as error:
+        _fallida(importacion, error)
+        raise
+
+    importacion.estado = 'completada'
+    importacion.save()
+    return importacion
+
+
+def _fallida(importacion, error):
+    _deshacer(importacion)
+    # La reconstrucción pudo llegar a contar lo importado
+    _reconstruir_agregados(importacion.usuario)
+    importacion.estado = 'fallida'
+    importacion.error = str(error) or error.__class__.__name__
+    importacion.save()
+
+
+def limpiar_interrumpidas(usuario=None):
+    """
+    Deshace las importaciones que se quedaron 'en_curso' porque el proceso
+    murió a medias. Devuelve cuántas había.
+    """
+    interrumpidas = Importacion.objects.filter(
+        estado='en_curso', actualizado__lt=timezone.now() - INTERRUMPIDA_TRAS
+    ).select_related('usuario')
+    if usuario is not None:
+        interrumpidas = interrumpidas.filter(usuario=usuario)
+    interrumpidas = list(interrumpidas)
+    for importacion in interrumpidas:
+        _fallida(importacion, 'Interrumpida: el proceso terminó antes de acabar')
+    return len(interrumpidas)
+
+
+# 📝 EXPLICACIÓN: Subida del CSV desde la web (/entrenamientos/importar/)
+@login_required
+def importar_historial(request):
+    if request.method == 'POST':
+        fichero = request.FILES.get('fichero')
+        if fichero is None:
+            messages.error(request, 'Elige un fichero CSV')
+            return redirect('importar_historial')
+
+        # Iterar un UploadedFile da sus líneas en bytes, sin leerlo entero
+        lineas = (linea.decode('utf-8-sig') for linea in fichero)
+        try:
+            importacion = importar_csv(request.user, lineas, fichero.name)
+        except ErrorImportacion as error:
+            messages.error(request, f'No se pudo importar: {error}')
+            return redirect('importar_historial')
+
+        messages.success(
+            request,
+            f'¡Importados {importacion.entrenamientos} entrenamientos y {importacion.series} series!'
+        )
+        if importacion.filas_omitidas:
+            messages.warning(request, f'{importacion.filas_omitidas} filas omitidas (mira el detalle abajo)')
+        return redirect('importar_historial')
+
+    return render(request, 'entrenamientos/importar.html', {
+        'importaciones': Importacion.objects.filter(usuario=request.user).order_by('-fecha')[:10],
+    })
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from gym import agregados
+from gym.models import Ejercicio
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula desde cero los rankings de fuerza con los récords de 1RM y los pesos actuales '
+        '(pensado para lanzarlo cada noche; durante el día se mueven solos)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ejercicio', type=int, help='Solo el ranking de este id de ejercicio')
+
+    def handle(self, *args, **options):
+        ejercicio = None
+        if options['ejercicio']:
+            ejercicio = Ejercicio.objects.filter(id=options['ejercicio']).first()
+            if ejercicio is None:
+                raise CommandError(f"No existe el ejercicio {options['ejercicio']}")
+
+        total = agregados.reconstruir_rankings(ejercicio)
+        self.stdout.write(self.style.SUCCESS(f'Puestos en los rankings: {total}'))
@@ -0,0 +1,41 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from gym import archivo
+
+
+class Command(BaseCommand):
+    help = 'Empaqueta las series de las sesiones antiguas en SesionArchivada (o las devuelve con --desarchivar)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=None,
+                            help='Archivar las sesiones con más de estos días (por defecto GYM_ARCHIVO_DIAS)')
+        parser.add_argument('--usuario', help='Solo las sesiones de este username')
+        parser.add_argument('--desarchivar', action='store_true',
+                            help='Devolver las series archivadas a SerieEjercicio')
+        parser.add_argument('--vacuum', action='store_true',
+                            help='Compactar el fichero de SQLite al terminar (VACUUM)')
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options['usuario']:
+            try:
+                usuario = User.objects.get(username=options['usuario'])
+            except User.DoesNotExist:
+                raise CommandError(f"No existe el usuario {options['usuario']}")
+        if options['dias'] is not None and options['dias'] < 0:
+            raise CommandError('--dias no puede ser negativo')
+
+        if options['desarchivar']:
+            sesiones, series = archivo.desarchivar(usuario=usuario)
+            self.stdout.write(self.style.SUCCESS(f'{sesiones} sesiones y {series} series desarchivadas'))
+        else:
+            sesiones, series = archivo.archivar(dias=options['dias'], usuario=usuario)
+            self.stdout.write(self.style.SUCCESS(f'{sesiones} sesiones y {series} series archivadas'))
+
+        # SQLite no devuelve al disco las páginas libres hasta un VACUUM
+        if options['vacuum'] and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+            self.stdout.write('Base de datos compactada')
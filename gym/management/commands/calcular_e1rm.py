@@ -0,0 +1,72 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from gym import agregados, cache_progreso
+from gym.fuerza import estimar_1rm
+from gym.models import SerieEjercicio
+
+
+class Command(BaseCommand):
+    help = (
+        'Calcula el 1RM estimado de las series guardadas antes de que existiera '
+        '(o de todas con --todas) y regenera resúmenes y récords'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', help='Solo las series de este username')
+        parser.add_argument('--todas', action='store_true', help='Recalcular también las que ya tienen e1rm')
+        parser.add_argument('--lote', type=int, default=1000, help='Filas por UPDATE de bulk_update')
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options['usuario']:
+            try:
+                usuario = User.objects.get(username=options['usuario'])
+            except User.DoesNotExist:
+                raise CommandError(f"No existe el usuario {options['usuario']}")
+
+        series = SerieEjercicio.objects.order_by('id')
+        if usuario is not None:
+            series = series.filter(entrenamiento__usuario=usuario)
+        if not options['todas']:
+            series = series.filter(e1rm__isnull=True)
+
+        lote = options['lote']
+        cambiadas = []
+        total = 0
+        # values_list() + iterator(): tuplas sueltas, sin cargar todas las series a la vez
+        # (only() no vale: la señal post_init de SerieEjercicio lee campos diferidos)
+        filas = series.values_list('id', 'peso_kg', 'repeticiones', 'rpe', 'e1rm')
+        for serie_id, peso, repeticiones, rpe, anterior in filas.iterator(chunk_size=lote):
+            e1rm = estimar_1rm(peso, repeticiones, rpe)
+            if e1rm != anterior:
+                cambiadas.append(SerieEjercicio(id=serie_id, e1rm=e1rm))
+            if len(cambiadas) >= lote:
+                total += self.guardar(cambiadas)
+                cambiadas = []
+        total += self.guardar(cambiadas)
+        self.stdout.write(self.style.SUCCESS(f'Series con 1RM estimado actualizado: {total}'))
+
+        # El mejor 1RM de cada sesión, los récords y el último rendimiento llevan e1rm
+        total = agregados.reconstruir_resumenes(usuario)
+        self.stdout.write(self.style.SUCCESS(f'Resúmenes sesión × ejercicio: {total}'))
+        total = agregados.reconstruir_records(usuario)
+        self.stdout.write(self.style.SUCCESS(f'Récords personales: {total}'))
+        total = agregados.reconstruir_ultimos_rendimientos(usuario)
+        self.stdout.write(self.style.SUCCESS(f'Últimos rendimientos: {total}'))
+        total = agregados.reconstruir_rankings()
+        self.stdout.write(self.style.SUCCESS(f'Puestos en los rankings: {total}'))
+
+        if usuario is not None:
+            cache_progreso.invalidar_usuario(usuario.id)
+        else:
+            for usuario_id in User.objects.values_list('id', flat=True):
+                cache_progreso.invalidar_usuario(usuario_id)
+
+    def guardar(self, series):
+        # bulk_update no dispara señales ni toca `actualizado`: el cliente
+        # no necesita volver a sincronizar las series por un dato derivado
+        with transaction.atomic():
+            SerieEjercicio.objects.bulk_update(series, ['e1rm'])
+        return len(series)
@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from gym import cache_progreso
+from gym.management.commands.prueba_carga import percentil
+from gym.views import (
+    calcular_estadisticas_generales, calcular_volumen_sesiones, encontrar_prs, ultimos_entrenamientos,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara la latencia del dashboard de progreso por WSGI (vista síncrona) '
+        'y por ASGI (vista async que calcula sus partes a la vez), sin caché.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', help='Username a medir (por defecto el primero de generar_datos)')
+        parser.add_argument('--repeticiones', type=int, default=30)
+        parser.add_argument('--sesiones', type=int, default=50, help='Sesiones en el gráfico (?sesiones=N)')
+
+    def handle(self, *args, **options):
+        if options['usuario']:
+            usuario = User.objects.filter(username=options['usuario']).first()
+        else:
+            usuario = User.objects.filter(username__startswith='carga').order_by('id').first()
+        if usuario is None:
+            raise CommandError('No hay usuario que medir: ejecuta antes generar_datos o usa --usuario')
+
+        consulta = f'?sesiones={options["sesiones"]}'
+        repeticiones = options['repeticiones']
+        self.stdout.write(f'Usuario {usuario.username}, {repeticiones} peticiones por camino, sin caché')
+
+        self.partes(usuario, {'sesiones': options['sesiones']}, repeticiones)
+
+        # Los clientes de prueba de Django siempre mandan Host: testserver
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            wsgi = self.medir_wsgi(usuario, reverse('progreso_dashboard') + consulta, repeticiones)
+            asgi = asyncio.run(self.medir_asgi(usuario, reverse('progreso_dashboard_async') + consulta, repeticiones))
+
+        for camino, tiempos in (('WSGI (síncrona)', wsgi), ('ASGI (async)', asgi)):
+            tiempos.sort()
+            self.stdout.write(
+                f'{camino:<18} p50 {percentil(tiempos, 50) * 1000:7.1f}ms'
+                f'   p95 {percentil(tiempos, 95) * 1000:7.1f}ms'
+            )
+
+    def medir_wsgi(self, usuario, url, repeticiones):
+        cliente = Client()
+        cliente.force_login(usuario)
+        tiempos = []
+        for _ in range(repeticiones):
+            # Cambiar la marca obliga a recalcular (si no, se mediría la caché)
+            cache_progreso.invalidar_usuario(usuario.id)
+            inicio = time.perf_counter()
+            respuesta = cliente.get(url)
+            tiempos.append(time.perf_counter() - inicio)
+            if respuesta.status_code != 200:
+                raise CommandError(f'WSGI respondió {respuesta.status_code}')
+        return tiempos
+
+    async def medir_asgi(self, usuario, url, repeticiones):
+        cliente = AsyncClient()
+        await sync_to_async(cliente.force_login)(usuario)
+        tiempos = []
+        for _ in range(repeticiones):
+            await sync_to_async(cache_progreso.invalidar_usuario)(usuario.id)
+            inicio = time.perf_counter()
+            respuesta = await cliente.get(url)
+            tiempos.append(time.perf_counter() - inicio)
+            if respuesta.status_code != 200:
+                raise CommandError(f'ASGI respondió {respuesta.status_code}')
+        return tiempos
+
+    def partes(self, usuario, ventana, repeticiones):
+        """Mediana de cada parte del dashboard por separado: suma frente a la más lenta"""
+        partes = {
+            'estadísticas': lambda: calcular_estadisticas_generales(usuario),
+            'récords': lambda: encontrar_prs(usuario),
+            'gráfico': lambda: calcular_volumen_sesiones(usuario, **ventana),
+            'recientes': lambda: ultimos_entrenamientos(usuario),
+        }
+        medianas = {}
+        for nombre, calcular in partes.items():
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                calcular()
+                tiempos.append(time.perf_counter() - inicio)
+            tiempos.sort()
+            medianas[nombre] = percentil(tiempos, 50)
+            self.stdout.write(f'  {nombre:<14} {medianas[nombre] * 1000:7.1f}ms')
+        self.stdout.write(
+            f'  suma {sum(medianas.values()) * 1000:.1f}ms, la más lenta {max(medianas.values()) * 1000:.1f}ms'
+        )
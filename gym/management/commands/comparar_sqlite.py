@@ -0,0 +1,68 @@
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide escrituras concurrentes (flujo entrenamiento de prueba_carga) con '
+        'SQLite por defecto y con el perfil GYM_SQLITE_PRODUCCION=1. Cada '
+        'medición va sobre una copia de la base de datos actual.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=8)
+        parser.add_argument('--flujos', type=int, default=5, help='Entrenamientos completos por hilo')
+        parser.add_argument('--prefijo', default='carga', help='Prefijo de los usuarios de generar_datos')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Este comando solo tiene sentido con SQLite')
+        original = Path(settings.DATABASES['default']['NAME'])
+        if not original.exists():
+            raise CommandError(f'No existe {original}: migra y ejecuta antes generar_datos')
+
+        resultados = {}
+        with tempfile.TemporaryDirectory() as carpeta:
+            for nombre, perfil in (('por defecto', '0'), ('producción', '1')):
+                # Copia nueva en cada vuelta: WAL se queda grabado en el fichero
+                copia = Path(carpeta) / f'perfil{perfil}.sqlite3'
+                shutil.copyfile(original, copia)
+
+                self.stdout.write(self.style.MIGRATE_HEADING(f'SQLite {nombre}'))
+                salida = subprocess.run(
+                    [
+                        sys.executable, str(settings.BASE_DIR / 'manage.py'), 'prueba_carga',
+                        '--flujo', 'entrenamiento',
+                        '--hilos', str(options['hilos']),
+                        '--flujos', str(options['flujos']),
+                        '--prefijo', options['prefijo'],
+                    ],
+                    env={**os.environ, 'GYM_SQLITE_NOMBRE': str(copia), 'GYM_SQLITE_PRODUCCION': perfil},
+                    capture_output=True, text=True,
+                )
+                self.stdout.write(salida.stdout)
+                if salida.returncode:
+                    raise CommandError(salida.stderr)
+                resultados[nombre] = self.leer(salida.stdout)
+
+        antes, despues = resultados['por defecto'], resultados['producción']
+        self.stdout.write(self.style.SUCCESS(
+            f'registrar_serie: {antes[0]:.1f} → {despues[0]:.1f} escrituras/s, '
+            f'errores {antes[1]} → {despues[1]}'
+        ))
+
+    def leer(self, salida):
+        """(peticiones/s, errores) de registrar_serie en el informe de prueba_carga"""
+        fila = re.search(r'^registrar_serie\s+(\d+)\s+([\d.]+).*?(\d+)$', salida, re.MULTILINE)
+        if not fila:
+            return 0.0, 0
+        return float(fila.group(2)), int(fila.group(3))
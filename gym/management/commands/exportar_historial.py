@@ -0,0 +1,29 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from gym.exportar import FILAS_POR_LOTE, FORMATOS, exportar
+
+
+class Command(BaseCommand):
+    help = 'Exporta el historial completo de un usuario en CSV o JSON Lines, sin cargarlo en memoria'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usuario', help='Username a exportar')
+        parser.add_argument('--formato', choices=sorted(FORMATOS), default='csv')
+        parser.add_argument('--salida', help='Fichero de destino (por defecto la salida estándar)')
+        parser.add_argument('--lote', type=int, default=FILAS_POR_LOTE, help='Filas por lectura y por escritura')
+
+    def handle(self, *args, **options):
+        usuario = User.objects.filter(username=options['usuario']).first()
+        if usuario is None:
+            raise CommandError(f"No existe el usuario {options['usuario']}")
+
+        trozos = exportar(usuario, options['formato'], options['lote'])
+        if options['salida']:
+            # newline='': el módulo csv ya escribe sus propios \r\n
+            with open(options['salida'], 'w', encoding='utf-8', newline='') as fichero:
+                fichero.writelines(trozos)
+            self.stderr.write(self.style.SUCCESS(f"Historial de {usuario.username} en {options['salida']}"))
+        else:
+            for trozo in trozos:
+                self.stdout.write(trozo, ending='')
@@ -0,0 +1,196 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from gym import agregados, catalogo
+from gym.models import Ejercicio, EjercicioRutina, Entrenamiento, Perfil, Rutina, SerieEjercicio
+
+
+# Catálogo mínimo por si la base de datos no tiene ejercicios todavía:
+# (nombre, grupo muscular, peso inicial típico en kg)
+CATALOGO_BASE = [
+    ('Press banca', 'pecho', 60),
+    ('Press inclinado con mancuernas', 'pecho', 22),
+    ('Aperturas', 'pecho', 14),
+    ('Dominadas lastradas', 'espalda', 10),
+    ('Remo con barra', 'espalda', 55),
+    ('Jalón al pecho', 'espalda', 50),
+    ('Sentadilla', 'piernas', 80),
+    ('Peso muerto', 'piernas', 100),
+    ('Prensa', 'piernas', 150),
+    ('Zancadas', 'piernas', 20),
+    ('Press militar', 'hombros', 40),
+    ('Elevaciones laterales', 'hombros', 10),
+    ('Curl de bíceps', 'brazos', 12),
+    ('Extensiones de tríceps', 'brazos', 25),
+    ('Plancha lastrada', 'core', 10),
+    ('Rueda abdominal', 'core', 5),
+]
+
+# Peso inicial cuando el ejercicio ya existía y no está en el catálogo
+PESO_INICIAL_POR_GRUPO = {
+    'pecho': 50, 'espalda': 45, 'piernas': 80, 'hombros': 30,
+    'brazos': 15, 'core': 10, 'cardio': 5,
+}
+
+REPETICIONES_OBJETIVO = ['5', '6-8', '8-12', '10-15']
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera usuarios sintéticos con rutinas y entrenamientos realistas para '
+        'pruebas de carga. Con la misma semilla genera siempre las mismas cifras '
+        '(las fechas terminan el día en que se ejecuta).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=10, help='Número de usuarios (N)')
+        parser.add_argument('--rutinas', type=int, default=3, help='Rutinas por usuario (M)')
+        parser.add_argument('--sesiones', type=int, default=50, help='Entrenamientos por usuario (K)')
+        parser.add_argument('--ejercicios-por-rutina', type=int, default=5)
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--prefijo', default='carga', help='Los usuarios se llaman <prefijo>1, <prefijo>2...')
+        parser.add_argument('--clave', default='gymprogress', help='Contraseña de todos los usuarios generados')
+        parser.add_argument('--lote', type=int, default=1000, help='Filas por INSERT de bulk_create')
+        parser.add_argument('--borrar', action='store_true', help='Borra antes los usuarios con ese prefijo')
+
+    def handle(self, *args, **options):
+        azar = random.Random(options['semilla'])
+        prefijo = options['prefijo']
+        nombres = [f'{prefijo}{numero}' for numero in range(1, options['usuarios'] + 1)]
+
+        existentes = User.objects.filter(username__in=nombres)
+        if existentes.exists():
+            if not options['borrar']:
+                raise CommandError(f'Ya hay usuarios {prefijo}N; usa --borrar para regenerarlos')
+            existentes.delete()
+
+        ejercicios = self.catalogo()
+        if len(ejercicios) < options['ejercicios_por_rutina']:
+            raise CommandError(f'Solo hay {len(ejercicios)} ejercicios en el catálogo')
+
+        # Un solo hash para todos: make_password es lento a propósito
+        clave = make_password(options['clave'])
+        series_totales = 0
+        for username in nombres:
+            with transaction.atomic():
+                usuario, series = self.generar_usuario(azar, username, clave, ejercicios, options)
+            series_totales += series
+
+            # bulk_create no dispara señales: los agregados se calculan de una vez
+            agregados.reconstruir_resumenes(usuario)
+            agregados.reconstruir_records(usuario)
+            agregados.reconstruir_ultimos_rendimientos(usuario)
+            agregados.reconstruir_estadisticas(usuario)
+            self.stdout.write(f'{username}: {options["sesiones"]} entrenamientos, {series} series')
+
+        # Los puestos dependen de todos los usuarios: se colocan al final
+        agregados.reconstruir_rankings()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(nombres)} usuarios y {series_totales} series generados (semilla {options["semilla"]})'
+        ))
+
+    def catalogo(self):
+        """Devuelve [(ejercicio, peso inicial)], creando el catálogo base si está vacío"""
+        if not Ejercicio.objects.exists():
+            Ejercicio.objects.bulk_create([
+                Ejercicio(nombre=nombre, grupo_muscular=grupo) for nombre, grupo, _ in CATALOGO_BASE
+            ])
+            catalogo.invalidar()  # bulk_create no dispara señales
+        pesos = {nombre: peso for nombre, _, peso in CATALOGO_BASE}
+        return [
+            (ejercicio, pesos.get(ejercicio.nombre, PESO_INICIAL_POR_GRUPO[ejercicio.grupo_muscular]))
+            for ejercicio in Ejercicio.objects.order_by('id')
+        ]
+
+    def generar_usuario(self, azar, username, clave, ejercicios, options):
+        lote = options['lote']
+        usuario = User.objects.create(username=username, password=clave)
+        Perfil.objects.create(usuario=usuario, peso_corporal=round(azar.uniform(55, 105), 1))
+
+        # Cada usuario tiene su propio nivel de fuerza
+        nivel = azar.uniform(0.6, 1.4)
+
+        rutinas = Rutina.objects.bulk_create([
+            Rutina(usuario=usuario, nombre=f'Rutina {letra}')
+            for letra in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'[:options['rutinas']]
+        ])
+        ejercicios_rutina = EjercicioRutina.objects.bulk_create([
+            EjercicioRutina(
+                rutina=rutina,
+                ejercicio=ejercicio,
+                series=azar.choice([3, 3, 4, 4, 5]),
+                repeticiones=azar.choice(REPETICIONES_OBJETIVO),
+                descanso=azar.choice([1, 1.5, 2, 3]),
+                orden=orden,
+            )
+            for rutina in rutinas
+            for orden, (ejercicio, _) in enumerate(azar.sample(ejercicios, options['ejercicios_por_rutina']), start=1)
+        ], batch_size=lote)
+        peso_inicial = {ejercicio.id: peso for ejercicio, peso in ejercicios}
+        por_rutina = {}
+        for ejercicio_rutina in ejercicios_rutina:
+            por_rutina.setdefault(ejercicio_rutina.rutina_id, []).append(ejercicio_rutina)
+
+        # Fechas: cada 1-4 días hacia atrás desde ayer, a una hora cualquiera
+        dias = []
+        dia = 1
+        for _ in range(options['sesiones']):
+            dias.append(dia)
+            dia += azar.randint(1, 4)
+        hoy = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        entrenamientos = Entrenamiento.objects.bulk_create([
+            Entrenamiento(
+                usuario=usuario,
+                rutina=rutinas[numero % len(rutinas)],
+                fecha=hoy - timedelta(days=dias_atras) + timedelta(hours=azar.randint(7, 21), minutes=azar.randint(0, 59)),
+                duracion_minutos=azar.randint(40, 100),
+                ejercicios_pendientes=[],  # terminados: cursor sin nada pendiente
+            )
+            for numero, dias_atras in enumerate(reversed(dias))
+        ], batch_size=lote)
+
+        series = []
+        total = 0
+        for numero, entrenamiento in enumerate(entrenamientos):
+            for ejercicio_rutina in por_rutina[entrenamiento.rutina_id]:
+                series.extend(self.series_de(azar, entrenamiento, ejercicio_rutina, numero, nivel, peso_inicial))
+            if len(series) >= lote:
+                SerieEjercicio.objects.bulk_create(series, batch_size=lote)
+                total += len(series)
+                series = []
+        SerieEjercicio.objects.bulk_create(series, batch_size=lote)
+        return usuario, total + len(series)
+
+    def series_de(self, azar, entrenamiento, ejercicio_rutina, numero_sesion, nivel, peso_inicial):
+        """Series de un ejercicio en una sesión: progresión lenta, fatiga dentro de la sesión"""
+        # ~1% más por sesión al principio, estancándose con el tiempo, con días buenos y malos
+        progreso = 1 + 0.25 * (1 - 1 / (1 + numero_sesion / 40))
+        peso = peso_inicial[ejercicio_rutina.ejercicio_id] * nivel * progreso * azar.uniform(0.95, 1.05)
+        peso = max(2.5, round(peso / 2.5) * 2.5)  # discos de 1.25 kg por lado
+
+        minimo, _, maximo = ejercicio_rutina.repeticiones.partition('-')
+        minimo, maximo = int(minimo), int(maximo or minimo)
+
+        # Algunas veces se queda a medias (1 serie menos)
+        total = ejercicio_rutina.series - (1 if azar.random() < 0.1 else 0)
+        resultado = []
+        for numero_serie in range(1, total + 1):
+            repeticiones = max(1, azar.randint(minimo, maximo) - (numero_serie - 1) // 2)
+            rpe = min(10, azar.choice([6, 7, 7, 8, 8, 9]) + (numero_serie - 1) // 2)
+            resultado.append(SerieEjercicio(
+                entrenamiento=entrenamiento,
+                ejercicio_rutina=ejercicio_rutina,
+                numero_serie=numero_serie,
+                peso_kg=peso,
+                repeticiones=repeticiones,
+                rpe=rpe,
+            ))
+            resultado[-1].calcular_e1rm()  # bulk_create no pasa por save()
+        return resultado
@@ -0,0 +1,35 @@
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from gym.importar import LOTE, ErrorImportacion, importar_csv
+
+
+class Command(BaseCommand):
+    help = 'Importa un CSV de historial (Strong, Hevy o exportar_historial) a un usuario'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usuario', help='Username que recibe el historial')
+        parser.add_argument('fichero', help='Ruta del CSV')
+        parser.add_argument('--lote', type=int, default=LOTE, help='Filas por transacción')
+
+    def handle(self, *args, **options):
+        usuario = User.objects.filter(username=options['usuario']).first()
+        if usuario is None:
+            raise CommandError(f"No existe el usuario {options['usuario']}")
+
+        try:
+            # utf-8-sig: Excel añade un BOM al guardar en UTF-8
+            with open(options['fichero'], encoding='utf-8-sig', newline='') as fichero:
+                importacion = importar_csv(usuario, fichero, Path(options['fichero']).name, options['lote'])
+        except (OSError, ErrorImportacion) as error:
+            raise CommandError(str(error))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{importacion.entrenamientos} entrenamientos y {importacion.series} series importados'
+        ))
+        if importacion.filas_omitidas:
+            self.stdout.write(self.style.WARNING(f'{importacion.filas_omitidas} filas omitidas'))
+        for nombre, filas in sorted(importacion.ejercicios_desconocidos.items(), key=lambda par: -par[1]):
+            self.stdout.write(f'  sin ejercicio en el catálogo: {nombre} ({filas} filas)')
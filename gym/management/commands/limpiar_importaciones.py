@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from gym.importar import INTERRUMPIDA_TRAS, limpiar_interrumpidas
+
+
+class Command(BaseCommand):
+    help = 'Deshace las importaciones que se quedaron a medias porque el proceso murió'
+
+    def handle(self, *args, **options):
+        interrumpidas = limpiar_interrumpidas()
+        self.stdout.write(self.style.SUCCESS(
+            f'{interrumpidas} importaciones interrumpidas deshechas (sin cambios desde hace más de {INTERRUMPIDA_TRAS})'
+        ))
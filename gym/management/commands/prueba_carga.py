@@ -0,0 +1,191 @@
+import logging
+import math
+import random
+import re
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.urls import resolve, reverse
+
+from gym.models import Rutina
+
+
+# Peso de cada flujo en la mezcla: lo normal es mirar más que registrar
+FLUJOS = [
+    ('entrenamiento', 2),
+    ('progreso', 4),
+    ('historial', 4),
+]
+
+
+def percentil(valores_ordenados, p):
+    """Percentil por rango más cercano (los valores ya vienen ordenados)"""
+    if not valores_ordenados:
+        return 0
+    posicion = max(1, math.ceil(p / 100 * len(valores_ordenados)))
+    return valores_ordenados[posicion - 1]
+
+
+class Medidas:
+    """Lo que van anotando todos los hilos (siempre bajo el cerrojo)"""
+
+    def __init__(self):
+        self.tiempos = {}   # ruta → [segundos]
+        self.errores = {}   # ruta → número de errores
+        self.causas = {}    # mensaje de error → veces
+
+
+class Usuario:
+    """
+    Un usuario simulado: un Client propio (su sesión) que va anotando
+    cuánto tarda cada petición, agrupado por nombre de ruta.
+    """
+
+    def __init__(self, usuario, rutinas, host, medidas, cerrojo):
+        self.cliente = Client(HTTP_HOST=host)
+        self.cliente.force_login(usuario)
+        self.rutinas = rutinas
+        self.medidas = medidas
+        self.cerrojo = cerrojo
+
+    def pedir(self, metodo, url, datos=None):
+        ruta = resolve(url.split('?')[0]).url_name
+        inicio = time.perf_counter()
+        causa = None
+        try:
+            respuesta = getattr(self.cliente, metodo)(url, datos)
+            if respuesta.status_code >= 400:
+                causa = f'HTTP {respuesta.status_code}'
+        except Exception as error:  # p. ej. "database is locked": se anota y seguimos
+            respuesta, causa = None, f'{type(error).__name__}: {error}'
+        duracion = time.perf_counter() - inicio
+
+        with self.cerrojo:
+            self.medidas.tiempos.setdefault(ruta, []).append(duracion)
+            if causa:
+                self.medidas.errores[ruta] = self.medidas.errores.get(ruta, 0) + 1
+                self.medidas.causas[causa] = self.medidas.causas.get(causa, 0) + 1
+        return respuesta
+
+    def entrenamiento(self, azar):
+        """Empieza una rutina y registra series hasta que el cursor la da por terminada"""
+        respuesta = self.pedir('get', reverse('iniciar_entrenamiento', args=[azar.choice(self.rutinas)]))
+        if respuesta is None or respuesta.status_code != 302:
+            return
+        url = respuesta.url
+        for _ in range(60):  # tope por si algo va mal: una rutina no tiene tantas series
+            respuesta = self.pedir('post', url, {
+                'peso': azar.choice([40, 50, 60, 70, 80]),
+                'repeticiones': azar.randint(5, 12),
+                'rpe': azar.randint(6, 10),
+            })
+            if respuesta is None or respuesta.status_code != 302:
+                return
+            # Tras la última serie, registrar_serie redirige a finalizar
+            if 'finalizar' in respuesta.url:
+                break
+            self.pedir('get', url)
+        self.pedir('get', respuesta.url)
+
+    def progreso(self, azar):
+        self.pedir('get', reverse('progreso_dashboard'))
+
+    def historial(self, azar):
+        respuesta = self.pedir('get', reverse('historial_entrenamientos'))
+        # A veces se pasa a la página siguiente
+        if respuesta is not None and azar.random() < 0.5:
+            siguiente = re.search(r'href="\?antes=([^"]+)"', respuesta.content.decode())
+            if siguiente:
+                self.pedir('get', reverse('historial_entrenamientos') + '?antes=' + siguiente.group(1))
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga en proceso: varios hilos repiten flujos típicos '
+        '(registrar un entrenamiento, ver el progreso, navegar el historial) '
+        'con los usuarios de generar_datos y miden latencias por ruta. '
+        'Escribe en la base de datos: úsalo sobre una copia.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=8)
+        parser.add_argument('--flujos', type=int, default=25, help='Flujos que repite cada hilo')
+        parser.add_argument('--prefijo', default='carga', help='Prefijo de los usuarios de generar_datos')
+        parser.add_argument('--flujo', choices=[nombre for nombre, _ in FLUJOS],
+                            help='Repetir solo este flujo (p. ej. entrenamiento para medir escrituras)')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--host', default='localhost', help='Cabecera Host (tiene que estar en ALLOWED_HOSTS)')
+
+    def handle(self, *args, **options):
+        usuarios = list(User.objects.filter(username__startswith=options['prefijo']).order_by('id'))
+        if not usuarios:
+            raise CommandError(f'No hay usuarios {options["prefijo"]}N: ejecuta antes generar_datos')
+
+        rutinas = {}
+        for rutina_id, usuario_id in Rutina.objects.filter(
+            usuario__in=usuarios, activa=True
+        ).values_list('id', 'usuario_id'):
+            rutinas.setdefault(usuario_id, []).append(rutina_id)
+
+        medidas, cerrojo = Medidas(), threading.Lock()
+        flujos = [(nombre, peso) for nombre, peso in FLUJOS if options['flujo'] in (None, nombre)]
+        nombres, pesos = zip(*flujos)
+
+        def hilo(numero):
+            azar = random.Random(options['semilla'] + numero)
+            usuario = usuarios[numero % len(usuarios)]
+            simulado = Usuario(usuario, rutinas.get(usuario.id, []), options['host'], medidas, cerrojo)
+            try:
+                for _ in range(options['flujos']):
+                    flujo = azar.choices(nombres, pesos)[0]
+                    if flujo == 'entrenamiento' and not simulado.rutinas:
+                        flujo = 'progreso'
+                    getattr(simulado, flujo)(azar)
+            finally:
+                # Cada hilo abre su propia conexión: hay que cerrarla
+                connections.close_all()
+
+        # Los errores se cuentan en el informe: sin el traceback de cada uno
+        registro = logging.getLogger('django.request')
+        nivel = registro.level
+        registro.setLevel(logging.CRITICAL)
+
+        hilos = [threading.Thread(target=hilo, args=(numero,)) for numero in range(options['hilos'])]
+        inicio = time.perf_counter()
+        try:
+            for h in hilos:
+                h.start()
+            for h in hilos:
+                h.join()
+        finally:
+            registro.setLevel(nivel)
+        total = time.perf_counter() - inicio
+
+        self.informe(medidas, total, options)
+
+    def informe(self, medidas, total, options):
+        tiempos, errores = medidas.tiempos, medidas.errores
+        peticiones = sum(len(valores) for valores in tiempos.values())
+        self.stdout.write(
+            f'{options["hilos"]} hilos, {peticiones} peticiones en {total:.1f}s '
+            f'→ {peticiones / total:.1f} peticiones/s'
+        )
+        self.stdout.write(f'{"ruta":<28}{"n":>6}{"req/s":>9}{"p50":>9}{"p95":>9}{"p99":>9}{"errores":>9}')
+        for ruta, valores in sorted(tiempos.items()):
+            valores.sort()
+            p50, p95, p99 = (percentil(valores, p) * 1000 for p in (50, 95, 99))
+            self.stdout.write(
+                f'{ruta:<28}{len(valores):>6}{len(valores) / total:>9.1f}'
+                f'{p50:>7.1f}ms{p95:>7.1f}ms{p99:>7.1f}ms{errores.get(ruta, 0):>9}'
+            )
+
+        if errores:
+            self.stdout.write(self.style.WARNING(f'{sum(errores.values())} peticiones con error:'))
+            for causa, veces in sorted(medidas.causas.items(), key=lambda par: -par[1]):
+                self.stdout.write(f'  {veces:>5} × {causa}')
+        else:
+            self.stdout.write(self.style.SUCCESS('Sin errores'))
@@ -0,0 +1,38 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from gym import agregados
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde cero los agregados precalculados de progreso'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', help='Solo reconstruir los datos de este username')
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options['usuario']:
+            try:
+                usuario = User.objects.get(username=options['usuario'])
+            except User.DoesNotExist:
+                raise CommandError(f"No existe el usuario {options['usuario']}")
+
+        total = agregados.reconstruir_resumenes(usuario)
+        self.stdout.write(self.style.SUCCESS(f'Resúmenes sesión × ejercicio: {total}'))
+
+        total = agregados.reconstruir_records(usuario)
+        self.stdout.write(self.style.SUCCESS(f'Récords personales: {total}'))
+
+        total = agregados.reconstruir_ultimos_rendimientos(usuario)
+        self.stdout.write(self.style.SUCCESS(f'Últimos rendimientos: {total}'))
+
+        total, desviadas = agregados.reconstruir_estadisticas(usuario)
+        self.stdout.write(self.style.SUCCESS(f'Estadísticas de usuario: {total} ({desviadas} corregidas)'))
+
+        # Los puestos dependen de todos los usuarios: con --usuario solo se recoloca a ese
+        if usuario is not None:
+            agregados.actualizar_ranking_usuario(usuario.id)
+        else:
+            total = agregados.reconstruir_rankings()
+            self.stdout.write(self.style.SUCCESS(f'Puestos en los rankings: {total}'))
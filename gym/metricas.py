@@ -0,0 +1,193 @@
+"""
+Métricas de rendimiento por vista, en memoria y en formato Prometheus.
+
+MetricasMiddleware mide una fracción de las peticiones
+(GYM_METRICAS_MUESTREO, de 0 a 1) y acumula por vista (nombre de la ruta)
+y método:
+- histograma de latencia,
+- número y tiempo de las consultas SQL (connection.execute_wrapper),
+- bytes de respuesta y respuestas por código (2xx, 4xx...).
+
+Con el muestreo a 0 (por defecto) el middleware solo comprueba un
+atributo y llama a la vista: no toca el reloj, ni la base de datos, ni el
+cerrojo. GET /metrics devuelve lo acumulado en texto de Prometheus a
+quien traiga "Authorization: Bearer <GYM_METRICAS_TOKEN>" o sea staff.
+
+Con GYM_METRICAS_LENTAS_MS > 0, cada petición medida que tarde más se
+escribe en el logger 'gym.metricas' con sus consultas más lentas.
+
+Los datos son por proceso: con varios workers cada uno tiene los suyos
+(Prometheus suma lo que ve en cada scrape). En las respuestas en
+streaming (exportar historial) se mide hasta que empieza la respuesta y
+no se cuentan sus bytes ni sus consultas.
+"""
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger('gym.metricas')
+
+# Límites de las cubetas del histograma de latencia (segundos)
+CUBETAS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+# Consultas que salen en el log de peticiones lentas
+CONSULTAS_EN_LOG = 5
+
+_cerrojo = threading.Lock()
+_vistas = {}  # (vista, método) → _Acumulado
+
+
+class _Acumulado:
+    __slots__ = ('cubetas', 'peticiones', 'segundos', 'consultas', 'segundos_sql', 'bytes', 'estados')
+
+    def __init__(self):
+        self.cubetas = [0] * len(CUBETAS)
+        self.peticiones = 0
+        self.segundos = 0.0
+        self.consultas = 0
+        self.segundos_sql = 0.0
+        self.bytes = 0
+        self.estados = {}  # '2xx' → respuestas
+
+
+def registrar(vista, metodo, estado, segundos, consultas, segundos_sql, bytes_respuesta):
+    with _cerrojo:
+        acumulado = _vistas.get((vista, metodo))
+        if acumulado is None:
+            acumulado = _vistas[vista, metodo] = _Acumulado()
+        for posicion, limite in enumerate(CUBETAS):
+            if segundos <= limite:
+                acumulado.cubetas[posicion] += 1
+                break
+        acumulado.peticiones += 1
+        acumulado.segundos += segundos
+        acumulado.consultas += consultas
+        acumulado.segundos_sql += segundos_sql
+        acumulado.bytes += bytes_respuesta
+        clase = f'{estado // 100}xx'
+        acumulado.estados[clase] = acumulado.estados.get(clase, 0) + 1
+
+
+def reiniciar():
+    with _cerrojo:
+        _vistas.clear()
+
+
+class _ContadorSQL:
+    """execute_wrapper: cuenta y cronometra las consultas (y guarda su SQL si hace falta para el log)"""
+
+    def __init__(self, guardar_sql):
+        self.consultas = 0
+        self.segundos = 0.0
+        self.sql = [] if guardar_sql else None
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.consultas += 1
+            self.segundos += duracion
+            if self.sql is not None:
+                self.sql.append((duracion, sql))
+
+
+class MetricasMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.muestreo = float(getattr(settings, 'GYM_METRICAS_MUESTREO', 0))
+        self.lentas = float(getattr(settings, 'GYM_METRICAS_LENTAS_MS', 0)) / 1000
+
+    def __call__(self, request):
+        # 📝 EXPLICACIÓN: El camino sin muestreo tiene que costar casi nada
+        if not self.muestreo or (self.muestreo < 1 and random.random() >= self.muestreo):
+            return self.get_response(request)
+
+        contador = _ContadorSQL(guardar_sql=bool(self.lentas))
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(contador):
+            respuesta = self.get_response(request)
+        segundos = time.perf_counter() - inicio
+
+        coincidencia = request.resolver_match
+        vista = coincidencia.view_name if coincidencia else 'sin_ruta'
+        tamano = 0 if respuesta.streaming else len(respuesta.content)
+        registrar(vista, request.method, respuesta.status_code, segundos,
+                  contador.consultas, contador.segundos, tamano)
+
+        if self.lentas and segundos >= self.lentas:
+            peores = sorted(contador.sql, key=lambda consulta: consulta[0], reverse=True)[:CONSULTAS_EN_LOG]
+            logger.warning(
+                'Petición lenta: %s %s (%s) %.0f ms, %d consultas SQL en %.0f ms\n%s',
+                request.method, request.path, vista, segundos * 1000, contador.consultas, contador.segundos * 1000,
+                '\n'.join(f'  {duracion * 1000:.1f} ms  {sql}' for duracion, sql in peores),
+            )
+        return respuesta
+
+
+# 📝 EXPLICACIÓN: Exposición en formato texto de Prometheus
+def _etiquetas(vista, metodo, **extra):
+    pares = {'vista': vista, 'metodo': metodo, **extra}
+    return ','.join(
+        '{}="{}"'.format(nombre, str(valor).replace('\\', '\\\\').replace('"', '\\"'))
+        for nombre, valor in pares.items()
+    )
+
+
+def texto_prometheus():
+    with _cerrojo:
+        copia = [
+            (vista, metodo, list(acumulado.cubetas), acumulado.peticiones, acumulado.segundos, acumulado.consultas,
+             acumulado.segundos_sql, acumulado.bytes, dict(acumulado.estados))
+            for (vista, metodo), acumulado in sorted(_vistas.items())
+        ]
+
+    lineas = [
+        '# HELP gym_http_duracion_segundos Latencia de las peticiones medidas por vista',
+        '# TYPE gym_http_duracion_segundos histogram',
+    ]
+    for vista, metodo, cubetas, peticiones, segundos, *_ in copia:
+        acumuladas = 0
+        for limite, cuantas in zip(CUBETAS, cubetas):
+            acumuladas += cuantas
+            lineas.append(f'gym_http_duracion_segundos_bucket{{{_etiquetas(vista, metodo, le=limite)}}} {acumuladas}')
+        lineas.append(f'gym_http_duracion_segundos_bucket{{{_etiquetas(vista, metodo, le="+Inf")}}} {peticiones}')
+        lineas.append(f'gym_http_duracion_segundos_sum{{{_etiquetas(vista, metodo)}}} {segundos:.6f}')
+        lineas.append(f'gym_http_duracion_segundos_count{{{_etiquetas(vista, metodo)}}} {peticiones}')
+
+    contadores = [
+        ('gym_sql_consultas_total', 'Consultas SQL de las peticiones medidas', 5, 'd'),
+        ('gym_sql_duracion_segundos_total', 'Tiempo en consultas SQL de las peticiones medidas', 6, '.6f'),
+        ('gym_http_respuesta_bytes_total', 'Bytes de respuesta (sin contar streaming)', 7, 'd'),
+    ]
+    for nombre, ayuda, campo, formato in contadores:
+        lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} counter']
+        for fila in copia:
+            lineas.append(f'{nombre}{{{_etiquetas(fila[0], fila[1])}}} {fila[campo]:{formato}}')
+
+    lineas += ['# HELP gym_http_respuestas_total Respuestas medidas por código', '# TYPE gym_http_respuestas_total counter']
+    for vista, metodo, *_, estados in copia:
+        for clase, cuantas in sorted(estados.items()):
+            lineas.append(f'gym_http_respuestas_total{{{_etiquetas(vista, metodo, estado=clase)}}} {cuantas}')
+
+    lineas += [
+        '# HELP gym_metricas_muestreo Fracción de peticiones que se miden',
+        '# TYPE gym_metricas_muestreo gauge',
+        f'gym_metricas_muestreo {float(getattr(settings, "GYM_METRICAS_MUESTREO", 0))}',
+    ]
+    return '\n'.join(lineas) + '\n'
+
+
+# 📝 EXPLICACIÓN: GET /metrics solo con "Authorization: Bearer <GYM_METRICAS_TOKEN>" o para staff
+def metricas(request):
+    token = getattr(settings, 'GYM_METRICAS_TOKEN', '')
+    # Con el token no se toca la sesión (ni la base de datos)
+    con_token = bool(token) and request.headers.get('Authorization') == f'Bearer {token}'
+    if not con_token and not request.user.is_staff:
+        return HttpResponseForbidden('Token de métricas no válido')
+    return HttpResponse(texto_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
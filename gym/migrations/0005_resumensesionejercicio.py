@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('gym', '0004_perfil'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenSesionEjercicio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField()),
+                ('peso_maximo', models.FloatField(default=0)),
+                ('reps_totales', models.IntegerField(default=0)),
+                ('series_completadas', models.IntegerField(default=0)),
+                ('volumen_total', models.FloatField(default=0)),
+                ('ejercicio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='gym.ejercicio')),
+                ('entrenamiento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes', to='gym.entrenamiento')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['usuario', 'ejercicio', 'fecha'], name='gym_resumen_usuario_8cc4ad_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='resumensesionejercicio',
+            constraint=models.UniqueConstraint(fields=('entrenamiento', 'ejercicio'), name='resumen_unico_por_sesion'),
+        ),
+    ]
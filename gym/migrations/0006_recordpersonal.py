@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('gym', '0005_resumensesionejercicio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordPersonal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('repeticiones_minimas', models.IntegerField(default=0)),
+                ('peso_kg', models.FloatField()),
+                ('repeticiones', models.IntegerField()),
+                ('fecha', models.DateTimeField()),
+                ('ejercicio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='gym.ejercicio')),
+                ('serie', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='gym.serieejercicio')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='recordpersonal',
+            constraint=models.UniqueConstraint(fields=('usuario', 'ejercicio', 'repeticiones_minimas'), name='record_unico_por_rango'),
+        ),
+    ]
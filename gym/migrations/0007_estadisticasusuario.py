@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('gym', '0006_recordpersonal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticasUsuario',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='estadisticas', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_entrenamientos', models.IntegerField(default=0)),
+                ('total_series', models.IntegerField(default=0)),
+                ('volumen_total', models.FloatField(default=0)),
+                ('primera_fecha', models.DateTimeField(blank=True, null=True)),
+                ('ultima_fecha', models.DateTimeField(blank=True, null=True)),
+                ('ejercicio_frecuente', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='gym.ejercicio')),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0007_estadisticasusuario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entrenamiento',
+            name='ejercicio_actual',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='gym.ejerciciorutina'),
+        ),
+        migrations.AddField(
+            model_name='entrenamiento',
+            name='ejercicios_pendientes',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='entrenamiento',
+            name='serie_actual',
+            field=models.IntegerField(default=1),
+        ),
+    ]
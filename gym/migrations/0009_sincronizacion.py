@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:50
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0008_entrenamiento_cursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroEliminado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('usuario_id', models.IntegerField(db_index=True)),
+                ('modelo', models.CharField(choices=[('rutina', 'Rutina'), ('ejercicio_rutina', 'Ejercicio de rutina'), ('entrenamiento', 'Entrenamiento'), ('serie', 'Serie')], max_length=20)),
+                ('objeto_id', models.BigIntegerField()),
+                ('fecha', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ejerciciorutina',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='entrenamiento',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='entrenamiento',
+            name='clave_cliente',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='serieejercicio',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='serieejercicio',
+            name='clave_cliente',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='entrenamiento',
+            name='fecha',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='rutina',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
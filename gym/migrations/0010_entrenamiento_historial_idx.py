@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0009_sincronizacion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='entrenamiento',
+            index=models.Index(fields=['usuario', '-fecha', '-id'], name='entrenamiento_historial_idx'),
+        ),
+    ]
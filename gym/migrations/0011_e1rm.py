@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0010_entrenamiento_historial_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recordpersonal',
+            name='e1rm',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='resumensesionejercicio',
+            name='e1rm_maximo',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='serieejercicio',
+            name='e1rm',
+            field=models.FloatField(blank=True, null=True, verbose_name='1RM estimado (kg)'),
+        ),
+    ]
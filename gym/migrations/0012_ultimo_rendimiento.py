@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('gym', '0011_e1rm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UltimoRendimiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField()),
+                ('series', models.JSONField(default=list)),
+                ('ejercicio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='gym.ejercicio')),
+                ('entrenamiento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='gym.entrenamiento')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ultimorendimiento',
+            constraint=models.UniqueConstraint(fields=('usuario', 'ejercicio'), name='ultimo_rendimiento_unico'),
+        ),
+    ]
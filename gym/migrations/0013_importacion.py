@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('gym', '0012_ultimo_rendimiento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Importacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre_fichero', models.CharField(blank=True, max_length=255)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('estado', models.CharField(choices=[('en_curso', 'En curso'), ('completada', 'Completada'), ('fallida', 'Fallida')], default='en_curso', max_length=20)),
+                ('entrenamientos', models.IntegerField(default=0)),
+                ('series', models.IntegerField(default=0)),
+                ('filas_omitidas', models.IntegerField(default=0)),
+                ('ejercicios_desconocidos', models.JSONField(blank=True, default=dict)),
+                ('error', models.TextField(blank=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='entrenamiento',
+            name='importacion',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='gym.importacion'),
+        ),
+        migrations.AddField(
+            model_name='rutina',
+            name='importacion',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='gym.importacion'),
+        ),
+    ]
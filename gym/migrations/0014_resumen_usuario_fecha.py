@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0013_importacion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='resumensesionejercicio',
+            index=models.Index(fields=['usuario', 'fecha'], name='gym_resumen_usuario_ef5644_idx'),
+        ),
+    ]
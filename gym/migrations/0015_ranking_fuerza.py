@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('gym', '0014_resumen_usuario_fecha'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingFuerza',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('categoria', models.CharField(max_length=10)),
+                ('e1rm', models.FloatField()),
+                ('peso_corporal', models.FloatField()),
+                ('relacion', models.FloatField()),
+                ('posicion', models.IntegerField()),
+                ('posicion_categoria', models.IntegerField()),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('ejercicio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='gym.ejercicio')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ejercicio', 'posicion'], name='gym_ranking_ejercic_134779_idx'), models.Index(fields=['ejercicio', 'categoria', 'posicion_categoria'], name='gym_ranking_ejercic_264b26_idx'), models.Index(fields=['ejercicio', 'relacion'], name='gym_ranking_ejercic_e19f7a_idx'), models.Index(fields=['ejercicio', 'categoria', 'e1rm'], name='gym_ranking_ejercic_5bf14e_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='rankingfuerza',
+            constraint=models.UniqueConstraint(fields=('usuario', 'ejercicio'), name='ranking_unico_por_ejercicio'),
+        ),
+    ]
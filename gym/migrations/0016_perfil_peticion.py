@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:35
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('gym', '0015_ranking_fuerza'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerfilPeticion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('metodo', models.CharField(max_length=10)),
+                ('ruta', models.CharField(max_length=500)),
+                ('vista', models.CharField(max_length=200)),
+                ('estado', models.IntegerField()),
+                ('duracion_ms', models.FloatField()),
+                ('consultas', models.IntegerField()),
+                ('tiempo_sql_ms', models.FloatField()),
+                ('fichero', models.CharField(max_length=500)),
+                ('resumen', models.TextField(blank=True)),
+                ('sql', models.TextField(blank=True)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-fecha'],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0016_perfil_peticion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SesionArchivada',
+            fields=[
+                ('entrenamiento', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='archivo', serialize=False, to='gym.entrenamiento')),
+                ('series_totales', models.IntegerField()),
+                ('volumen_total', models.FloatField()),
+                ('datos', models.BinaryField()),
+                ('archivada', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='entrenamiento',
+            name='archivado',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0017_sesion_archivada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importacion',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
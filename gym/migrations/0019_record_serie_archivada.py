@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gym', '0018_importacion_actualizado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recordpersonal',
+            name='serie_archivada',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+from .fuerza import estimar_1rm
 
 # Create your models here.
 # MODELO 1: Ejercicio - Catálogo de ejercicios disponibles
@@ -42,7 +44,10 @@ class Rutina(models.Model):
     
     # Fechas
     fecha_creacion = models.DateTimeField(auto_now_add=True)
-    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True, db_index=True)
+    
+    # Importación que la creó (None = creada en la app)
+    importacion = models.ForeignKey('Importacion', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
     
     def __str__(self):
         return f"{self.nombre} - {self.usuario.username}"
@@ -61,6 +66,9 @@ class EjercicioRutina(models.Model):
     # Orden en la rutina
     orden = models.IntegerField(default=0)
     
+    # Para la sincronización con clientes offline (api/sync/)
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)
+    
     class Meta:
         ordering = ['orden']
 
@@ -70,15 +78,120 @@ class Entrenamiento(models.Model):
     usuario = models.ForeignKey(User, on_delete=models.CASCADE)
     rutina = models.ForeignKey(Rutina, on_delete=models.CASCADE)
     
-    # Fecha y duración
-    fecha = models.DateTimeField(auto_now_add=True)
+    # Fecha y duración (default y no auto_now_add: un cliente offline
+    # sube entrenamientos con la fecha en que realmente se hicieron)
+    fecha = models.DateTimeField(default=timezone.now)
     duracion_minutos = models.IntegerField(default=0)
     
     # Notas del usuario
     notas = models.TextField(blank=True)
     
+    # Sincronización: clave única generada por el cliente (idempotencia)
+    clave_cliente = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)
+    
+    # Cursor: qué ejercicio y qué serie tocan ahora. ejercicios_pendientes
+    # guarda los ids de EjercicioRutina que faltan, en orden (None = sin iniciar)
+    ejercicio_actual = models.ForeignKey(EjercicioRutina, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    serie_actual = models.IntegerField(default=1)
+    ejercicios_pendientes = models.JSONField(null=True, blank=True)
+    
+    # Importación que lo creó (None = registrado en la app)
+    importacion = models.ForeignKey('Importacion', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    
+    # Series empaquetadas en SesionArchivada (gym/archivo.py)
+    archivado = models.BooleanField(default=False)
+    
+    class Meta:
+        indexes = [
+            # Historial paginado por cursor: (fecha, id) descendente por usuario
+            models.Index(fields=['usuario', '-fecha', '-id'], name='entrenamiento_historial_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.usuario.username} - {self.rutina.nombre} - {self.fecha.date()}"
+    
+    # 📝 EXPLICACIÓN: Métodos del cursor
+    # registrar_serie solo lee el cursor (O(1)) en vez de contar las series
+    # de cada ejercicio de la rutina en cada petición
+    @property
+    def cursor_iniciado(self):
+        return self.ejercicios_pendientes is not None
+    
+    def iniciar_cursor(self):
+        """
+        Coloca el cursor según las series ya registradas. Se usa al empezar
+        y para entrenamientos anteriores al cursor; son dos consultas fijas.
+        """
+        hechas = dict(
+            self.series.values('ejercicio_rutina_id').annotate(
+                total=models.Count('id')
+            ).values_list('ejercicio_rutina_id', 'total').order_by()
+        )
+        faltan = [
+            (ejercicio_rutina, hechas.get(ejercicio_rutina.id, 0))
+            for ejercicio_rutina in self.rutina.ejercicios.all().order_by('orden')
+            if hechas.get(ejercicio_rutina.id, 0) < ejercicio_rutina.series
+        ]
+        
+        if faltan:
+            self.ejercicio_actual, hechas_actual = faltan[0]
+            self.serie_actual = hechas_actual + 1
+        else:
+            self.ejercicio_actual = None
+            self.serie_actual = 1
+        self.ejercicios_pendientes = [ejercicio_rutina.id for ejercicio_rutina, _ in faltan[1:]]
+        self.save(update_fields=['ejercicio_actual', 'serie_actual', 'ejercicios_pendientes'])
+    
+    def _pasar_al_siguiente(self, pendientes):
+        """Toma el primer pendiente que aún tenga series por hacer"""
+        while pendientes:
+            siguiente = EjercicioRutina.objects.filter(id=pendientes.pop(0)).first()
+            if siguiente is None:
+                continue  # lo quitaron de la rutina
+            hechas = self.series.filter(ejercicio_rutina=siguiente).count()
+            if hechas < siguiente.series:
+                return siguiente, hechas + 1, pendientes
+        return None, 1, []
+    
+    def _mover_cursor(self, ejercicio, serie, pendientes):
+        """
+        Guarda la nueva posición solo si nadie más movió el cursor
+        (doble envío del formulario); devuelve False si perdió la carrera.
+        """
+        movido = Entrenamiento.objects.filter(
+            id=self.id,
+            ejercicio_actual_id=self.ejercicio_actual_id,
+            serie_actual=self.serie_actual
+        ).update(
+            ejercicio_actual=ejercicio,
+            serie_actual=serie,
+            ejercicios_pendientes=pendientes
+        )
+        if movido:
+            self.ejercicio_actual = ejercicio
+            self.serie_actual = serie
+            self.ejercicios_pendientes = pendientes
+        return bool(movido)
+    
+    def avanzar_cursor(self):
+        """Pasa a la siguiente serie (o al siguiente ejercicio)"""
+        if self.serie_actual < self.ejercicio_actual.series:
+            return self._mover_cursor(self.ejercicio_actual, self.serie_actual + 1, self.ejercicios_pendientes)
+        return self._mover_cursor(*self._pasar_al_siguiente(list(self.ejercicios_pendientes)))
+    
+    def saltar_ejercicio(self):
+        """Deja el ejercicio actual sin terminar y pasa al siguiente"""
+        return self._mover_cursor(*self._pasar_al_siguiente(list(self.ejercicios_pendientes)))
+    
+    def priorizar_ejercicio(self, ejercicio_rutina_id):
+        """Hace ahora un ejercicio pendiente; el actual vuelve a la cola"""
+        pendientes = list(self.ejercicios_pendientes)
+        if ejercicio_rutina_id not in pendientes:
+            return False
+        pendientes.remove(ejercicio_rutina_id)
+        pendientes.insert(0, self.ejercicio_actual_id)
+        return self._mover_cursor(*self._pasar_al_siguiente([ejercicio_rutina_id] + pendientes))
 
 # MODELO 5: SerieEjercicio - Series realizadas en un entrenamiento
 class SerieEjercicio(models.Model):
@@ -96,9 +209,27 @@ class SerieEjercicio(models.Model):
         choices=[(i, str(i)) for i in range(1, 11)],
         verbose_name="RPE (1=fácil, 10=fallo)"
     )
+    # 1RM estimado (gym/fuerza.py): se calcula al guardar, no al leer
+    e1rm = models.FloatField(null=True, blank=True, verbose_name='1RM estimado (kg)')
+    
+    # Sincronización: clave única generada por el cliente (idempotencia)
+    clave_cliente = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         ordering = ['ejercicio_rutina__orden', 'numero_serie']
+    
+    def calcular_e1rm(self):
+        """Rellena e1rm. bulk_create no pasa por save(): hay que llamarlo a mano"""
+        self.e1rm = estimar_1rm(self.peso_kg, self.repeticiones, self.rpe)
+        return self.e1rm
+    
+    def save(self, *args, **kwargs):
+        # El 1RM estimado se guarda con la serie: las vistas no evalúan fórmulas
+        self.calcular_e1rm()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'e1rm'}
+        super().save(*args, **kwargs)
 
 class Perfil(models.Model):
     """Peso corporal del usuario para cálculos de fuerza"""
@@ -112,3 +243,267 @@ class Perfil(models.Model):
     
     def __str__(self):
         return f'{self.usuario.username}: {self.peso_corporal or "Sin peso"}kg'
+
+# MODELO 7: ResumenSesionEjercicio - Agregados por sesión × ejercicio
+class ResumenSesionEjercicio(models.Model):
+    """
+    Resumen precalculado de un ejercicio dentro de un entrenamiento.
+    Se actualiza cada vez que se crea, edita o borra una SerieEjercicio
+    (ver gym/signals.py), así el progreso lee una fila por sesión en vez
+    de recorrer todas las series.
+    """
+    # Relaciones (usuario y fecha copiados del entrenamiento para filtrar rápido)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    entrenamiento = models.ForeignKey(Entrenamiento, on_delete=models.CASCADE, related_name='resumenes')
+    ejercicio = models.ForeignKey(Ejercicio, on_delete=models.CASCADE)
+    fecha = models.DateTimeField()
+    
+    # Agregados de las series de esta sesión
+    peso_maximo = models.FloatField(default=0)
+    reps_totales = models.IntegerField(default=0)
+    series_completadas = models.IntegerField(default=0)
+    volumen_total = models.FloatField(default=0)  # peso x reps
+    e1rm_maximo = models.FloatField(null=True, blank=True)  # mejor 1RM estimado de la sesión
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['entrenamiento', 'ejercicio'], name='resumen_unico_por_sesion'),
+        ]
+        indexes = [
+            models.Index(fields=['usuario', 'ejercicio', 'fecha']),
+            # Volumen semanal por grupo muscular: todas las sesiones del usuario en un rango
+            models.Index(fields=['usuario', 'fecha']),
+        ]
+    
+    def __str__(self):
+        return f"{self.usuario.username} - {self.ejercicio.nombre} - {self.fecha.date()}"
+
+# MODELO 8: RecordPersonal - Libro de PRs por usuario y ejercicio
+class RecordPersonal(models.Model):
+    """
+    Mejor serie del usuario en un ejercicio. Se guarda un récord absoluto
+    (repeticiones_minimas=0) y uno por rango de repeticiones: el mayor peso
+    movido haciendo al menos 1, 3, 5, 8 o 10 repeticiones. Además, con
+    repeticiones_minimas=-1, la serie con mejor 1RM estimado (así 100kg x 8
+    puede superar a 105kg x 1).
+    """
+    RANGOS_REPETICIONES = [1, 3, 5, 8, 10]
+    RANGO_E1RM = -1
+    
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    ejercicio = models.ForeignKey(Ejercicio, on_delete=models.CASCADE)
+    repeticiones_minimas = models.IntegerField(default=0)  # 0 = récord absoluto, -1 = mejor 1RM estimado
+    
+    # Datos de la mejor serie
+    peso_kg = models.FloatField()
+    repeticiones = models.IntegerField()
+    e1rm = models.FloatField(null=True, blank=True)
+    fecha = models.DateTimeField()
+    serie = models.ForeignKey(SerieEjercicio, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # Id de la serie mientras está archivada (gym/archivo.py): sin fila a la
+    # que apuntar, pero así se sabe qué récords dependen de cada sesión
+    serie_archivada = models.BigIntegerField(null=True, blank=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['usuario', 'ejercicio', 'repeticiones_minimas'],
+                name='record_unico_por_rango'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.usuario.username} - {self.ejercicio.nombre}: {self.peso_kg}kg x {self.repeticiones}"
+
+# MODELO 9: EstadisticasUsuario - Contadores generales del usuario
+class EstadisticasUsuario(models.Model):
+    """
+    Totales del usuario para la cabecera del dashboard de progreso.
+    Se actualizan con las señales de Entrenamiento y SerieEjercicio;
+    `reconstruir_agregados` corrige cualquier desviación.
+    """
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='estadisticas')
+    
+    total_entrenamientos = models.IntegerField(default=0)
+    total_series = models.IntegerField(default=0)
+    volumen_total = models.FloatField(default=0)  # peso x reps
+    primera_fecha = models.DateTimeField(null=True, blank=True)
+    ultima_fecha = models.DateTimeField(null=True, blank=True)
+    ejercicio_frecuente = models.ForeignKey(Ejercicio, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    
+    def __str__(self):
+        return f'{self.usuario.username}: {self.total_entrenamientos} entrenamientos'
+
+# MODELO 10: RegistroEliminado - Borrados pendientes de sincronizar
+class RegistroEliminado(models.Model):
+    """
+    Marca de borrado para la sincronización: los clientes offline piden
+    los cambios desde su última marca y necesitan saber qué desapareció.
+    """
+    MODELO_CHOICES = [
+        ('rutina', 'Rutina'),
+        ('ejercicio_rutina', 'Ejercicio de rutina'),
+        ('entrenamiento', 'Entrenamiento'),
+        ('serie', 'Serie'),
+    ]
+    
+    # Sin ForeignKey a propósito: la marca se crea mientras se borra en cascada
+    usuario_id = models.IntegerField(db_index=True)
+    modelo = models.CharField(max_length=20, choices=MODELO_CHOICES)
+    objeto_id = models.BigIntegerField()
+    fecha = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f'{self.modelo} {self.objeto_id} (usuario {self.usuario_id})'
+
+# MODELO 11: UltimoRendimiento - Última sesión de cada ejercicio
+class UltimoRendimiento(models.Model):
+    """
+    Series de la sesión más reciente del usuario en un ejercicio (peso,
+    reps, RPE y 1RM estimado de cada una). Se actualiza al guardar o
+    borrar series (gym/agregados.py) y la sugerencia de carga de
+    registrar_serie lo lee por clave única, sin recorrer el historial.
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    ejercicio = models.ForeignKey(Ejercicio, on_delete=models.CASCADE)
+    # SET_NULL: al borrar la sesión se busca la anterior (ver agregados.entrenamiento_eliminado)
+    entrenamiento = models.ForeignKey(Entrenamiento, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    fecha = models.DateTimeField()
+    
+    # [{"peso": 80.0, "reps": 8, "rpe": 8, "e1rm": 108.3}, ...] en orden de serie
+    series = models.JSONField(default=list)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'ejercicio'], name='ultimo_rendimiento_unico'),
+        ]
+    
+    def __str__(self):
+        return f"{self.usuario.username} - {self.ejercicio.nombre} ({self.fecha.date()})"
+
+# MODELO 12: Importacion - Historial traído de otras apps (CSV)
+class Importacion(models.Model):
+    """
+    Una subida de historial (gym/importar.py). Las rutinas y entrenamientos
+    creados la referencian: si la importación falla a medias se borran
+    todos, así nunca queda un historial importado a medias.
+    """
+    ESTADO_CHOICES = [
+        ('en_curso', 'En curso'),
+        ('completada', 'Completada'),
+        ('fallida', 'Fallida'),
+    ]
+    
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    nombre_fichero = models.CharField(max_length=255, blank=True)
+    fecha = models.DateTimeField(auto_now_add=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='en_curso')
+    # Se guarda en cada lote: una 'en_curso' que lleva mucho sin cambiar se interrumpió
+    actualizado = models.DateTimeField(auto_now=True)
+    
+    # Resultado
+    entrenamientos = models.IntegerField(default=0)
+    series = models.IntegerField(default=0)
+    filas_omitidas = models.IntegerField(default=0)
+    ejercicios_desconocidos = models.JSONField(default=dict, blank=True)  # nombre → filas
+    error = models.TextField(blank=True)
+    
+    def __str__(self):
+        return f"{self.usuario.username} - {self.nombre_fichero} ({self.get_estado_display()})"
+
+# MODELO 13: RankingFuerza - Clasificación de fuerza entre usuarios
+class RankingFuerza(models.Model):
+    """
+    Puesto de cada usuario en cada ejercicio según su mejor 1RM estimado:
+    `posicion` entre todos por fuerza relativa (1RM / peso corporal) y
+    `posicion_categoria` dentro de su categoría de peso por 1RM absoluto.
+    Se mueve al cambiar un récord de 1RM o el peso (gym/ranking.py) y se
+    recalcula entero con `actualizar_rankings`. Sin peso corporal no se
+    entra en el ranking.
+    """
+    # Límites superiores de las categorías de peso corporal (kg)
+    LIMITES_CATEGORIA = [60, 70, 80, 90, 100, 110]
+    
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    ejercicio = models.ForeignKey(Ejercicio, on_delete=models.CASCADE)
+    categoria = models.CharField(max_length=10)  # '-60', '60-70', ..., '110+'
+    
+    # Copiados del récord y del perfil en el momento de colocarse
+    e1rm = models.FloatField()
+    peso_corporal = models.FloatField()
+    relacion = models.FloatField()  # e1rm / peso_corporal
+    
+    posicion = models.IntegerField()
+    posicion_categoria = models.IntegerField()
+    actualizado = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'ejercicio'], name='ranking_unico_por_ejercicio'),
+        ]
+        indexes = [
+            # Top N general y por categoría: recorren el índice desde el puesto 1
+            models.Index(fields=['ejercicio', 'posicion']),
+            models.Index(fields=['ejercicio', 'categoria', 'posicion_categoria']),
+            # Cuántos van por delante al colocar a alguien
+            models.Index(fields=['ejercicio', 'relacion']),
+            models.Index(fields=['ejercicio', 'categoria', 'e1rm']),
+        ]
+    
+    @classmethod
+    def categoria_de(cls, peso_corporal):
+        inferior = None
+        for limite in cls.LIMITES_CATEGORIA:
+            if peso_corporal < limite:
+                return f'-{limite}' if inferior is None else f'{inferior}-{limite}'
+            inferior = limite
+        return f'{inferior}+'
+    
+    def __str__(self):
+        return f"#{self.posicion} {self.usuario.username} - {self.ejercicio.nombre}: {self.relacion}x"
+
+# MODELO 14: PerfilPeticion - Perfiles de cProfile pedidos por el staff
+class PerfilPeticion(models.Model):
+    """
+    Una petición ejecutada bajo cProfile (gym/perfilado.py). El perfil
+    completo (.prof, para pstats o snakeviz) y el SQL con su plan quedan en
+    GYM_PERFILADO_DIR; aquí se guarda un índice con el resumen para
+    verlo desde el admin.
+    """
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha = models.DateTimeField(auto_now_add=True)
+    metodo = models.CharField(max_length=10)
+    ruta = models.CharField(max_length=500)
+    vista = models.CharField(max_length=200)
+    estado = models.IntegerField()
+    
+    duracion_ms = models.FloatField()
+    consultas = models.IntegerField()
+    tiempo_sql_ms = models.FloatField()
+    
+    fichero = models.CharField(max_length=500)  # .prof; el SQL va al lado en .sql.txt
+    resumen = models.TextField(blank=True)  # funciones con más tiempo acumulado
+    sql = models.TextField(blank=True)  # consultas con EXPLAIN QUERY PLAN
+    
+    class Meta:
+        ordering = ['-fecha']
+    
+    def __str__(self):
+        return f"{self.metodo} {self.ruta} ({self.duracion_ms:.0f} ms)"
+
+# MODELO 15: SesionArchivada - Series de una sesión antigua empaquetadas
+class SesionArchivada(models.Model):
+    """
+    Las series de un entrenamiento antiguo en una sola fila (gym/archivo.py):
+    columnas empaquetadas y comprimidas en `datos`, más los totales que
+    muestra el historial. El Entrenamiento y sus agregados se quedan.
+    """
+    entrenamiento = models.OneToOneField(Entrenamiento, on_delete=models.CASCADE, primary_key=True, related_name='archivo')
+    series_totales = models.IntegerField()
+    volumen_total = models.FloatField()
+    datos = models.BinaryField()
+    archivada = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.entrenamiento_id}: {self.series_totales} series archivadas"
+
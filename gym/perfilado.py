@@ -0,0 +1,154 @@
+"""
+Perfilado bajo demanda de una petición (solo staff).
+
+Con GYM_PERFILADO=True en settings, un usuario staff puede pedir que
+una petición se ejecute bajo cProfile añadiendo `?perfilar=1` o la
+cabecera `X-Perfilar: 1`. Se guardan en GYM_PERFILADO_DIR:
+
+- <id>-<vista>.prof: el perfil completo (pstats, snakeviz...),
+- <id>-<vista>.sql.txt: cada consulta con su tiempo y su plan
+  (EXPLAIN QUERY PLAN en SQLite, EXPLAIN en otras bases de datos),
+
+y una fila PerfilPeticion con el resumen para verlo en el admin. Solo se
+conservan los GYM_PERFILADO_MAXIMO más recientes. La respuesta lleva la
+cabecera X-Perfil-Id.
+
+Sin GYM_PERFILADO el middleware se descarta al arrancar
+(MiddlewareNotUsed): no cuesta nada. Las vistas async no se perfilan.
+"""
+import asyncio
+import cProfile
+import io
+import pstats
+import re
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .models import PerfilPeticion
+
+# Funciones del resumen que se guarda en el admin
+FUNCIONES_EN_RESUMEN = 40
+
+
+class _CapturaSQL:
+    """execute_wrapper: guarda cada consulta con sus parámetros y su tiempo"""
+
+    def __init__(self):
+        self.consultas = []  # (segundos, sql, params)
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas.append((time.perf_counter() - inicio, sql, None if many else params))
+
+
+def _plan(sql, params):
+    """Plan de ejecución de una consulta de lectura, o '' si no se puede pedir"""
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return ''
+    prefijo = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefijo + sql, params)
+            filas = cursor.fetchall()
+    except Exception as error:  # p. ej. la transacción de la vista ya no existe
+        return f'(sin plan: {error})'
+    # SQLite: (id, padre, _, detalle) → el detalle; otras bases de datos: la fila tal cual
+    return '\n'.join(str(fila[-1] if connection.vendor == 'sqlite' else fila) for fila in filas)
+
+
+def _texto_sql(consultas):
+    bloques = []
+    for numero, (segundos, sql, params) in enumerate(consultas, start=1):
+        bloque = f'-- {numero}. {segundos * 1000:.2f} ms\n{sql}\n'
+        if params:
+            bloque += f'-- parámetros: {list(params)}\n'
+        plan = _plan(sql, params)
+        if plan:
+            bloque += '-- plan:\n' + '\n'.join(f'--   {linea}' for linea in plan.splitlines()) + '\n'
+        bloques.append(bloque)
+    return '\n'.join(bloques)
+
+
+def _resumen(perfil):
+    salida = io.StringIO()
+    pstats.Stats(perfil, stream=salida).strip_dirs().sort_stats('cumulative').print_stats(FUNCIONES_EN_RESUMEN)
+    return salida.getvalue()
+
+
+def _limpiar(directorio, maximo):
+    """Borra los perfiles que sobran (filas y ficheros), de los más antiguos"""
+    sobrantes = list(PerfilPeticion.objects.order_by('-fecha', '-id')[maximo:])
+    for perfil in sobrantes:
+        for fichero in (Path(perfil.fichero), Path(perfil.fichero).with_suffix('.sql.txt')):
+            fichero.unlink(missing_ok=True)
+    PerfilPeticion.objects.filter(id__in=[perfil.id for perfil in sobrantes]).delete()
+
+
+class PerfiladoMiddleware:
+    """Va el último de MIDDLEWARE: perfila la vista, no el resto de middlewares"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'GYM_PERFILADO', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.directorio = Path(settings.GYM_PERFILADO_DIR)
+        self.maximo = getattr(settings, 'GYM_PERFILADO_MAXIMO', 50)
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        pedido = request.GET.get('perfilar') == '1' or request.headers.get('X-Perfilar') == '1'
+        if not pedido or not request.user.is_staff or asyncio.iscoroutinefunction(view_func):
+            return None
+
+        captura = _CapturaSQL()
+        perfil = cProfile.Profile()
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(captura):
+            perfil.enable()
+            try:
+                respuesta = view_func(request, *view_args, **view_kwargs)
+            finally:
+                perfil.disable()
+        duracion = time.perf_counter() - inicio
+
+        registro = self.guardar(request, respuesta, perfil, captura.consultas, duracion)
+        respuesta['X-Perfil-Id'] = str(registro.id)
+        return respuesta
+
+    def guardar(self, request, respuesta, perfil, consultas, duracion):
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        vista = request.resolver_match.view_name if request.resolver_match else 'sin_ruta'
+        registro = PerfilPeticion.objects.create(
+            usuario=request.user,
+            metodo=request.method,
+            ruta=request.get_full_path()[:500],
+            vista=vista[:200],
+            estado=respuesta.status_code,
+            duracion_ms=duracion * 1000,
+            consultas=len(consultas),
+            tiempo_sql_ms=sum(segundos for segundos, _, _ in consultas) * 1000,
+            fichero='',
+        )
+
+        nombre = f"{registro.fecha:%Y%m%d-%H%M%S}-{registro.id}-{re.sub(r'[^A-Za-z0-9_-]+', '_', vista)}"
+        fichero = self.directorio / f'{nombre}.prof'
+        perfil.dump_stats(fichero)
+        # Los planes se piden después de perfilar: no cuentan en el tiempo ni en el perfil
+        sql = _texto_sql(consultas)
+        fichero.with_suffix('.sql.txt').write_text(sql, encoding='utf-8')
+
+        registro.fichero = str(fichero)
+        registro.resumen = _resumen(perfil)
+        registro.sql = sql
+        registro.save(update_fields=['fichero', 'resumen', 'sql'])
+        _limpiar(self.directorio, self.maximo)
+        return registro
@@ -0,0 +1,86 @@
+"""
+Sugerencia de carga para la próxima serie.
+
+Parte del último rendimiento guardado (UltimoRendimiento: las series de
+la sesión más reciente con ese ejercicio) y del rango de repeticiones de
+la rutina (EjercicioRutina.repeticiones, "8-12"). No consulta nada: todo
+el coste es la lectura del último rendimiento.
+
+- Sesión nueva → doble progresión: si todas las series con el peso de
+  trabajo llegaron al máximo del rango sin pasarse de RPE, se sube el
+  peso y se vuelve al mínimo; si no, se repite el peso buscando una
+  repetición más. Si no se llegó al mínimo, se baja al peso que sale a
+  RPE 8 con el mínimo de repeticiones.
+- Misma sesión → se ajusta con el RPE de la serie anterior: el peso que
+  saldría a RPE 8 según su 1RM estimado.
+"""
+from .fuerza import peso_para
+
+RPE_OBJETIVO = 8
+INCREMENTO_KG = 2.5
+# Los discos más pequeños habituales son de 1.25 kg por lado
+REDONDEO_KG = 2.5
+
+RANGO_POR_DEFECTO = (8, 12)
+
+
+def rango_repeticiones(texto):
+    """'8-12' → (8, 12); '10' → (10, 10); lo que no se entienda → 8-12"""
+    minimo, _, maximo = (texto or '').partition('-')
+    try:
+        minimo = int(minimo)
+        maximo = int(maximo) if maximo else minimo
+    except ValueError:
+        return RANGO_POR_DEFECTO
+    if minimo <= 0 or maximo < minimo:
+        return RANGO_POR_DEFECTO
+    return minimo, maximo
+
+
+def redondear(peso):
+    return max(0, round(peso / REDONDEO_KG) * REDONDEO_KG)
+
+
+def _sugerencia(peso, repeticiones, motivo):
+    return {'peso': round(peso, 1), 'repeticiones': repeticiones, 'motivo': motivo}
+
+
+def sugerir(series, rango, misma_sesion=False, rpe_objetivo=RPE_OBJETIVO):
+    """
+    series: las del último rendimiento ([{'peso', 'reps', 'rpe', 'e1rm'}, ...]).
+    Devuelve {'peso', 'repeticiones', 'motivo'} o None si no hay con qué.
+    """
+    series = [serie for serie in series if serie['peso'] and serie['reps']]
+    if not series:
+        return None
+    minimo, maximo = rango
+
+    if misma_sesion:
+        anterior = series[-1]
+        if anterior['e1rm'] and anterior['rpe']:
+            repeticiones = min(max(anterior['reps'], minimo), maximo)
+            return _sugerencia(
+                redondear(peso_para(anterior['e1rm'], repeticiones, rpe_objetivo)), repeticiones,
+                f'Ajustado para RPE {rpe_objetivo} según tu serie anterior'
+            )
+        return _sugerencia(anterior['peso'], anterior['reps'], 'Mismo peso que la serie anterior')
+
+    # Peso de trabajo: el más alto de la sesión (las aproximaciones no cuentan)
+    peso = max(serie['peso'] for serie in series)
+    de_trabajo = [serie for serie in series if serie['peso'] == peso]
+    reps_minimas = min(serie['reps'] for serie in de_trabajo)
+    rpes = [serie['rpe'] for serie in de_trabajo if serie['rpe']]
+    rpe_maximo = max(rpes) if rpes else None
+
+    if reps_minimas >= maximo and (rpe_maximo is None or rpe_maximo <= rpe_objetivo + 1):
+        return _sugerencia(peso + INCREMENTO_KG, minimo, f'Completaste {maximo} repeticiones: sube peso')
+
+    if reps_minimas < minimo:
+        e1rm = max((serie['e1rm'] for serie in de_trabajo if serie['e1rm']), default=None)
+        nuevo = peso_para(e1rm, minimo, rpe_objetivo) if e1rm else peso - INCREMENTO_KG
+        return _sugerencia(min(redondear(nuevo), peso), minimo, f'No llegaste a {minimo} repeticiones: ajusta el peso')
+
+    if rpe_maximo == 10:
+        return _sugerencia(peso, reps_minimas, 'Llegaste al fallo: repite antes de subir')
+
+    return _sugerencia(peso, min(reps_minimas + 1, maximo), 'Mismo peso, una repetición más')
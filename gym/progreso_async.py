@@ -0,0 +1,153 @@
+"""
+Versiones async de las páginas de progreso (para servir con ASGI,
+gymprogress/asgi.py).
+
+El dashboard necesita cuatro cosas que no dependen unas de otras
+(estadísticas, récords, datos del gráfico y últimos entrenamientos). Aquí
+se piden a la vez, cada una en un hilo de un pool acotado
+(GYM_PROGRESO_HILOS), así que la página tarda lo que la más lenta y no
+la suma. El ORM de Django 4.2 es síncrono por dentro, por eso se usa
+sync_to_async con un pool propio en lugar de las consultas a*().
+
+Con GYM_PROGRESO_HILOS=0 todo va en el hilo de la petición, una cosa
+detrás de otra (lo usan los tests: los hilos del pool abren su propia
+conexión y no ven la transacción del test).
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.db import close_old_connections
+from django.http import Http404
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from . import cache_progreso
+from .models import Ejercicio
+from .views import (
+    calcular_estadisticas_generales, calcular_progreso_ejercicio, calcular_volumen_sesiones, clave_ventana,
+    componer_datos_ejercicio, encontrar_prs, obtener_peso_corporal, poner_validadores, serie_grafico_ejercicio,
+    ultimos_entrenamientos, validadores_usuario, ventana_grafico,
+)
+
+_pool = None
+
+
+def _obtener_pool():
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=settings.GYM_PROGRESO_HILOS, thread_name_prefix='progreso')
+    return _pool
+
+
+async def en_paralelo(funcion, *args, **kwargs):
+    """Ejecuta una función síncrona (con ORM) en el pool sin bloquear el bucle de eventos"""
+    if not settings.GYM_PROGRESO_HILOS:
+        return await sync_to_async(funcion)(*args, **kwargs)
+
+    def tarea():
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            # Como al acabar una petición: respeta CONN_MAX_AGE de la conexión del hilo
+            close_old_connections()
+
+    return await sync_to_async(tarea, thread_sensitive=False, executor=_obtener_pool())()
+
+
+# 📝 EXPLICACIÓN: login_required y condition() de Django 4.2 no aceptan
+# vistas async, estas son sus versiones equivalentes
+def login_requerido_async(vista):
+    @wraps(vista)
+    async def envoltura(request, *args, **kwargs):
+        # request.user se carga de la sesión (consulta): fuera del bucle de eventos
+        autenticado = await sync_to_async(lambda: request.user.is_authenticated)()
+        if not autenticado:
+            return redirect_to_login(request.get_full_path())
+        return await vista(request, *args, **kwargs)
+    return envoltura
+
+
+def peticion_condicional_async(vista):
+    """Igual que views.peticion_condicional: 304 si los datos del usuario no cambiaron"""
+    @wraps(vista)
+    async def envoltura(request, *args, **kwargs):
+        # Mismos validadores que la vista síncrona (ninguno con mensajes pendientes)
+        etag, ultima = await sync_to_async(validadores_usuario)(request)
+
+        respuesta = get_conditional_response(request, etag=etag, last_modified=ultima)
+        if respuesta is not None:
+            # 304/412: como condition(), con los validadores con los que se decidió
+            if request.method in ('GET', 'HEAD') and etag:
+                respuesta.headers.setdefault('ETag', etag)
+                respuesta.headers.setdefault('Last-Modified', http_date(ultima))
+        else:
+            respuesta = await vista(request, *args, **kwargs)
+            if respuesta.status_code == 200:
+                await sync_to_async(poner_validadores)(request, respuesta)
+        patch_cache_control(respuesta, private=True, no_cache=True)
+        return respuesta
+    return envoltura
+
+
+async def calcular_datos_dashboard(usuario, ventana):
+    estadisticas, prs, datos_grafico, ultimos = await asyncio.gather(
+        en_paralelo(calcular_estadisticas_generales, usuario),
+        en_paralelo(encontrar_prs, usuario),
+        en_paralelo(calcular_volumen_sesiones, usuario, **ventana),
+        en_paralelo(ultimos_entrenamientos, usuario),
+    )
+    return {
+        'estadisticas': estadisticas,
+        'prs': prs,
+        'datos_grafico': datos_grafico,
+        'ultimos_entrenamientos': ultimos,
+    }
+
+
+async def calcular_datos_ejercicio(usuario, ejercicio_id):
+    historial, peso_corporal = await asyncio.gather(
+        en_paralelo(calcular_progreso_ejercicio, usuario, ejercicio_id),
+        en_paralelo(obtener_peso_corporal, usuario),
+    )
+    serie = await en_paralelo(serie_grafico_ejercicio, usuario, ejercicio_id, historial)
+    return componer_datos_ejercicio(historial, peso_corporal, serie)
+
+
+@login_requerido_async
+@peticion_condicional_async
+async def progreso_dashboard(request):
+    ventana = ventana_grafico(request)
+
+    # Misma clave que la vista síncrona: comparten la caché
+    datos = await cache_progreso.aobtener_o_calcular(
+        request.user.id,
+        f'dashboard:{clave_ventana(ventana)}',
+        lambda: calcular_datos_dashboard(request.user, ventana)
+    )
+
+    return await sync_to_async(render)(request, 'progreso/dashboard.html', datos)
+
+
+@login_requerido_async
+@peticion_condicional_async
+async def progreso_ejercicio(request, ejercicio_id):
+    # Primero el ejercicio: con un id que no existe no se calcula ni se cachea nada
+    ejercicio = await en_paralelo(Ejercicio.objects.filter(id=ejercicio_id).first)
+    if ejercicio is None:
+        raise Http404('No existe ese ejercicio')
+
+    datos = await cache_progreso.aobtener_o_calcular(
+        request.user.id,
+        f'ejercicio:{ejercicio_id}',
+        lambda: calcular_datos_ejercicio(request.user, ejercicio_id)
+    )
+
+    return await sync_to_async(render)(request, 'progreso/ejercicio.html', {
+        'ejercicio': ejercicio,
+        **datos,
+    })
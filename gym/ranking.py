@@ -0,0 +1,78 @@
+"""
+Ranking de fuerza entre usuarios por ejercicio (RankingFuerza).
+
+Los puestos están guardados (los mantiene gym/agregados.py), no se
+calculan al leer:
+- "Top 100" → las 100 primeras filas del índice (ejercicio, posicion) o
+  (ejercicio, categoria, posicion_categoria).
+- "Mi puesto" → una fila por la clave única (usuario, ejercicio).
+
+Página: progreso/ranking/<id>/  ·  JSON: api/ranking/<id>/  (?categoria=80-90)
+"""
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.views.decorators.http import require_GET
+
+from .api import api_login_required
+from .models import Ejercicio, RankingFuerza
+
+TOP = 100
+
+# '-60', '60-70', ..., '110+'
+CATEGORIAS = [RankingFuerza.categoria_de(0)] + [
+    RankingFuerza.categoria_de(limite) for limite in RankingFuerza.LIMITES_CATEGORIA
+]
+
+
+# 📝 EXPLICACIÓN: Lecturas (índices de puesto, nunca un recuento al leer)
+def top(ejercicio_id, categoria=None, limite=TOP):
+    filas = RankingFuerza.objects.filter(ejercicio_id=ejercicio_id).select_related('usuario')
+    if categoria:
+        return filas.filter(categoria=categoria).order_by('posicion_categoria')[:limite]
+    return filas.order_by('posicion')[:limite]
+
+
+def _fila_json(fila, categoria):
+    return {
+        'posicion': fila.posicion_categoria if categoria else fila.posicion,
+        'usuario': fila.usuario.username,
+        'categoria': fila.categoria,
+        'e1rm': fila.e1rm,
+        'peso_corporal': fila.peso_corporal,
+        'relacion': fila.relacion,
+    }
+
+
+def _leer_categoria(request):
+    categoria = request.GET.get('categoria')
+    return categoria if categoria in CATEGORIAS else None
+
+
+# 📝 EXPLICACIÓN: Página del ranking de un ejercicio (?categoria=80-90)
+@login_required
+def ranking_ejercicio(request, ejercicio_id):
+    ejercicio = get_object_or_404(Ejercicio, id=ejercicio_id)
+    categoria = _leer_categoria(request)
+    return render(request, 'progreso/ranking.html', {
+        'ejercicio': ejercicio,
+        'categoria': categoria,
+        'categorias': CATEGORIAS,
+        'filas': [_fila_json(fila, categoria) for fila in top(ejercicio_id, categoria)],
+        'mio': RankingFuerza.objects.filter(usuario=request.user, ejercicio_id=ejercicio_id).first(),
+    })
+
+
+# 📝 EXPLICACIÓN: Lo mismo en JSON
+@require_GET
+@api_login_required
+def api_ranking_ejercicio(request, ejercicio_id):
+    categoria = _leer_categoria(request)
+    mio = RankingFuerza.objects.filter(
+        usuario=request.user, ejercicio_id=ejercicio_id
+    ).select_related('usuario').first()
+    return JsonResponse({
+        'categoria': categoria,
+        'top': [_fila_json(fila, categoria) for fila in top(ejercicio_id, categoria)],
+        'mio': _fila_json(mio, categoria) if mio else None,
+    })
@@ -0,0 +1,154 @@
+"""
+Series temporales del progreso de un ejercicio para gráficos de largo plazo.
+
+GET api/progreso/ejercicio/<id>/?desde=2020-01-01&hasta=2024-12-31&resolucion=semana
+
+- resolucion=sesion: un punto por entrenamiento.
+- resolucion=semana|mes: la base de datos agrupa los resúmenes por semana
+  o mes (TruncWeek/TruncMonth + GROUP BY) y solo devuelve un punto por
+  periodo: peso máximo, mejor 1RM estimado, volumen, series y sesiones.
+- resolucion=auto (por defecto): la más fina que no pasa de `puntos` en
+  el rango pedido; 5 años salen por meses.
+
+Se lee de ResumenSesionEjercicio (una fila por sesión, ver gym/agregados.py),
+nunca de las series, y como mucho `puntos` filas: el coste depende de los
+periodos pedidos, no de cuántas series haya. El resultado se cachea con la
+marca del usuario (gym/cache_progreso.py).
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_GET
+
+from . import cache_progreso
+from .api import api_login_required
+from .models import Ejercicio, ResumenSesionEjercicio
+
+# Funciones de la base de datos que agrupan por periodo (sesion no agrupa)
+RESOLUCIONES = {'sesion': None, 'semana': TruncWeek, 'mes': TruncMonth}
+# Días que cubre cada punto, para elegir la resolución automática
+# (se cuenta como mucho una sesión al día)
+DIAS_POR_PUNTO = {'sesion': 1, 'semana': 7, 'mes': 31}
+
+PUNTOS_POR_DEFECTO = 120
+MAXIMO_PUNTOS = 500
+
+
+def elegir_resolucion(desde, hasta, puntos):
+    """La resolución más fina con la que el rango cabe en `puntos` puntos"""
+    dias = (hasta - desde).days + 1
+    for resolucion in ('sesion', 'semana'):
+        if dias / DIAS_POR_PUNTO[resolucion] <= puntos:
+            return resolucion
+    return 'mes'
+
+
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def serie_ejercicio(usuario_id, ejercicio_id, desde=None, hasta=None, resolucion='auto', puntos=PUNTOS_POR_DEFECTO):
+    """
+    Puntos del ejercicio entre `desde` y `hasta` (fechas, ambas incluidas;
+    sin `desde` desde la primera sesión, sin `hasta` hasta hoy). Si hay más
+    periodos que `puntos` se devuelven los más recientes y completa=False.
+    """
+    resumenes = ResumenSesionEjercicio.objects.filter(usuario_id=usuario_id, ejercicio_id=ejercicio_id)
+    if desde is not None:
+        resumenes = resumenes.filter(fecha__gte=_inicio_del_dia(desde))
+    if hasta is not None:
+        resumenes = resumenes.filter(fecha__lt=_inicio_del_dia(hasta + timedelta(days=1)))
+
+    if resolucion == 'auto':
+        inicio = desde
+        if inicio is None:
+            # Una consulta por el índice (usuario, ejercicio, fecha)
+            primera = resumenes.order_by('fecha').values_list('fecha', flat=True).first()
+            inicio = timezone.localdate(primera) if primera else timezone.localdate()
+        resolucion = elegir_resolucion(inicio, hasta or timezone.localdate(), puntos)
+
+    if resolucion == 'sesion':
+        filas = [
+            {
+                'inicio': fecha.isoformat(),
+                'peso_maximo': peso_maximo,
+                'e1rm_maximo': e1rm_maximo,
+                'volumen': round(volumen, 1),
+                'series': series,
+                'sesiones': 1,
+            }
+            for fecha, peso_maximo, e1rm_maximo, volumen, series in resumenes.order_by(
+                '-fecha', '-entrenamiento_id'
+            ).values_list('fecha', 'peso_maximo', 'e1rm_maximo', 'volumen_total', 'series_completadas')[:puntos + 1]
+        ]
+    else:
+        periodos = resumenes.annotate(
+            inicio=RESOLUCIONES[resolucion]('fecha')
+        ).values('inicio').annotate(
+            peso_maximo=Max('peso_maximo'),
+            e1rm_maximo=Max('e1rm_maximo'),
+            volumen=Sum('volumen_total'),
+            series=Sum('series_completadas'),
+            sesiones=Count('id'),
+        ).order_by('-inicio')[:puntos + 1]
+        filas = [
+            {**periodo, 'inicio': periodo['inicio'].date().isoformat(), 'volumen': round(periodo['volumen'], 1)}
+            for periodo in periodos
+        ]
+
+    # Se pidió un punto de más solo para saber si el rango no cabe entero
+    completa = len(filas) <= puntos
+    filas = filas[:puntos]
+    filas.reverse()
+    return {
+        'resolucion': resolucion,
+        'desde': desde.isoformat() if desde else None,
+        'hasta': hasta.isoformat() if hasta else None,
+        'completa': completa,
+        'puntos': filas,
+    }
+
+
+def _leer_fecha(request, nombre):
+    """None si no viene; ValueError si viene mal"""
+    valor = request.GET.get(nombre)
+    if not valor:
+        return None
+    fecha = parse_date(valor)
+    if fecha is None:
+        raise ValueError(f'"{nombre}" no es una fecha AAAA-MM-DD')
+    return fecha
+
+
+# 📝 EXPLICACIÓN: Datos para el gráfico de progreso de un ejercicio
+@require_GET
+@api_login_required
+def api_serie_ejercicio(request, ejercicio_id):
+    resolucion = request.GET.get('resolucion', 'auto')
+    try:
+        desde = _leer_fecha(request, 'desde')
+        hasta = _leer_fecha(request, 'hasta')
+        if resolucion != 'auto' and resolucion not in RESOLUCIONES:
+            raise ValueError('"resolucion" tiene que ser sesion, semana, mes o auto')
+        puntos = request.GET.get('puntos', str(PUNTOS_POR_DEFECTO))
+        if not puntos.isdigit() or not 1 <= int(puntos) <= MAXIMO_PUNTOS:
+            raise ValueError(f'"puntos" tiene que estar entre 1 y {MAXIMO_PUNTOS}')
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    puntos = int(puntos)
+    if desde and hasta and desde > hasta:
+        return JsonResponse({'error': '"desde" es posterior a "hasta"'}, status=400)
+
+    if not Ejercicio.objects.filter(id=ejercicio_id).exists():
+        return JsonResponse({'error': 'Ejercicio desconocido'}, status=404)
+
+    datos = cache_progreso.obtener_o_calcular(
+        request.user.id,
+        f'serie:{ejercicio_id}:{resolucion}:{desde}:{hasta}:{puntos}',
+        lambda: serie_ejercicio(request.user.id, ejercicio_id, desde, hasta, resolucion, puntos)
+    )
+    return JsonResponse(datos)
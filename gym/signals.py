@@ -0,0 +1,152 @@
+"""
+Señales que mantienen al día los agregados de gym/agregados.py, la marca
+de la caché de progreso (gym/cache_progreso.py) y la versión del catálogo
+de ejercicios (gym/catalogo.py).
+
+Ojo: bulk_create() y QuerySet.update() no disparan señales, así que
+cualquier escritura masiva tiene que actualizar los agregados a mano.
+Para borrados masivos está senales_suspendidas().
+"""
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import agregados, cache_progreso, catalogo
+from .models import Ejercicio, EjercicioRutina, Entrenamiento, Perfil, RegistroEliminado, Rutina, SerieEjercicio
+
+
+# 📝 EXPLICACIÓN: Borrar miles de filas fila a fila por las señales es
+# lentísimo; quien suspende las señales reconstruye los agregados y crea
+# las marcas de borrado él mismo al terminar
+_suspension = threading.local()
+
+
+@contextmanager
+def senales_suspendidas():
+    _suspension.activa = True
+    try:
+        yield
+    finally:
+        _suspension.activa = False
+
+
+def _salvo_suspendidas(receptor):
+    @wraps(receptor)
+    def envoltura(*args, **kwargs):
+        if getattr(_suspension, 'activa', False):
+            return None
+        return receptor(*args, **kwargs)
+    return envoltura
+
+
+@receiver(post_init, sender=SerieEjercicio)
+def recordar_par_original(sender, instance, **kwargs):
+    # Guardamos a qué sesión/ejercicio pertenecía la serie al cargarla,
+    # para saber qué resumen actualizar si una edición la cambia de sitio
+    # (y su volumen, para ajustar los totales del usuario con la diferencia)
+    instance._par_original = (instance.entrenamiento_id, instance.ejercicio_rutina_id)
+    instance._volumen_original = (instance.peso_kg or 0) * (instance.repeticiones or 0)
+
+
+@receiver(post_save, sender=SerieEjercicio)
+@_salvo_suspendidas
+def serie_guardada(sender, instance, created, raw=False, **kwargs):
+    if raw:  # loaddata: los agregados se reconstruyen con el comando
+        return
+    agregados.serie_guardada(instance, created)
+    cache_progreso.invalidar_usuario(instance.entrenamiento.usuario_id)
+    recordar_par_original(sender, instance)
+
+
+@receiver(post_delete, sender=SerieEjercicio)
+@_salvo_suspendidas
+def serie_eliminada(sender, instance, **kwargs):
+    agregados.serie_eliminada(instance)
+    usuario_id = Entrenamiento.objects.filter(
+        id=instance.entrenamiento_id
+    ).values_list('usuario_id', flat=True).first()
+    if usuario_id:
+        marcar_eliminado(usuario_id, 'serie', instance.id)
+        cache_progreso.invalidar_usuario(usuario_id)
+
+
+@receiver(post_save, sender=Entrenamiento)
+@_salvo_suspendidas
+def entrenamiento_guardado(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        agregados.entrenamiento_creado(instance)
+    cache_progreso.invalidar_usuario(instance.usuario_id)
+
+
+@receiver(pre_delete, sender=Entrenamiento)
+@_salvo_suspendidas
+def entrenamiento_por_eliminar(sender, instance, **kwargs):
+    # Las series archivadas no tienen filas que borrar una a una: lo que
+    # hay que restar se lee antes de que el CASCADE se lleve el paquete
+    instance._paquete_eliminado = agregados.paquete_por_eliminar(instance)
+
+
+@receiver(post_delete, sender=Entrenamiento)
+@_salvo_suspendidas
+def entrenamiento_eliminado(sender, instance, **kwargs):
+    agregados.entrenamiento_eliminado(instance, getattr(instance, '_paquete_eliminado', None))
+    marcar_eliminado(instance.usuario_id, 'entrenamiento', instance.id)
+    cache_progreso.invalidar_usuario(instance.usuario_id)
+
+
+# 📝 EXPLICACIÓN: El peso corporal entra en la fuerza relativa cacheada
+# y el nombre de la rutina aparece en el historial y en el progreso
+@receiver(post_save, sender=Perfil)
+@receiver(post_delete, sender=Perfil)
+@receiver(post_save, sender=Rutina)
+@_salvo_suspendidas
+def perfil_o_rutina_cambiados(sender, instance, **kwargs):
+    cache_progreso.invalidar_usuario(instance.usuario_id)
+
+
+# 📝 EXPLICACIÓN: El peso corporal decide la fuerza relativa y la categoría del ranking
+@receiver(post_save, sender=Perfil)
+@_salvo_suspendidas
+def peso_cambiado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        agregados.actualizar_ranking_usuario(instance.usuario_id, instance.peso_corporal)
+
+
+@receiver(post_delete, sender=Perfil)
+@_salvo_suspendidas
+def perfil_eliminado(sender, instance, **kwargs):
+    # Sin peso no se está en el ranking. Al borrar un usuario su perfil cae
+    # antes que él: así también se cierran sus huecos en los rankings
+    agregados.actualizar_ranking_usuario(instance.usuario_id, 0)
+
+
+# 📝 EXPLICACIÓN: Marcas de borrado para la sincronización (api/sync/)
+def marcar_eliminado(usuario_id, modelo, objeto_id):
+    RegistroEliminado.objects.create(usuario_id=usuario_id, modelo=modelo, objeto_id=objeto_id)
+
+
+@receiver(post_delete, sender=Rutina)
+@_salvo_suspendidas
+def rutina_eliminada(sender, instance, **kwargs):
+    marcar_eliminado(instance.usuario_id, 'rutina', instance.id)
+
+
+@receiver(post_delete, sender=EjercicioRutina)
+@_salvo_suspendidas
+def ejercicio_rutina_eliminado(sender, instance, **kwargs):
+    usuario_id = Rutina.objects.filter(
+        id=instance.rutina_id
+    ).values_list('usuario_id', flat=True).first()
+    if usuario_id:
+        marcar_eliminado(usuario_id, 'ejercicio_rutina', instance.id)
+
+
+# 📝 EXPLICACIÓN: Cualquier cambio en el catálogo obliga a cada proceso a
+# recargar su copia en memoria
+@receiver(post_save, sender=Ejercicio)
+@receiver(post_delete, sender=Ejercicio)
+def ejercicio_cambiado(sender, instance, **kwargs):
+    catalogo.invalidar()
@@ -0,0 +1,55 @@
+"""
+Ajustes de SQLite para producción (perfil GYM_SQLITE_PRODUCCION=1, ver
+gymprogress/settings.py).
+
+- Los PRAGMA se aplican a cada conexión nueva desde la señal
+  connection_created (WAL, synchronous=NORMAL, mmap, cache_size...).
+- SQLite admite un solo escritor a la vez. La espera por el cerrojo la
+  hace el propio sqlite3 (OPTIONS['timeout']), pero una transacción que
+  empezó leyendo y luego quiere escribir falla al momento con "database
+  is locked" si otro escribió entre medias. Para eso está
+  reintentar_si_bloqueada(): repite la vista entera, que tiene que hacer
+  todas sus escrituras dentro de un transaction.atomic().
+"""
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def aplicar_pragmas(sender, connection, **kwargs):
+    pragmas = getattr(settings, 'GYM_SQLITE_PRAGMAS', {})
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for nombre, valor in pragmas.items():
+            cursor.execute(f'PRAGMA {nombre} = {valor}')
+
+
+def _bloqueada(error):
+    return 'database is locked' in str(error) or 'database table is locked' in str(error)
+
+
+def reintentar_si_bloqueada(vista):
+    """
+    Repite la vista (hasta GYM_SQLITE_REINTENTOS veces, con espera
+    exponencial y algo de azar) si SQLite la rechaza por estar bloqueada.
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        reintentos = getattr(settings, 'GYM_SQLITE_REINTENTOS', 0)
+        espera = getattr(settings, 'GYM_SQLITE_ESPERA_REINTENTO', 0.05)
+        for intento in range(reintentos + 1):
+            try:
+                return vista(request, *args, **kwargs)
+            except OperationalError as error:
+                # Dentro de un atomic() de fuera no se puede repetir: ya no es todo o nada
+                if not _bloqueada(error) or intento == reintentos or connection.in_atomic_block:
+                    raise
+            time.sleep(espera * 2 ** intento * random.uniform(0.5, 1.5))
+    return envoltura
@@ -1,3 +1,1916 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import pstats
+import random
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from . import (
+    agregados, archivo, cache_progreso, catalogo, grupos_musculares, importar, metricas, progresion, progreso_async,
+    series_temporales, sqlite,
+)
+from .exportar import exportar, filas_historial
+from .fuerza import estimar_1rm, peso_para
+from .models import (
+    Ejercicio, EjercicioRutina, Entrenamiento, EstadisticasUsuario, Importacion, Perfil, PerfilPeticion,
+    RankingFuerza, RecordPersonal, ResumenSesionEjercicio, Rutina, SerieEjercicio, SesionArchivada,
+    UltimoRendimiento,
+)
+from .urls import urlpatterns
+from .views import calcular_volumen_sesiones
+
+
+# 📝 EXPLICACIÓN: Crea un usuario con `sesiones` entrenamientos repartidos
+# entre `rutinas` rutinas (3 series por ejercicio) y un entrenamiento a
+# medias, con la mitad de los ejercicios hechos, para las páginas de
+# registrar/finalizar. Va con bulk_create y reconstruye los agregados al
+# final, como haría una importación.
+def sembrar_usuario(username, ejercicios, rutinas, ejercicios_por_rutina, sesiones, semilla=1):
+    azar = random.Random(semilla)
+    usuario = User.objects.create_user(username, password='clave-de-prueba')
+    Perfil.objects.create(usuario=usuario, peso_corporal=80)
+
+    lista_rutinas = Rutina.objects.bulk_create([
+        Rutina(usuario=usuario, nombre=f'Rutina {numero}') for numero in range(rutinas)
+    ])
+    ejercicios_rutina = EjercicioRutina.objects.bulk_create([
+        EjercicioRutina(rutina=rutina, ejercicio=ejercicio, series=3, orden=orden)
+        for rutina in lista_rutinas
+        for orden, ejercicio in enumerate(azar.sample(ejercicios, ejercicios_por_rutina), start=1)
+    ])
+    por_rutina = {}
+    for ejercicio_rutina in ejercicios_rutina:
+        por_rutina.setdefault(ejercicio_rutina.rutina_id, []).append(ejercicio_rutina)
+
+    ahora = timezone.now()
+    entrenamientos = Entrenamiento.objects.bulk_create([
+        Entrenamiento(
+            usuario=usuario,
+            rutina=lista_rutinas[numero % rutinas],
+            fecha=ahora - timedelta(days=2 * (sesiones - numero)),
+            duracion_minutos=60,
+        )
+        for numero in range(sesiones)
+    ])
+    en_curso = Entrenamiento.objects.create(usuario=usuario, rutina=lista_rutinas[0])
+    hechos = {
+        ejercicio_rutina.id for ejercicio_rutina in por_rutina[en_curso.rutina_id][:ejercicios_por_rutina // 2]
+    }
+    series = [
+        SerieEjercicio(
+            entrenamiento=entrenamiento,
+            ejercicio_rutina=ejercicio_rutina,
+            numero_serie=numero_serie,
+            peso_kg=azar.choice([40, 50, 60, 70, 80, 90, 100]),
+            repeticiones=azar.randint(3, 12),
+            rpe=azar.randint(6, 10),
+        )
+        for entrenamiento in entrenamientos + [en_curso]
+        for ejercicio_rutina in por_rutina[entrenamiento.rutina_id]
+        if entrenamiento is not en_curso or ejercicio_rutina.id in hechos
+        for numero_serie in range(1, 4)
+    ]
+    for serie in series:
+        serie.calcular_e1rm()
+    SerieEjercicio.objects.bulk_create(series)
+    agregados.reconstruir_resumenes(usuario)
+    agregados.reconstruir_records(usuario)
+    agregados.reconstruir_ultimos_rendimientos(usuario)
+    agregados.reconstruir_estadisticas(usuario)
+    agregados.actualizar_ranking_usuario(usuario.id)
+
+    en_curso.iniciar_cursor()
+    return usuario
+
+
+# Sin pool en las vistas async: sus hilos no verían los datos del test
+@override_settings(GYM_PROGRESO_HILOS=0)
+@override_settings(GYM_METRICAS_TOKEN='presupuesto')
+class PresupuestoConsultasTests(TestCase):
+    """
+    Cada ruta de gym/urls.py se pide con un usuario de 3 sesiones y con
+    otro de 150 (y rutinas con el cuádruple de ejercicios). El número de
+    consultas SQL tiene que ser el mismo en los dos (si crece con el
+    historial, hay un N+1) y no pasar del presupuesto.
+
+    Los tiempos se guardan en `tiempos`; con GYM_TIEMPOS=1 se imprimen al
+    final.
+    """
+
+    tiempos = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        ejercicios = Ejercicio.objects.bulk_create([
+            Ejercicio(nombre=f'Ejercicio {numero}', grupo_muscular=grupo)
+            for numero, grupo in enumerate(['pecho', 'espalda', 'piernas', 'hombros', 'brazos', 'core'] * 2)
+        ])
+        cls.pequeno = sembrar_usuario('pequeno', ejercicios, rutinas=1, ejercicios_por_rutina=3, sesiones=3)
+        cls.grande = sembrar_usuario('grande', ejercicios, rutinas=6, ejercicios_por_rutina=12, sesiones=150)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if os.environ.get('GYM_TIEMPOS'):
+            sys.stderr.write('\nruta                          pequeño    grande\n')
+            for nombre, (pequeno, grande) in sorted(cls.tiempos.items()):
+                sys.stderr.write(f'{nombre:<28}{pequeno * 1000:>8.1f}ms{grande * 1000:>8.1f}ms\n')
+
+    def peticiones(self, usuario):
+        """
+        Una petición representativa por ruta:
+        (nombre, método, máximo de consultas con sesión y usuario incluidos, kwargs, datos)
+        """
+        rutina = Rutina.objects.filter(usuario=usuario).order_by('id').first()
+        en_curso = Entrenamiento.objects.filter(usuario=usuario).latest('id')
+        ejercicio_rutina = rutina.ejercicios.order_by('orden').first()
+        return [
+            ('home', 'get', 3, {}, None),
+            ('registro', 'get', 2, {}, None),
+            ('login', 'get', 2, {}, None),
+            ('logout', 'get', 4, {}, None),
+            ('lista_rutinas', 'get', 3, {}, None),
+            ('crear_rutina', 'get', 2, {}, None),
+            ('editar_rutina', 'get', 3, {'rutina_id': rutina.id}, None),
+            ('eliminar_rutina', 'get', 4, {'rutina_id': rutina.id}, None),
+            ('detalle_rutina', 'get', 4, {'rutina_id': rutina.id}, None),
+            ('agregar_ejercicio_rutina', 'get', 3, {'rutina_id': rutina.id}, None),
+            ('iniciar_entrenamiento', 'get', 13, {'rutina_id': rutina.id}, None),
+            ('registrar_serie', 'get', 5, {'entrenamiento_id': en_curso.id}, None),
+            ('registrar_serie', 'post', 23, {'entrenamiento_id': en_curso.id},
+             {'peso': 60, 'repeticiones': 8, 'rpe': 8}),
+            ('registrar_series_lote', 'get', 4, {'entrenamiento_id': en_curso.id}, None),
+            ('finalizar_entrenamiento', 'get', 5, {'entrenamiento_id': en_curso.id}, None),
+            ('historial_entrenamientos', 'get', 3, {}, None),
+            ('exportar_historial', 'get', 4, {}, {'formato': 'jsonl'}),
+            ('importar_historial', 'get', 4, {}, None),
+            ('progreso_dashboard', 'get', 7, {}, None),
+            ('progreso_ejercicio', 'get', 6, {'ejercicio_id': ejercicio_rutina.ejercicio_id}, None),
+            ('progreso_grupos', 'get', 3, {}, None),
+            ('ranking_ejercicio', 'get', 5, {'ejercicio_id': ejercicio_rutina.ejercicio_id}, None),
+            ('progreso_dashboard_async', 'get', 7, {}, None),
+            ('progreso_ejercicio_async', 'get', 6, {'ejercicio_id': ejercicio_rutina.ejercicio_id}, None),
+            ('actualizar_peso', 'post', 12, {}, {'peso_corporal': 81}),
+            ('api_sync', 'get', 9, {}, None),
+            ('metricas', 'get', 0, {}, None),
+            ('api_volumen_grupos', 'get', 3, {}, {'semanas': 26}),
+            ('api_ranking_ejercicio', 'get', 4, {'ejercicio_id': ejercicio_rutina.ejercicio_id}, {'categoria': '80-90'}),
+            ('api_buscar_ejercicios', 'get', 3, {}, {'q': 'ejer', 'grupo': 'pecho'}),
+            ('api_serie_ejercicio', 'get', 5, {'ejercicio_id': ejercicio_rutina.ejercicio_id}, None),
+            ('api_subir', 'post', 36, {}, json.dumps({
+                'entrenamientos': [{'clave': f'e-{usuario.id}', 'rutina_id': rutina.id}],
+                'series': [
+                    {'clave': f's-{usuario.id}-{numero}', 'entrenamiento_clave': f'e-{usuario.id}',
+                     'ejercicio_rutina_id': ejercicio_rutina.id, 'peso_kg': 60, 'repeticiones': 8}
+                    for numero in range(3)
+                ],
+            })),
+        ]
+
+    def medir(self, usuario, nombre, metodo, kwargs, datos):
+        """Hace la petición dentro de una transacción que se deshace al final"""
+        cache.clear()
+        self.client.force_login(usuario)
+        url = reverse(nombre, kwargs=kwargs)
+        extra = {'content_type': 'application/json'} if nombre.startswith('api_') and datos else {}
+        if nombre == 'metricas':
+            # Como lo pide Prometheus: con el token, sin sesión
+            extra['HTTP_AUTHORIZATION'] = 'Bearer presupuesto'
+
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                respuesta = getattr(self.client, metodo)(url, datos, **extra)
+                if respuesta.streaming:
+                    # Las consultas de una respuesta en streaming se hacen al leerla
+                    b''.join(respuesta.streaming_content)
+                duracion = time.perf_counter() - inicio
+            transaction.set_rollback(True)
+
+        self.assertLess(respuesta.status_code, 400, f'{metodo.upper()} {url}')
+        return consultas.captured_queries, duracion
+
+    def test_todas_las_rutas_tienen_presupuesto(self):
+        nombres = {patron.name for patron in urlpatterns}
+        self.assertEqual(nombres, {peticion[0] for peticion in self.peticiones(self.pequeno)})
+
+    def test_consultas_no_crecen_con_el_historial(self):
+        for (nombre, metodo, presupuesto, kwargs_pequeno, datos_pequeno), (*_, kwargs_grande, datos_grande) in zip(
+            self.peticiones(self.pequeno), self.peticiones(self.grande)
+        ):
+            with self.subTest(ruta=nombre, metodo=metodo):
+                pequeno, tiempo_pequeno = self.medir(self.pequeno, nombre, metodo, kwargs_pequeno, datos_pequeno)
+                grande, tiempo_grande = self.medir(self.grande, nombre, metodo, kwargs_grande, datos_grande)
+                self.tiempos[f'{metodo.upper()} {nombre}'] = (tiempo_pequeno, tiempo_grande)
+
+                sql_grande = '\n'.join(consulta['sql'] for consulta in grande)
+                self.assertEqual(
+                    len(pequeno), len(grande),
+                    f'{nombre}: {len(pequeno)} consultas con 3 sesiones y {len(grande)} con 150\n{sql_grande}'
+                )
+                self.assertLessEqual(
+                    len(grande), presupuesto,
+                    f'{nombre} pasa de {presupuesto} consultas\n{sql_grande}'
+                )
+
+
+class AgregadosTests(TestCase):
+    """
+    Cada agregado mantenido en las escrituras (señales) tiene que quedar
+    igual que si se reconstruyera desde cero: se hace una tanda de
+    escrituras al azar (crear, editar, mover y borrar series y sesiones)
+    con pesos y repeticiones repetidos a propósito para forzar empates.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        ejercicios = Ejercicio.objects.bulk_create([
+            Ejercicio(nombre=f'Ejercicio {numero}', grupo_muscular='pecho') for numero in range(5)
+        ])
+        cls.usuario = sembrar_usuario('mantenido', ejercicios, rutinas=2, ejercicios_por_rutina=3, sesiones=12)
+
+    def escrituras_al_azar(self, pasos=120, semilla=1):
+        azar = random.Random(semilla)
+        rutinas = list(Rutina.objects.filter(usuario=self.usuario).prefetch_related('ejercicios'))
+        for _ in range(pasos):
+            operacion = azar.choice(['crear'] * 4 + ['editar'] * 2 + ['mover', 'borrar', 'borrar', 'sesion'])
+            series = list(SerieEjercicio.objects.filter(entrenamiento__usuario=self.usuario).select_related(
+                'entrenamiento__rutina'
+            ))
+            if operacion == 'sesion':
+                if azar.random() < 0.3:
+                    Entrenamiento.objects.filter(usuario=self.usuario).order_by('?').first().delete()
+                else:
+                    Entrenamiento.objects.create(
+                        usuario=self.usuario, rutina=azar.choice(rutinas),
+                        fecha=timezone.now() - timedelta(days=azar.randint(0, 40)),
+                    )
+            elif operacion == 'crear' or not series:
+                entrenamiento = Entrenamiento.objects.filter(usuario=self.usuario).order_by('?').first()
+                SerieEjercicio.objects.create(
+                    entrenamiento=entrenamiento,
+                    ejercicio_rutina=azar.choice(list(entrenamiento.rutina.ejercicios.all())),
+                    numero_serie=azar.randint(1, 4),
+                    peso_kg=azar.choice([60, 80, 100]), repeticiones=azar.choice([5, 8]), rpe=azar.choice([None, 8]),
+                )
+            elif operacion == 'editar':
+                serie = azar.choice(series)
+                serie.peso_kg = azar.choice([60, 80, 100, 120])
+                serie.repeticiones = azar.choice([3, 5, 8])
+                serie.save()
+            elif operacion == 'mover':
+                serie = azar.choice(series)
+                serie.ejercicio_rutina = azar.choice(list(serie.entrenamiento.rutina.ejercicios.all()))
+                serie.save()
+            else:
+                azar.choice(series).delete()
+
+    def assertIgualQueReconstruir(self, modelo, campos, reconstruir):
+        def filas():
+            return sorted(modelo.objects.filter(usuario=self.usuario).values_list(*campos))
+
+        self.escrituras_al_azar()
+        mantenidas = filas()
+        self.assertTrue(mantenidas)
+        reconstruir(self.usuario)
+        self.assertEqual(mantenidas, filas())
+
+    def test_resumenes_por_sesion(self):
+        self.assertIgualQueReconstruir(ResumenSesionEjercicio, [
+            'entrenamiento_id', 'ejercicio_id', 'fecha', 'peso_maximo', 'reps_totales', 'series_completadas',
+            'volumen_total', 'e1rm_maximo',
+        ], agregados.reconstruir_resumenes)
+
+    def test_records(self):
+        # En los empates gana la serie más antigua, por las dos vías
+        self.assertIgualQueReconstruir(RecordPersonal, [
+            'ejercicio_id', 'repeticiones_minimas', 'peso_kg', 'repeticiones', 'e1rm', 'fecha', 'serie_id',
+        ], agregados.reconstruir_records)
+
+    def test_estadisticas_del_usuario(self):
+        # El ejercicio más frecuente se cuenta sobre los resúmenes: primero hay que tenerlos
+        self.assertIgualQueReconstruir(EstadisticasUsuario, [
+            'total_entrenamientos', 'total_series', 'volumen_total', 'primera_fecha', 'ultima_fecha',
+            'ejercicio_frecuente_id',
+        ], agregados.reconstruir_estadisticas)
+
+    def test_volumen_por_sesion_en_una_consulta(self):
+        self.escrituras_al_azar()
+        # (día, punto del gráfico) de cada sesión con series, la más reciente primero
+        esperado = []
+        for entrenamiento in Entrenamiento.objects.filter(usuario=self.usuario).order_by('-fecha'):
+            series = list(entrenamiento.series.all())
+            if series:
+                esperado.append((timezone.localtime(entrenamiento.fecha).date(), {
+                    'fecha': entrenamiento.fecha.strftime('%d/%m'),
+                    'volumen': sum(serie.peso_kg * serie.repeticiones for serie in series),
+                    'nombre': entrenamiento.rutina.nombre,
+                }))
+        puntos = [punto for _, punto in esperado]
+
+        with self.assertNumQueries(1):
+            self.assertEqual(calcular_volumen_sesiones(self.usuario, sesiones=500), puntos)
+        with self.assertNumQueries(1):
+            self.assertEqual(calcular_volumen_sesiones(self.usuario, sesiones=5), puntos[:5])
+        desde = esperado[len(esperado) // 2][0]
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                calcular_volumen_sesiones(self.usuario, desde=desde),
+                [punto for dia, punto in esperado if dia >= desde],
+            )
+
+
+class CursorTests(TestCase):
+    """Cursor del entrenamiento: avanzar, saltar, priorizar y doble envío"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('cursor', password='x')
+        rutina = Rutina.objects.create(usuario=cls.usuario, nombre='Torso')
+        cls.press, cls.remo, cls.curl = [
+            EjercicioRutina.objects.create(
+                rutina=rutina, ejercicio=Ejercicio.objects.create(nombre=nombre, grupo_muscular='pecho'),
+                orden=orden, series=series,
+            )
+            for orden, (nombre, series) in enumerate([('Press', 2), ('Remo', 2), ('Curl', 1)], start=1)
+        ]
+        cls.rutina = rutina
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+        self.client.post(reverse('iniciar_entrenamiento', kwargs={'rutina_id': self.rutina.id}))
+        self.entrenamiento = Entrenamiento.objects.get(usuario=self.usuario)
+        self.url = reverse('registrar_serie', kwargs={'entrenamiento_id': self.entrenamiento.id})
+
+    def posicion(self):
+        self.entrenamiento.refresh_from_db()
+        return self.entrenamiento.ejercicio_actual_id, self.entrenamiento.serie_actual, self.entrenamiento.ejercicios_pendientes
+
+    def registrar(self):
+        return self.client.post(self.url, {'peso': 50, 'repeticiones': 8, 'rpe': 8})
+
+    def test_avanza_serie_a_serie_y_termina(self):
+        self.assertEqual(self.posicion(), (self.press.id, 1, [self.remo.id, self.curl.id]))
+        self.registrar()
+        self.assertEqual(self.posicion(), (self.press.id, 2, [self.remo.id, self.curl.id]))
+        self.registrar()
+        self.assertEqual(self.posicion(), (self.remo.id, 1, [self.curl.id]))
+        for _ in range(3):
+            self.registrar()
+        self.assertEqual(self.posicion(), (None, 1, []))
+        self.assertRedirects(
+            self.client.get(self.url),
+            reverse('finalizar_entrenamiento', kwargs={'entrenamiento_id': self.entrenamiento.id}),
+            fetch_redirect_response=False,
+        )
+        self.assertEqual(
+            list(self.entrenamiento.series.order_by('id').values_list('ejercicio_rutina_id', 'numero_serie')),
+            [(self.press.id, 1), (self.press.id, 2), (self.remo.id, 1), (self.remo.id, 2), (self.curl.id, 1)],
+        )
+
+    def test_saltar_y_priorizar(self):
+        self.registrar()
+        self.client.post(self.url, {'accion': 'saltar'})
+        self.assertEqual(self.posicion(), (self.remo.id, 1, [self.curl.id]))
+
+        # El actual vuelve a la cola, detrás del priorizado
+        self.client.post(self.url, {'accion': 'priorizar', 'ejercicio_rutina_id': self.curl.id})
+        self.assertEqual(self.posicion(), (self.curl.id, 1, [self.remo.id]))
+        self.registrar()
+        self.assertEqual(self.posicion(), (self.remo.id, 1, []))
+
+        # Un ejercicio que no está pendiente no cambia nada
+        self.client.post(self.url, {'accion': 'priorizar', 'ejercicio_rutina_id': self.press.id})
+        self.assertEqual(self.posicion(), (self.remo.id, 1, []))
+
+    def test_priorizar_continua_un_ejercicio_empezado(self):
+        self.registrar()
+        self.client.post(self.url, {'accion': 'priorizar', 'ejercicio_rutina_id': self.remo.id})
+        self.assertEqual(self.posicion(), (self.remo.id, 1, [self.press.id, self.curl.id]))
+        self.client.post(self.url, {'accion': 'saltar'})
+        # Press ya tenía una serie: sigue por la segunda
+        self.assertEqual(self.posicion(), (self.press.id, 2, [self.curl.id]))
+
+    def test_doble_envio_no_registra_dos_veces(self):
+        primera = Entrenamiento.objects.get(id=self.entrenamiento.id)
+        segunda = Entrenamiento.objects.get(id=self.entrenamiento.id)
+        self.assertTrue(primera.avanzar_cursor())
+        # La segunda petición leyó el cursor antes de que se moviera: pierde
+        self.assertFalse(segunda.avanzar_cursor())
+        self.assertEqual(self.posicion(), (self.press.id, 2, [self.remo.id, self.curl.id]))
+
+        # Como en registrar_serie: la serie de quien pierde la carrera se deshace
+        with transaction.atomic():
+            SerieEjercicio.objects.create(
+                entrenamiento=segunda, ejercicio_rutina=self.press, numero_serie=1, peso_kg=50, repeticiones=8,
+            )
+            perdio = not segunda.avanzar_cursor()
+            transaction.set_rollback(perdio)
+        self.assertTrue(perdio)
+        self.assertFalse(self.entrenamiento.series.exists())
+
+    def test_iniciar_cursor_con_series_ya_registradas(self):
+        for numero in (1, 2):
+            SerieEjercicio.objects.create(
+                entrenamiento=self.entrenamiento, ejercicio_rutina=self.press, numero_serie=numero,
+                peso_kg=50, repeticiones=8,
+            )
+        SerieEjercicio.objects.create(
+            entrenamiento=self.entrenamiento, ejercicio_rutina=self.remo, numero_serie=1, peso_kg=50, repeticiones=8,
+        )
+        self.entrenamiento.iniciar_cursor()
+        self.assertEqual(self.posicion(), (self.remo.id, 2, [self.curl.id]))
+
+
+class SeriesLoteTests(TestCase):
+    """Registro por lotes: validación del formset, numeración y agregados"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('lote', password='x')
+        rutina = Rutina.objects.create(usuario=cls.usuario, nombre='Pierna')
+        cls.sentadilla, cls.peso_muerto = [
+            EjercicioRutina.objects.create(
+                rutina=rutina, ejercicio=Ejercicio.objects.create(nombre=nombre, grupo_muscular='piernas'),
+                orden=orden, series=2,
+            )
+            for orden, nombre in enumerate(['Sentadilla', 'Peso muerto'], start=1)
+        ]
+        otra = Rutina.objects.create(usuario=cls.usuario, nombre='Otra')
+        cls.ajeno = EjercicioRutina.objects.create(
+            rutina=otra, ejercicio=Ejercicio.objects.create(nombre='Curl', grupo_muscular='brazos'), orden=1,
+        )
+        cls.rutina = rutina
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+        self.entrenamiento = Entrenamiento.objects.create(usuario=self.usuario, rutina=self.rutina)
+        self.entrenamiento.iniciar_cursor()
+        self.url = reverse('registrar_series_lote', kwargs={'entrenamiento_id': self.entrenamiento.id})
+
+    def enviar(self, filas):
+        """filas: [(ejercicio_rutina, peso, repeticiones, rpe)], '' para dejar un campo vacío"""
+        datos = {'form-TOTAL_FORMS': len(filas), 'form-INITIAL_FORMS': len(filas)}
+        for numero, (ejercicio_rutina, peso, repeticiones, rpe) in enumerate(filas):
+            datos.update({
+                f'form-{numero}-ejercicio_rutina': ejercicio_rutina.id,
+                f'form-{numero}-peso': peso,
+                f'form-{numero}-repeticiones': repeticiones,
+                f'form-{numero}-rpe': rpe,
+            })
+        return self.client.post(self.url, datos)
+
+    def test_una_fila_por_serie_planificada(self):
+        respuesta = self.client.get(self.url)
+        self.assertEqual(
+            [ejercicio_rutina.id for _, ejercicio_rutina in respuesta.context['filas']],
+            [self.sentadilla.id] * 2 + [self.peso_muerto.id] * 2,
+        )
+        respuesta = self.client.get(self.url, {'ejercicio': self.peso_muerto.id})
+        self.assertEqual(len(respuesta.context['filas']), 2)
+
+    def test_numera_despues_de_las_existentes_y_actualiza_todo(self):
+        SerieEjercicio.objects.create(
+            entrenamiento=self.entrenamiento, ejercicio_rutina=self.sentadilla, numero_serie=1,
+            peso_kg=100, repeticiones=5,
+        )
+        respuesta = self.enviar([
+            (self.sentadilla, 110, 5, 8),
+            (self.sentadilla, '', '', ''),  # vacía: se ignora
+            (self.peso_muerto, 140, 3, ''),
+            (self.peso_muerto, 140, 3, 9),
+        ])
+        self.assertRedirects(respuesta, reverse('registrar_serie', kwargs={'entrenamiento_id': self.entrenamiento.id}),
+                             fetch_redirect_response=False)
+
+        self.assertEqual(list(self.entrenamiento.series.order_by('id').values_list(
+            'ejercicio_rutina_id', 'numero_serie', 'peso_kg', 'rpe',
+        )), [
+            (self.sentadilla.id, 1, 100, None), (self.sentadilla.id, 2, 110, 8),
+            (self.peso_muerto.id, 1, 140, None), (self.peso_muerto.id, 2, 140, 9),
+        ])
+        # 1RM, agregados y cursor, aunque bulk_create no pasa por save() ni señales
+        self.assertFalse(self.entrenamiento.series.filter(e1rm__isnull=True).exists())
+        resumen = ResumenSesionEjercicio.objects.get(
+            entrenamiento=self.entrenamiento, ejercicio_id=self.peso_muerto.ejercicio_id
+        )
+        self.assertEqual((resumen.series_completadas, resumen.volumen_total), (2, 840))
+        self.assertEqual(EstadisticasUsuario.objects.get(usuario=self.usuario).total_series, 4)
+        self.assertEqual(RecordPersonal.objects.get(
+            usuario=self.usuario, ejercicio_id=self.sentadilla.ejercicio_id, repeticiones_minimas=0
+        ).peso_kg, 110)
+        self.entrenamiento.refresh_from_db()
+        self.assertIsNone(self.entrenamiento.ejercicio_actual)
+
+    def test_numera_dentro_de_la_transaccion(self):
+        # Contar las series hechas y el INSERT van en la misma transacción
+        # (el SAVEPOINT del atomic() de la vista, dentro del de TestCase)
+        with CaptureQueriesContext(connection) as consultas:
+            self.enviar([(self.sentadilla, 100, 5, '')])
+        sql = [consulta['sql'] for consulta in consultas.captured_queries]
+        inicio = next(numero for numero, texto in enumerate(sql) if texto.startswith('SAVEPOINT'))
+        fin = next(numero for numero, texto in enumerate(sql) if texto.startswith('RELEASE SAVEPOINT'))
+        cuenta = next(numero for numero, texto in enumerate(sql) if 'COUNT(' in texto and 'gym_serieejercicio' in texto)
+        insercion = next(numero for numero, texto in enumerate(sql) if texto.startswith('INSERT INTO "gym_serieejercicio"'))
+        self.assertLess(inicio, cuenta)
+        self.assertLess(cuenta, insercion)
+        self.assertLess(insercion, fin)
+
+    def test_filas_invalidas_no_guardan_nada(self):
+        casos = [
+            ('a medias', [(self.sentadilla, 100, '', ''), (self.peso_muerto, 140, 3, '')]),
+            ('todas vacías', [(self.sentadilla, '', '', '')]),
+            ('fuera de rango', [(self.sentadilla, 100, 5, 11)]),
+            ('otra rutina', [(self.sentadilla, 100, 5, ''), (self.ajeno, 20, 10, '')]),
+        ]
+        for caso, filas in casos:
+            with self.subTest(caso):
+                respuesta = self.enviar(filas)
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertFalse(respuesta.context['formset'].is_valid())
+                self.assertFalse(self.entrenamiento.series.exists())
+
+
+class SincronizacionTests(TestCase):
+    """API de sincronización: subida idempotente, claves ajenas, deltas y datos malformados"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('movil', password='x')
+        cls.otro = User.objects.create_user('otro_movil', password='x')
+        cls.rutina = Rutina.objects.create(usuario=cls.usuario, nombre='Empuje')
+        cls.ejercicio_rutina = EjercicioRutina.objects.create(
+            rutina=cls.rutina, ejercicio=Ejercicio.objects.create(nombre='Press', grupo_muscular='pecho'), orden=1,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def subir(self, datos):
+        return self.client.post(reverse('api_subir'), json.dumps(datos), content_type='application/json')
+
+    def lote(self):
+        return {
+            'entrenamientos': [{'clave': 'sesion-1', 'rutina_id': self.rutina.id, 'fecha': '2025-03-01T10:00:00+00:00'}],
+            'series': [
+                {'clave': f'serie-{numero}', 'entrenamiento_clave': 'sesion-1',
+                 'ejercicio_rutina_id': self.ejercicio_rutina.id, 'peso_kg': 60, 'repeticiones': 8}
+                for numero in (1, 2)
+            ],
+        }
+
+    def test_reintentar_un_lote_no_duplica(self):
+        primera = self.subir(self.lote())
+        self.assertEqual(primera.status_code, 200)
+        segunda = self.subir(self.lote())
+        self.assertEqual(segunda.json(), primera.json())
+
+        self.assertEqual(Entrenamiento.objects.filter(usuario=self.usuario).count(), 1)
+        entrenamiento = Entrenamiento.objects.get(clave_cliente='sesion-1')
+        self.assertEqual(list(entrenamiento.series.order_by('id').values_list('numero_serie', flat=True)), [1, 2])
+        self.assertEqual(EstadisticasUsuario.objects.get(usuario=self.usuario).total_series, 2)
+
+        # Un reintento parcial con una serie nueva solo guarda la nueva
+        lote = self.lote()
+        lote['series'].append({**lote['series'][0], 'clave': 'serie-3'})
+        self.assertEqual(len(self.subir(lote).json()['series']), 3)
+        self.assertEqual(entrenamiento.series.count(), 3)
+
+    def test_clave_de_otro_usuario(self):
+        self.subir(self.lote())
+        self.client.force_login(self.otro)
+        rutina = Rutina.objects.create(usuario=self.otro, nombre='Suya')
+        respuesta = self.subir({'entrenamientos': [{'clave': 'sesion-1', 'rutina_id': rutina.id}]})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(Entrenamiento.objects.filter(usuario=self.otro).exists())
+
+        # Ni subir series a la sesión de otro por su id
+        ajena = Entrenamiento.objects.get(clave_cliente='sesion-1')
+        respuesta = self.subir({'series': [{
+            'clave': 'intrusa', 'entrenamiento_id': ajena.id, 'ejercicio_rutina_id': self.ejercicio_rutina.id,
+            'peso_kg': 60, 'repeticiones': 8,
+        }]})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(ajena.series.count(), 2)
+
+    def test_delta_con_marcas_de_borrado(self):
+        self.subir(self.lote())
+        completa = self.client.get(reverse('api_sync')).json()
+        self.assertEqual([serie['clave_cliente'] for serie in completa['series']], ['serie-1', 'serie-2'])
+        self.assertEqual(completa['eliminados'], [])
+
+        borrada = SerieEjercicio.objects.get(clave_cliente='serie-1')
+        borrada_id = borrada.id
+        borrada.delete()
+        lote = self.lote()
+        lote['series'] = [{**lote['series'][0], 'clave': 'serie-3'}]
+        self.subir(lote)
+
+        delta = self.client.get(reverse('api_sync'), {'desde': completa['marca']}).json()
+        self.assertEqual([serie['clave_cliente'] for serie in delta['series']], ['serie-3'])
+        self.assertEqual(delta['eliminados'], [{'modelo': 'serie', 'objeto_id': borrada_id}])
+        self.assertEqual(delta['rutinas'], [])
+
+        # La sesión borrada llega como marca de borrado, con sus series dentro
+        sesion = Entrenamiento.objects.get(clave_cliente='sesion-1')
+        sesion_id = sesion.id
+        sesion.delete()
+        delta = self.client.get(reverse('api_sync'), {'desde': delta['marca']}).json()
+        self.assertIn({'modelo': 'entrenamiento', 'objeto_id': sesion_id}, delta['eliminados'])
+        self.assertEqual(delta['entrenamientos'], [])
+
+    def test_datos_malformados(self):
+        lote = self.lote()
+        casos = {
+            'rutina como lista': {'entrenamientos': [{**lote['entrenamientos'][0], 'rutina_id': [1]}]},
+            'fecha imposible': {'entrenamientos': [{**lote['entrenamientos'][0], 'fecha': '2025-13-40T00:00:00'}]},
+            'clave de sesión como objeto': {**lote, 'series': [{**lote['series'][0], 'entrenamiento_clave': {}}]},
+            'ejercicio como lista': {**lote, 'series': [{**lote['series'][0], 'ejercicio_rutina_id': [1]}]},
+            'sesión como texto': {'series': [{**lote['series'][0], 'entrenamiento_clave': None,
+                                              'entrenamiento_id': '1'}]},
+        }
+        for caso, datos in casos.items():
+            with self.subTest(caso):
+                self.assertEqual(self.subir(datos).status_code, 400)
+        self.assertFalse(Entrenamiento.objects.filter(usuario=self.usuario).exists())
+
+        for desde in ('2025-13-40T00:00:00', 'ayer'):
+            with self.subTest(desde=desde):
+                self.assertEqual(self.client.get(reverse('api_sync'), {'desde': desde}).status_code, 400)
+
+
+class HistorialTests(TestCase):
+    """Historial paginado por cursor (fecha, id)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        ejercicios = Ejercicio.objects.bulk_create([
+            Ejercicio(nombre=f'Ejercicio {numero}', grupo_muscular='pecho') for numero in range(3)
+        ])
+        cls.usuario = sembrar_usuario('paginado', ejercicios, rutinas=1, ejercicios_por_rutina=2, sesiones=45)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def test_recorre_todas_las_paginas_sin_repetir(self):
+        vistos = []
+        parametros = {}
+        while True:
+            respuesta = self.client.get(reverse('historial_entrenamientos'), parametros)
+            vistos += [entrenamiento.id for entrenamiento in respuesta.context['entrenamientos']]
+            if not respuesta.context['cursor_siguiente']:
+                break
+            parametros = {'antes': respuesta.context['cursor_siguiente']}
+        self.assertEqual(vistos, list(Entrenamiento.objects.filter(
+            usuario=self.usuario
+        ).order_by('-fecha', '-id').values_list('id', flat=True)))
+
+    def test_cursor_invalido_vuelve_a_la_primera_pagina(self):
+        for cursor in ('basura', '12_', '99999999999999999999999_1', '-99999999999999999999_1'):
+            with self.subTest(cursor=cursor):
+                respuesta = self.client.get(reverse('historial_entrenamientos'), {'antes': cursor})
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertTrue(respuesta.context['es_primera_pagina'])
+
+
+class CacheProgresoTests(TestCase):
+    """Marca (watermark) por usuario: lo cacheado vale hasta la próxima escritura"""
+
+    @classmethod
+    def setUpTestData(cls):
+        ejercicios = Ejercicio.objects.bulk_create([
+            Ejercicio(nombre=f'Ejercicio {numero}', grupo_muscular='pecho') for numero in range(3)
+        ])
+        cls.usuario = sembrar_usuario('cacheado', ejercicios, rutinas=1, ejercicios_por_rutina=2, sesiones=4)
+        cls.otro = sembrar_usuario('vecino', ejercicios, rutinas=1, ejercicios_por_rutina=2, sesiones=2)
+
+    def setUp(self):
+        cache.clear()
+        self.calculos = 0
+
+    def obtener(self, usuario=None):
+        def calcular():
+            self.calculos += 1
+            return self.calculos
+        return cache_progreso.obtener_o_calcular((usuario or self.usuario).id, 'prueba', calcular)
+
+    def test_escrituras_que_cambian_la_marca(self):
+        entrenamiento = Entrenamiento.objects.filter(usuario=self.usuario).latest('id')
+        ejercicio_rutina = entrenamiento.rutina.ejercicios.first()
+        serie = entrenamiento.series.first()
+        escrituras = {
+            'crear serie': lambda: SerieEjercicio.objects.create(
+                entrenamiento=entrenamiento, ejercicio_rutina=ejercicio_rutina, numero_serie=9,
+                peso_kg=10, repeticiones=10,
+            ),
+            'editar serie': lambda: SerieEjercicio.objects.filter(id=serie.id).first().save(),
+            'borrar serie': lambda: serie.delete(),
+            'crear sesión': lambda: Entrenamiento.objects.create(usuario=self.usuario, rutina=entrenamiento.rutina),
+            'borrar sesión': lambda: Entrenamiento.objects.filter(usuario=self.usuario).earliest('id').delete(),
+            'cambiar peso': lambda: Perfil.objects.get(usuario=self.usuario).save(),
+            'renombrar rutina': lambda: entrenamiento.rutina.save(),
+        }
+        for escritura, hacer in escrituras.items():
+            with self.subTest(escritura):
+                antes = self.obtener()
+                self.assertEqual(self.obtener(), antes)  # sin escrituras, de la caché
+                vecino = self.obtener(self.otro)
+                hacer()
+                self.assertNotEqual(self.obtener(), antes, 'tenía que recalcularse')
+                # La marca es por usuario: la caché del otro sigue valiendo
+                self.assertEqual(self.obtener(self.otro), vecino)
+
+    def test_la_marca_vuelve_a_cambiar_al_confirmar(self):
+        # Alguien que calcule a mitad de la transacción vería datos sin confirmar:
+        # lo que guarde con esa marca no tiene que sobrevivir al commit
+        entrenamiento = Entrenamiento.objects.filter(usuario=self.usuario).latest('id')
+        with self.captureOnCommitCallbacks(execute=True):
+            SerieEjercicio.objects.create(
+                entrenamiento=entrenamiento, ejercicio_rutina=entrenamiento.rutina.ejercicios.first(),
+                numero_serie=9, peso_kg=10, repeticiones=10,
+            )
+            en_medio = self.obtener()
+        self.assertEqual(self.obtener(), en_medio + 1)
+
+    def test_dashboard_cacheado_hasta_registrar(self):
+        self.client.force_login(self.usuario)
+        url = reverse('progreso_dashboard')
+        with CaptureQueriesContext(connection) as primera:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as segunda:
+            respuesta = self.client.get(url)
+        self.assertLess(len(segunda), len(primera))
+        total = respuesta.context['estadisticas']['total_series']
+
+        entrenamiento = Entrenamiento.objects.filter(usuario=self.usuario).latest('id')
+        SerieEjercicio.objects.create(
+            entrenamiento=entrenamiento, ejercicio_rutina=entrenamiento.rutina.ejercicios.first(),
+            numero_serie=9, peso_kg=10, repeticiones=10,
+        )
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.context['estadisticas']['total_series'], total + 1)
+
+
+class PeticionCondicionalTests(TestCase):
+    """ETag / Last-Modified: 304 mientras el usuario no escriba nada"""
+
+    @classmethod
+    def setUpTestData(cls):
+        ejercicios = Ejercicio.objects.bulk_create([
+            Ejercicio(nombre=f'Ejercicio {numero}', grupo_muscular='pecho') for numero in range(3)
+        ])
+        cls.usuario = sembrar_usuario('condicional', ejercicios, rutinas=1, ejercicios_por_rutina=2, sesiones=3)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+        self.url = reverse('historial_entrenamientos')
+        self.ejercicio_id = ResumenSesionEjercicio.objects.filter(usuario=self.usuario).values_list(
+            'ejercicio_id', flat=True).first()
+
+    def test_304_con_if_none_match_y_con_if_modified_since(self):
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('private', respuesta['Cache-Control'])
+        etag, fecha = respuesta['ETag'], respuesta['Last-Modified']
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=fecha).status_code, 304)
+        # El ETag depende de la URL: otra página del historial no vale
+        self.assertEqual(self.client.get(self.url, {'antes': '1_1'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Al escribir cambia la marca: la copia del navegador ya no vale
+        Entrenamiento.objects.filter(usuario=self.usuario).latest('id').save()
+        respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+
+    def test_otro_usuario_no_reutiliza_el_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.force_login(User.objects.create_user('curioso', password='x'))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_con_mensajes_pendientes_no_hay_304(self):
+        self.client.post(reverse('actualizar_peso'), {'peso_corporal': 81})
+        # El navegador revalida con la fecha de los datos de ahora
+        fecha = http_date(cache_progreso.marca_usuario(self.usuario.id) / 1e9)
+        respuesta = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=fecha)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertFalse(respuesta.has_header('ETag'))
+        self.assertFalse(respuesta.has_header('Last-Modified'))
+
+        # Ya mostrado el mensaje (la lista de rutinas los enseña), vuelve el 304
+        self.assertContains(self.client.get(reverse('lista_rutinas')), 'Peso actualizado')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=fecha).status_code, 304)
+
+
+    @override_settings(GYM_PROGRESO_HILOS=0)
+    def test_mensajes_pendientes_en_vistas_sincronas_y_async(self):
+        for nombre in ('progreso_dashboard', 'progreso_dashboard_async'):
+            with self.subTest(ruta=nombre):
+                self.client.post(reverse('actualizar_peso'), {'peso_corporal': 81})
+                respuesta = self.client.get(reverse(nombre))
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertFalse(respuesta.has_header('ETag'))
+                self.assertFalse(respuesta.has_header('Last-Modified'))
+
+                self.client.get(reverse('lista_rutinas'))  # muestra el mensaje
+                respuesta = self.client.get(reverse(nombre))
+                self.assertTrue(respuesta.has_header('ETag'))
+                self.assertTrue(respuesta.has_header('Last-Modified'))
+
+    @override_settings(GYM_PROGRESO_HILOS=0)
+    def test_vista_async_304(self):
+        url = reverse('progreso_dashboard_async')
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('private', respuesta['Cache-Control'])
+        etag, fecha = respuesta['ETag'], respuesta['Last-Modified']
+
+        respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual((respuesta['ETag'], respuesta['Last-Modified']), (etag, fecha))
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=fecha).status_code, 304)
+
+    @override_settings(GYM_PROGRESO_HILOS=0)
+    def test_vista_async_con_mensajes_pendientes(self):
+        self.client.post(reverse('actualizar_peso'), {'peso_corporal': 81})
+        fecha = http_date(cache_progreso.marca_usuario(self.usuario.id) / 1e9)
+        respuesta = self.client.get(reverse('progreso_ejercicio_async', args=[self.ejercicio_id]),
+                                    HTTP_IF_MODIFIED_SINCE=fecha)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertFalse(respuesta.has_header('ETag'))
+        self.assertFalse(respuesta.has_header('Last-Modified'))
+
+
+@override_settings(GYM_SQLITE_REINTENTOS=3, GYM_SQLITE_ESPERA_REINTENTO=0)
+class SQLiteTests(SimpleTestCase):
+    """PRAGMA de cada conexión y reintentos con la base de datos bloqueada"""
+
+    def vista(self, *errores):
+        """Vista envuelta que falla con `errores` (uno por llamada) y luego responde 'ok'"""
+        vista = mock.Mock(side_effect=[*errores, 'ok'])
+        return vista, sqlite.reintentar_si_bloqueada(vista)
+
+    def fuera_de_atomic(self, dentro=False):
+        return mock.patch.object(sqlite, 'connection', mock.Mock(in_atomic_block=dentro))
+
+    def test_reintenta_si_esta_bloqueada(self):
+        vista, envuelta = self.vista(OperationalError('database is locked'), OperationalError('database is locked'))
+        with self.fuera_de_atomic():
+            self.assertEqual(envuelta('peticion', 7), 'ok')
+        self.assertEqual(vista.call_args_list, [mock.call('peticion', 7)] * 3)
+
+    def test_se_rinde_tras_los_reintentos(self):
+        vista, envuelta = self.vista(*[OperationalError('database is locked')] * 4)
+        with self.fuera_de_atomic(), self.assertRaisesMessage(OperationalError, 'locked'):
+            envuelta('peticion')
+        self.assertEqual(vista.call_count, 4)
+
+    def test_otros_errores_no_se_reintentan(self):
+        vista, envuelta = self.vista(OperationalError('no such table: gym_rutina'))
+        with self.fuera_de_atomic(), self.assertRaisesMessage(OperationalError, 'no such table'):
+            envuelta('peticion')
+        self.assertEqual(vista.call_count, 1)
+
+    def test_dentro_de_un_atomic_de_fuera_no_se_reintenta(self):
+        vista, envuelta = self.vista(OperationalError('database is locked'))
+        with self.fuera_de_atomic(dentro=True), self.assertRaises(OperationalError):
+            envuelta('peticion')
+        self.assertEqual(vista.call_count, 1)
+
+    @override_settings(GYM_SQLITE_PRAGMAS={
+        'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'cache_size': -2048, 'temp_store': 'MEMORY',
+    })
+    def test_pragmas_en_cada_conexion_nueva(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            nueva = DatabaseWrapper(
+                {**connection.settings_dict, 'NAME': os.path.join(directorio, 'pragmas.sqlite3')}, alias='pragmas'
+            )
+            try:
+                with nueva.cursor() as cursor:
+                    valores = {}
+                    for nombre in ('journal_mode', 'synchronous', 'cache_size', 'temp_store'):
+                        cursor.execute(f'PRAGMA {nombre}')
+                        valores[nombre] = cursor.fetchone()[0]
+            finally:
+                nueva.close()
+        # synchronous NORMAL = 1, temp_store MEMORY = 2
+        self.assertEqual(valores, {'journal_mode': 'wal', 'synchronous': 1, 'cache_size': -2048, 'temp_store': 2})
+
+
+@override_settings(GYM_PROGRESO_HILOS=2)
+class ProgresoAsyncTests(TransactionTestCase):
+    """
+    Vistas async con el pool de hilos (en_paralelo con executor). Los hilos
+    del pool abren su propia conexión: TransactionTestCase para que vean
+    los datos, que un TestCase dejaría sin confirmar.
+    """
+
+    def setUp(self):
+        cache.clear()
+        ejercicios = Ejercicio.objects.bulk_create([
+            Ejercicio(nombre=f'Ejercicio {numero}', grupo_muscular='pecho') for numero in range(3)
+        ])
+        self.usuario = sembrar_usuario('asincrono', ejercicios, rutinas=1, ejercicios_por_rutina=3, sesiones=4)
+        self.ejercicio_id = ejercicios[0].id
+        self.async_client.force_login(self.usuario)
+        self.client.force_login(self.usuario)
+        # Lo que calcula la vista síncrona, para comparar
+        self.esperado = self.client.get(reverse('progreso_ejercicio', args=[self.ejercicio_id])).context
+        cache.clear()
+
+    async def test_datos_en_el_pool_iguales_que_la_vista_sincrona(self):
+        respuesta = await self.async_client.get(reverse('progreso_ejercicio_async', args=[self.ejercicio_id]))
+        self.assertEqual(respuesta.status_code, 200)
+        for nombre in ('historial', 'datos_grafico', 'resolucion_grafico', 'fuerza_relativa'):
+            self.assertEqual(respuesta.context[nombre], self.esperado[nombre], nombre)
+        self.assertIsNotNone(progreso_async._pool)
+
+        respuesta = await self.async_client.get(reverse('progreso_dashboard_async'))
+        self.assertEqual(respuesta.status_code, 200)
+        total = await EstadisticasUsuario.objects.filter(usuario=self.usuario).values_list(
+            'total_entrenamientos', flat=True).afirst()
+        self.assertEqual(respuesta.context['estadisticas']['total_entrenamientos'], total)
+
+    async def test_304(self):
+        url = reverse('progreso_dashboard_async')
+        respuesta = await self.async_client.get(url)
+        etag, fecha = respuesta['ETag'], respuesta['Last-Modified']
+        respuesta = await self.async_client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual((respuesta['ETag'], respuesta['Last-Modified']), (etag, fecha))
+        respuesta = await self.async_client.get(url, headers={'If-Modified-Since': fecha})
+        self.assertEqual(respuesta.status_code, 304)
+
+    async def test_con_mensajes_pendientes_no_hay_validadores(self):
+        await self.async_client.post(reverse('actualizar_peso'), {'peso_corporal': 81})
+        respuesta = await self.async_client.get(reverse('progreso_dashboard_async'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertFalse(respuesta.has_header('ETag'))
+        self.assertFalse(respuesta.has_header('Last-Modified'))
+
+    async def test_ejercicio_inexistente_no_calcula_ni_cachea(self):
+        with mock.patch.object(progreso_async, 'calcular_datos_ejercicio') as calcular:
+            respuesta = await self.async_client.get(reverse('progreso_ejercicio_async', args=[999999]))
+        self.assertEqual(respuesta.status_code, 404)
+        calcular.assert_not_called()
+        self.assertIsNone(await cache.aget(f'gym:ejercicio:999999:{self.usuario.id}'))
+
+class FuerzaTests(TestCase):
+    """1RM estimado: fórmulas, guardado con la serie y récord por e1rm"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('fuerza', password='x')
+        ejercicio = Ejercicio.objects.create(nombre='Sentadilla', grupo_muscular='piernas')
+        rutina = Rutina.objects.create(usuario=cls.usuario, nombre='Pierna')
+        cls.ejercicio_rutina = EjercicioRutina.objects.create(
+            rutina=rutina, ejercicio=ejercicio, orden=1, series=3, repeticiones='8'
+        )
+        cls.entrenamiento = Entrenamiento.objects.create(usuario=cls.usuario, rutina=rutina)
+
+    def serie(self, peso, repeticiones, rpe=None, numero_serie=1):
+        return SerieEjercicio.objects.create(
+            entrenamiento=self.entrenamiento, ejercicio_rutina=self.ejercicio_rutina,
+            numero_serie=numero_serie, peso_kg=peso, repeticiones=repeticiones, rpe=rpe,
+        )
+
+    def test_formulas(self):
+        self.assertEqual(estimar_1rm(105, 1), 105)
+        self.assertEqual(estimar_1rm(100, 8), 125.4)  # media de Epley (126.7) y Brzycki (124.1)
+        self.assertEqual(estimar_1rm(60, 15), 90.0)  # solo Epley
+        self.assertEqual(estimar_1rm(100, 8, rpe=8), 135.3)  # 8 reps + 2 en reserva = 73.9%
+        self.assertEqual(estimar_1rm(100, 8, rpe=4), 125.4)  # RPE poco fiable → fórmulas
+        self.assertIsNone(estimar_1rm(100, 0))
+        self.assertAlmostEqual(peso_para(135.3, 8, 8), 100, places=0)
+
+    def test_e1rm_se_guarda_con_la_serie(self):
+        serie = self.serie(100, 8, rpe=8)
+        self.assertEqual(SerieEjercicio.objects.get(id=serie.id).e1rm, 135.3)
+
+        serie.repeticiones = 5
+        serie.save(update_fields=['repeticiones'])
+        self.assertEqual(SerieEjercicio.objects.get(id=serie.id).e1rm, estimar_1rm(100, 5, rpe=8))
+
+    def test_record_por_e1rm(self):
+        self.serie(105, 1, rpe=10)
+        mejor = self.serie(100, 8, rpe=9, numero_serie=2)
+
+        records = {
+            record.repeticiones_minimas: record
+            for record in RecordPersonal.objects.filter(usuario=self.usuario)
+        }
+        self.assertEqual(records[0].peso_kg, 105)
+        self.assertEqual(records[RecordPersonal.RANGO_E1RM].serie_id, mejor.id)
+
+        mejor.delete()
+        record = RecordPersonal.objects.get(usuario=self.usuario, repeticiones_minimas=RecordPersonal.RANGO_E1RM)
+        self.assertEqual(record.e1rm, 105)
+
+    def test_comando_rellena_series_antiguas(self):
+        serie = self.serie(100, 8)
+        SerieEjercicio.objects.filter(id=serie.id).update(e1rm=None)
+        RecordPersonal.objects.filter(usuario=self.usuario).delete()
+
+        call_command('calcular_e1rm', usuario='fuerza', stdout=StringIO())
+
+        self.assertEqual(SerieEjercicio.objects.get(id=serie.id).e1rm, 125.4)
+        self.assertTrue(RecordPersonal.objects.filter(
+            usuario=self.usuario, repeticiones_minimas=RecordPersonal.RANGO_E1RM, e1rm=125.4
+        ).exists())
+
+
+class ProgresionTests(TestCase):
+    """Último rendimiento por ejercicio y sugerencia de doble progresión"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('progresion', password='x')
+        cls.ejercicio = Ejercicio.objects.create(nombre='Press banca', grupo_muscular='pecho')
+        rutina = Rutina.objects.create(usuario=cls.usuario, nombre='Empuje')
+        cls.ejercicio_rutina = EjercicioRutina.objects.create(
+            rutina=rutina, ejercicio=cls.ejercicio, orden=1, series=2, repeticiones='8-10'
+        )
+        cls.rutina = rutina
+
+    def sesion(self, dias_atras, series):
+        entrenamiento = Entrenamiento.objects.create(
+            usuario=self.usuario, rutina=self.rutina, fecha=timezone.now() - timedelta(days=dias_atras)
+        )
+        for numero_serie, (peso, repeticiones, rpe) in enumerate(series, start=1):
+            SerieEjercicio.objects.create(
+                entrenamiento=entrenamiento, ejercicio_rutina=self.ejercicio_rutina,
+                numero_serie=numero_serie, peso_kg=peso, repeticiones=repeticiones, rpe=rpe,
+            )
+        return entrenamiento
+
+    def ultimo(self):
+        return UltimoRendimiento.objects.get(usuario=self.usuario, ejercicio=self.ejercicio)
+
+    def test_doble_progresion(self):
+        def serie(peso, reps, rpe):
+            return {'peso': peso, 'reps': reps, 'rpe': rpe, 'e1rm': estimar_1rm(peso, reps, rpe)}
+
+        arriba = progresion.sugerir([serie(80, 10, 8), serie(80, 10, 9)], (8, 10))
+        self.assertEqual((arriba['peso'], arriba['repeticiones']), (82.5, 8))
+
+        en_medio = progresion.sugerir([serie(80, 9, 8), serie(80, 8, 9)], (8, 10))
+        self.assertEqual((en_medio['peso'], en_medio['repeticiones']), (80, 9))
+
+        abajo = progresion.sugerir([serie(80, 6, 10)], (8, 10))
+        self.assertLess(abajo['peso'], 80)
+        self.assertEqual(abajo['repeticiones'], 8)
+
+        self.assertEqual(progresion.rango_repeticiones('12'), (12, 12))
+        self.assertEqual(progresion.rango_repeticiones('al fallo'), progresion.RANGO_POR_DEFECTO)
+
+    def test_ultimo_rendimiento_sigue_a_la_sesion_mas_reciente(self):
+        anterior = self.sesion(7, [(80, 10, 8), (80, 10, 8)])
+        reciente = self.sesion(1, [(82.5, 8, 8)])
+        self.assertEqual(self.ultimo().entrenamiento_id, reciente.id)
+
+        # Editar una sesión antigua no cambia el último rendimiento
+        SerieEjercicio.objects.filter(entrenamiento=anterior).first().save()
+        self.assertEqual(self.ultimo().series, [{'peso': 82.5, 'reps': 8, 'rpe': 8, 'e1rm': estimar_1rm(82.5, 8, 8)}])
+
+        reciente.delete()
+        self.assertEqual(self.ultimo().entrenamiento_id, anterior.id)
+        self.assertEqual(len(self.ultimo().series), 2)
+
+        agregados.reconstruir_ultimos_rendimientos(self.usuario)
+        self.assertEqual(self.ultimo().entrenamiento_id, anterior.id)
+
+    def test_sugerencia_en_registrar_serie(self):
+        self.sesion(7, [(80, 10, 8), (80, 10, 8)])
+        hoy = Entrenamiento.objects.create(usuario=self.usuario, rutina=self.rutina)
+        self.client.force_login(self.usuario)
+
+        respuesta = self.client.get(reverse('registrar_serie', kwargs={'entrenamiento_id': hoy.id}))
+        self.assertEqual(respuesta.context['sugerencia']['peso'], 82.5)
+
+
+class ExportarTests(TestCase):
+    """Exportación del historial en streaming"""
+
+    @classmethod
+    def setUpTestData(cls):
+        ejercicios = Ejercicio.objects.bulk_create([
+            Ejercicio(nombre=f'Ejercicio {numero}', grupo_muscular='pecho') for numero in range(3)
+        ])
+        cls.usuario = sembrar_usuario('exporta', ejercicios, rutinas=1, ejercicios_por_rutina=3, sesiones=4)
+        # Una sesión sin series también forma parte del historial
+        Entrenamiento.objects.create(usuario=cls.usuario, rutina=Rutina.objects.get(usuario=cls.usuario))
+
+    def descargar(self, formato):
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get(reverse('exportar_historial'), {'formato': formato})
+        self.assertTrue(respuesta.streaming)
+        self.assertIn('attachment', respuesta['Content-Disposition'])
+        return b''.join(respuesta.streaming_content).decode('utf-8')
+
+    def test_csv(self):
+        filas = list(csv.DictReader(StringIO(self.descargar('csv'))))
+        series = SerieEjercicio.objects.filter(entrenamiento__usuario=self.usuario).count()
+        self.assertEqual(len(filas), series + 1)
+        self.assertEqual({fila['peso_corporal'] for fila in filas}, {'80.0'})
+        self.assertEqual(filas[-1]['numero_serie'], '')
+
+    def test_jsonl_igual_que_el_comando(self):
+        descarga = self.descargar('jsonl')
+        salida = StringIO()
+        call_command('exportar_historial', 'exporta', formato='jsonl', lote=7, stdout=salida)
+        self.assertEqual(descarga, salida.getvalue())
+        primera = json.loads(descarga.splitlines()[0])
+        self.assertEqual(primera['numero_serie'], 1)
+
+    def test_formato_desconocido(self):
+        self.client.force_login(self.usuario)
+        self.assertEqual(self.client.get(reverse('exportar_historial'), {'formato': 'xml'}).status_code, 400)
+
+
+class ImportacionTests(TestCase):
+    """Importación de historial desde CSV"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ejercicio.objects.bulk_create([
+            Ejercicio(nombre='Press Banca', grupo_muscular='pecho'),
+            Ejercicio(nombre='Sentadilla', grupo_muscular='piernas'),
+        ])
+        cls.origen = sembrar_usuario('origen', list(Ejercicio.objects.all()), rutinas=2, ejercicios_por_rutina=2, sesiones=6)
+        cls.usuario = User.objects.create_user('destino', password='clave-de-prueba')
+
+    def test_importa_la_exportacion_propia(self):
+        exportado = ''.join(exportar(self.origen, 'csv'))
+        importacion = importar.importar_csv(self.usuario, StringIO(exportado), 'propio.csv', lote=7)
+
+        origen = SerieEjercicio.objects.filter(entrenamiento__usuario=self.origen)
+        destino = SerieEjercicio.objects.filter(entrenamiento__usuario=self.usuario)
+        self.assertEqual(importacion.estado, 'completada')
+        self.assertEqual(importacion.series, origen.count())
+        self.assertEqual(
+            sorted(destino.values_list('peso_kg', 'repeticiones', 'rpe', 'e1rm')),
+            sorted(origen.values_list('peso_kg', 'repeticiones', 'rpe', 'e1rm')),
+        )
+        # Los agregados se reconstruyen al final
+        self.assertEqual(
+            RecordPersonal.objects.filter(usuario=self.usuario).count(),
+            RecordPersonal.objects.filter(usuario=self.origen).count(),
+        )
+
+    def test_formato_strong_con_alias_y_desconocidos(self):
+        texto = (
+            'Date,Workout Name,Exercise Name,Set Order,Weight,Reps,RPE\n'
+            '2024-03-01 18:00:00,Push,Bench Press (Barbell),1,80,8,8\n'
+            '2024-03-01 18:00:00,Push,Bench Press (Barbell),2,80,7,9\n'
+            '2024-03-01 18:00:00,Push,Cable Crossover,1,20,12,\n'
+            '2024-03-03 18:00:00,Legs,Squat (Barbell),1,100,5,\n'
+        )
+        importacion = importar.importar_csv(self.usuario, StringIO(texto), 'strong.csv')
+
+        self.assertEqual((importacion.entrenamientos, importacion.series), (2, 3))
+        self.assertEqual(importacion.ejercicios_desconocidos, {'Cable Crossover': 1})
+        self.assertEqual(importacion.filas_omitidas, 1)
+        self.assertEqual(
+            set(Rutina.objects.filter(usuario=self.usuario).values_list('nombre', flat=True)), {'Push', 'Legs'}
+        )
+
+    def test_fallo_a_medias_no_deja_nada(self):
+        exportado = ''.join(exportar(self.origen, 'csv'))
+        guardar = importar._Importador.guardar
+        lotes = []
+
+        def guardar_y_fallar(importador, filas):
+            lotes.append(filas)
+            if len(lotes) == 2:
+                raise RuntimeError('disco lleno')
+            guardar(importador, filas)
+
+        importar._Importador.guardar = guardar_y_fallar
+        try:
+            with self.assertRaises(RuntimeError):
+                importar.importar_csv(self.usuario, StringIO(exportado), 'roto.csv', lote=5)
+        finally:
+            importar._Importador.guardar = guardar
+
+        importacion = Importacion.objects.get(usuario=self.usuario)
+        self.assertEqual(importacion.estado, 'fallida')
+        self.assertEqual(importacion.error, 'disco lleno')
+        self.assertFalse(Entrenamiento.objects.filter(usuario=self.usuario).exists())
+        self.assertFalse(Rutina.objects.filter(usuario=self.usuario).exists())
+
+    def test_fallo_al_reconstruir_los_agregados(self):
+        exportado = ''.join(exportar(self.origen, 'csv'))
+        reconstruir_records = agregados.reconstruir_records
+        llamadas = []
+
+        def fallar_la_primera_vez(usuario=None):
+            llamadas.append(usuario)
+            if len(llamadas) == 1:
+                raise RuntimeError('sin memoria')
+            return reconstruir_records(usuario)
+
+        agregados.reconstruir_records = fallar_la_primera_vez
+        try:
+            with self.assertRaises(RuntimeError):
+                importar.importar_csv(self.usuario, StringIO(exportado), 'grande.csv')
+        finally:
+            agregados.reconstruir_records = reconstruir_records
+
+        self.assertEqual(Importacion.objects.get(usuario=self.usuario).estado, 'fallida')
+        self.assertFalse(Entrenamiento.objects.filter(usuario=self.usuario).exists())
+        # Los resúmenes ya se habían reconstruido con lo importado: se vuelven a calcular sin ello
+        self.assertFalse(ResumenSesionEjercicio.objects.filter(usuario=self.usuario).exists())
+        self.assertFalse(EstadisticasUsuario.objects.filter(usuario=self.usuario, total_series__gt=0).exists())
+
+    def test_importacion_interrumpida_se_deshace(self):
+        # Un worker que muere después de guardar un lote no llega al except
+        interrumpida = Importacion.objects.create(usuario=self.usuario, nombre_fichero='cortada.csv')
+        importador = importar._Importador(interrumpida)
+        columnas = importar._columnas(['fecha', 'ejercicio', 'peso_kg', 'repeticiones'])
+        importador.guardar([importador.leer(
+            {'fecha': '2024-01-01 10:00', 'ejercicio': 'Sentadilla', 'peso_kg': '100', 'repeticiones': '5'}, columnas
+        )])
+        self.assertTrue(Entrenamiento.objects.filter(usuario=self.usuario).exists())
+
+        # Mientras pueda seguir viva no se toca
+        self.assertEqual(importar.limpiar_interrumpidas(), 0)
+        Importacion.objects.filter(id=interrumpida.id).update(
+            actualizado=timezone.now() - importar.INTERRUMPIDA_TRAS - timedelta(minutes=1)
+        )
+        salida = StringIO()
+        call_command('limpiar_importaciones', stdout=salida)
+        self.assertIn('1 importaciones interrumpidas', salida.getvalue())
+
+        interrumpida.refresh_from_db()
+        self.assertEqual(interrumpida.estado, 'fallida')
+        self.assertFalse(Entrenamiento.objects.filter(usuario=self.usuario).exists())
+        self.assertFalse(Rutina.objects.filter(usuario=self.usuario).exists())
+
+    def test_la_siguiente_importacion_limpia_las_interrumpidas(self):
+        interrumpida = Importacion.objects.create(usuario=self.usuario, nombre_fichero='cortada.csv')
+        Importacion.objects.filter(id=interrumpida.id).update(actualizado=timezone.now() - timedelta(days=1))
+        importar.importar_csv(self.usuario, StringIO(
+            'fecha,ejercicio,peso_kg,repeticiones\n2024-01-01 10:00,Sentadilla,100,5\n'
+        ))
+        interrumpida.refresh_from_db()
+        self.assertEqual(interrumpida.estado, 'fallida')
+
+    def test_faltan_columnas(self):
+        with self.assertRaises(importar.ErrorImportacion):
+            importar.importar_csv(self.usuario, StringIO('fecha,ejercicio\n2024-01-01,Sentadilla\n'))
+        self.assertEqual(Importacion.objects.get(usuario=self.usuario).estado, 'fallida')
+
+    def test_subida_desde_la_web(self):
+        self.client.force_login(self.usuario)
+        fichero = SimpleUploadedFile(
+            'hevy.csv',
+            '\ufefftitle,start_time,exercise_title,set_index,weight_kg,reps\n'
+            'Pierna,2024-05-02 07:30,Sentadilla,0,90,6\n'.encode('utf-8'),
+        )
+        respuesta = self.client.post(reverse('importar_historial'), {'fichero': fichero}, follow=True)
+        self.assertContains(respuesta, 'Importados 1 entrenamientos y 1 series')
+
+
+class SerieTemporalTests(TestCase):
+    """Series del progreso de un ejercicio agrupadas por la base de datos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('cinco_anios', password='clave-de-prueba')
+        cls.ejercicio = Ejercicio.objects.create(nombre='Sentadilla', grupo_muscular='piernas')
+        rutina = Rutina.objects.create(usuario=cls.usuario, nombre='Pierna')
+        # Cinco años a tres sesiones por semana, solo con resúmenes
+        inicio = timezone.make_aware(timezone.datetime(2020, 1, 6, 18))
+        fechas = [inicio + timedelta(days=7 * semana + dia) for semana in range(260) for dia in (0, 2, 4)]
+        entrenamientos = Entrenamiento.objects.bulk_create([
+            Entrenamiento(usuario=cls.usuario, rutina=rutina, fecha=fecha) for fecha in fechas
+        ])
+        ResumenSesionEjercicio.objects.bulk_create([
+            ResumenSesionEjercicio(
+                usuario=cls.usuario, entrenamiento=entrenamiento, ejercicio=cls.ejercicio, fecha=entrenamiento.fecha,
+                peso_maximo=60 + numero // 3, series_completadas=3, volumen_total=1000, e1rm_maximo=80 + numero // 3,
+            )
+            for numero, entrenamiento in enumerate(entrenamientos)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def serie(self, **parametros):
+        respuesta = self.client.get(reverse('api_serie_ejercicio', args=[self.ejercicio.id]), parametros)
+        return respuesta.status_code, respuesta.json()
+
+    def test_cinco_anios_por_meses(self):
+        # Sesión, usuario, ejercicio, primera fecha y la agrupación por meses
+        with self.assertNumQueries(5):
+            estado, datos = self.serie()
+        self.assertEqual(estado, 200)
+        self.assertEqual(datos['resolucion'], 'mes')
+        self.assertTrue(datos['completa'])
+        self.assertEqual(len(datos['puntos']), 60)
+        enero = datos['puntos'][0]
+        self.assertEqual(enero['inicio'], '2020-01-01')
+        self.assertEqual((enero['sesiones'], enero['series'], enero['volumen']), (12, 36, 12000))
+        self.assertEqual(datos['puntos'][-1]['peso_maximo'], 60 + 259)
+
+    def test_semanas_en_un_rango(self):
+        estado, datos = self.serie(desde='2021-01-01', hasta='2021-12-31', resolucion='semana')
+        self.assertEqual(estado, 200)
+        self.assertEqual(datos['puntos'][0]['inicio'], '2020-12-28')  # la semana que contiene el 1 de enero
+        self.assertTrue(all(punto['inicio'] < '2022' for punto in datos['puntos']))
+        sesiones = Entrenamiento.objects.filter(usuario=self.usuario, fecha__year=2021).count()
+        self.assertEqual(sum(punto['sesiones'] for punto in datos['puntos']), sesiones)
+
+    def test_limite_de_puntos(self):
+        estado, datos = self.serie(resolucion='sesion', puntos=10)
+        self.assertFalse(datos['completa'])
+        self.assertEqual(len(datos['puntos']), 10)
+        self.assertEqual(datos['puntos'][-1]['e1rm_maximo'], 80 + 259)
+
+    def test_grafico_de_la_pagina(self):
+        # El gráfico de progreso_ejercicio cubre los cinco años, no las últimas sesiones
+        respuesta = self.client.get(reverse('progreso_ejercicio', args=[self.ejercicio.id]))
+        self.assertEqual(respuesta.context['resolucion_grafico'], 'mes')
+        grafico = respuesta.context['datos_grafico']
+        self.assertEqual(len(grafico), 60)
+        self.assertEqual(grafico[0]['fecha'], '01/01/2020')
+        self.assertEqual(grafico[-1]['peso_maximo'], 60 + 259)
+
+    def test_elegir_resolucion(self):
+        hoy = timezone.localdate()
+        self.assertEqual(series_temporales.elegir_resolucion(hoy - timedelta(days=60), hoy, 120), 'sesion')
+        self.assertEqual(series_temporales.elegir_resolucion(hoy - timedelta(days=700), hoy, 120), 'semana')
+        self.assertEqual(series_temporales.elegir_resolucion(hoy - timedelta(days=1825), hoy, 120), 'mes')
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.serie(resolucion='anio')[0], 400)
+        self.assertEqual(self.serie(desde='ayer')[0], 400)
+        self.assertEqual(self.serie(puntos=0)[0], 400)
+        self.assertEqual(self.serie(desde='2022-01-01', hasta='2021-01-01')[0], 400)
+
+
+class GruposMuscularesTests(TestCase):
+    """Series y volumen semanal por grupo muscular"""
+
+    @classmethod
+    def setUpTestData(cls):
+        ejercicios = Ejercicio.objects.bulk_create([
+            Ejercicio(nombre=f'Ejercicio {numero}', grupo_muscular=grupo)
+            for numero, grupo in enumerate(['pecho', 'espalda', 'piernas'])
+        ])
+        cls.usuario = sembrar_usuario('equilibrio', ejercicios, rutinas=2, ejercicios_por_rutina=2, sesiones=20)
+
+    def test_una_consulta_y_totales_como_las_series(self):
+        with self.assertNumQueries(1):
+            datos = grupos_musculares.volumen_por_grupo(self.usuario.id, semanas=52)
+        self.assertEqual(len(datos['semanas']), 52)
+
+        # Todas las sesiones del usuario caen en las últimas 52 semanas
+        series = SerieEjercicio.objects.filter(entrenamiento__usuario=self.usuario)
+        for grupo in ['pecho', 'espalda', 'piernas']:
+            del_grupo = series.filter(ejercicio_rutina__ejercicio__grupo_muscular=grupo)
+            total = datos['totales'].get(grupo, {'series': 0})
+            self.assertEqual(total['series'], del_grupo.count())
+            self.assertEqual(sum(semana['grupos'].get(grupo, {'series': 0})['series'] for semana in datos['semanas']),
+                             del_grupo.count())
+
+    def test_semanas_vacias_con_ceros(self):
+        datos = grupos_musculares.volumen_por_grupo(self.usuario.id, semanas=104)
+        # 20 sesiones cada 2 días: hace dos años no había nada
+        primera = datos['semanas'][0]
+        self.assertEqual(set(primera['grupos']), set(datos['grupos']))
+        self.assertTrue(all(celda['series'] == 0 for celda in primera['grupos'].values()))
+        self.assertEqual(datos['semanas'][-1]['inicio'], (
+            timezone.localdate() - timedelta(days=timezone.localdate().weekday())
+        ).isoformat())
+
+    def test_pagina_y_json(self):
+        self.client.force_login(self.usuario)
+        self.assertContains(self.client.get(reverse('progreso_grupos')), 'Series por semana')
+        respuesta = self.client.get(reverse('api_volumen_grupos'), {'semanas': 8})
+        self.assertEqual(len(respuesta.json()['semanas']), 8)
+        self.assertEqual(self.client.get(reverse('api_volumen_grupos'), {'semanas': 0}).status_code, 400)
+
+
+    def test_la_cache_cambia_de_semana(self):
+        self.client.force_login(self.usuario)
+        cache.clear()
+        url = reverse('api_volumen_grupos')
+        hoy = timezone.localdate()
+        self.assertEqual(self.client.get(url, {'semanas': 4}).json()['semanas'][-1]['inicio'],
+                         (hoy - timedelta(days=hoy.weekday())).isoformat())
+
+        # Una semana después, sin que el usuario escriba nada
+        with mock.patch.object(timezone, 'localdate', return_value=hoy + timedelta(weeks=1)):
+            semanas = self.client.get(url, {'semanas': 4}).json()['semanas']
+        self.assertEqual(semanas[-1]['inicio'], (hoy + timedelta(days=7 - hoy.weekday())).isoformat())
+
+class RankingFuerzaTests(TestCase):
+    """Puestos guardados que se mueven de uno en uno"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ejercicio = Ejercicio.objects.create(nombre='Peso Muerto', grupo_muscular='espalda')
+        azar = random.Random(3)
+        cls.usuarios = []
+        for numero in range(12):
+            usuario = User.objects.create_user(f'atleta{numero}')
+            Perfil.objects.create(usuario=usuario, peso_corporal=azar.choice([58, 65, 75, 82, 95, 120]))
+            cls.usuarios.append(usuario)
+
+    def poner_record(self, usuario, e1rm):
+        """Cambia el récord de 1RM como lo haría agregados.actualizar_records"""
+        if e1rm is None:
+            RecordPersonal.objects.filter(usuario=usuario, ejercicio=self.ejercicio).delete()
+        else:
+            RecordPersonal.objects.update_or_create(
+                usuario=usuario, ejercicio=self.ejercicio, repeticiones_minimas=RecordPersonal.RANGO_E1RM,
+                defaults={'peso_kg': e1rm, 'repeticiones': 1, 'e1rm': e1rm, 'fecha': timezone.now()},
+            )
+        agregados.record_e1rm_cambiado(usuario.id, self.ejercicio.id, e1rm)
+
+    def puestos(self):
+        return sorted(RankingFuerza.objects.values_list('usuario_id', 'categoria', 'posicion', 'posicion_categoria'))
+
+    def assertIgualQueReconstruir(self):
+        incremental = self.puestos()
+        agregados.reconstruir_rankings()
+        self.assertEqual(incremental, self.puestos())
+
+    def test_movimientos_incrementales(self):
+        azar = random.Random(7)
+        for _ in range(60):
+            usuario = azar.choice(self.usuarios)
+            e1rm = azar.choice([None, 100, 120, 120, 140, 160, 180, 200])
+            self.poner_record(usuario, e1rm)
+        self.assertIgualQueReconstruir()
+
+        # Cambios de peso: de categoría y fuera del ranking
+        for usuario in self.usuarios[:4]:
+            usuario.perfil.peso_corporal = 88
+            usuario.perfil.save()
+        self.usuarios[4].perfil.delete()
+        self.assertIgualQueReconstruir()
+
+        posiciones = sorted(RankingFuerza.objects.values_list('posicion', flat=True))
+        self.assertEqual(posiciones, list(range(1, len(posiciones) + 1)))
+
+    def test_puesto_desde_las_series(self):
+        usuario = sembrar_usuario('escalador', [self.ejercicio], rutinas=1, ejercicios_por_rutina=1, sesiones=2)
+        fila = RankingFuerza.objects.get(usuario=usuario, ejercicio=self.ejercicio)
+        self.assertEqual((fila.posicion, fila.categoria), (1, '80-90'))
+
+        self.poner_record(self.usuarios[0], 200)
+        self.assertEqual(RankingFuerza.objects.get(usuario=self.usuarios[0]).posicion, 1)
+
+        # Un PR de 1RM lo vuelve a colocar; registrarlo pasa por las señales
+        en_curso = Entrenamiento.objects.filter(usuario=usuario).latest('id')
+        SerieEjercicio.objects.create(
+            entrenamiento=en_curso, ejercicio_rutina=en_curso.rutina.ejercicios.get(),
+            numero_serie=9, peso_kg=400, repeticiones=5, rpe=8,
+        )
+        fila.refresh_from_db()
+        self.assertEqual(fila.posicion, 1)
+        self.assertEqual(RankingFuerza.objects.get(usuario=self.usuarios[0]).posicion, 2)
+        self.assertIgualQueReconstruir()
+
+    def test_top_y_mi_puesto(self):
+        for numero, usuario in enumerate(self.usuarios):
+            self.poner_record(usuario, 100 + numero * 10)
+        self.client.force_login(self.usuarios[0])
+        url = reverse('api_ranking_ejercicio', args=[self.ejercicio.id])
+        with self.assertNumQueries(4):
+            datos = self.client.get(url).json()
+        self.assertEqual([fila['posicion'] for fila in datos['top']], list(range(1, 13)))
+        self.assertEqual(datos['mio']['usuario'], 'atleta0')
+        self.assertContains(self.client.get(reverse('ranking_ejercicio', args=[self.ejercicio.id])), 'atleta11')
+
+
+class MetricasTests(TestCase):
+    """Middleware de métricas y /metrics"""
+
+    @classmethod
+    def setUpTestData(cls):
+        ejercicios = Ejercicio.objects.bulk_create([
+            Ejercicio(nombre=f'Ejercicio {numero}', grupo_muscular='pecho') for numero in range(3)
+        ])
+        cls.usuario = sembrar_usuario('medido', ejercicios, rutinas=1, ejercicios_por_rutina=3, sesiones=3)
+        # /metrics sin token solo responde a staff
+        User.objects.filter(id=cls.usuario.id).update(is_staff=True)
+        cls.usuario.is_staff = True
+        cls.normal = User.objects.create_user('sin_permisos', password='x')
+
+    def setUp(self):
+        metricas.reiniciar()
+        self.client.force_login(self.usuario)
+
+    @override_settings(GYM_METRICAS_MUESTREO=1)
+    def test_acumula_por_vista(self):
+        self.client.get(reverse('historial_entrenamientos'))
+        self.client.get(reverse('historial_entrenamientos'))
+        self.client.get('/no-existe/')
+
+        texto = self.client.get(reverse('metricas')).content.decode()
+        etiquetas = 'vista="historial_entrenamientos",metodo="GET"'
+        self.assertIn(f'gym_http_duracion_segundos_count{{{etiquetas}}} 2', texto)
+        self.assertIn(f'gym_http_duracion_segundos_bucket{{{etiquetas},le="+Inf"}} 2', texto)
+        # Sesión, usuario y página de entrenamientos en cada petición
+        self.assertIn(f'gym_sql_consultas_total{{{etiquetas}}} 6', texto)
+        self.assertIn('gym_http_respuestas_total{vista="sin_ruta",metodo="GET",estado="4xx"} 1', texto)
+
+    def test_sin_muestreo_no_mide(self):
+        self.client.get(reverse('historial_entrenamientos'))
+        self.assertNotIn('historial_entrenamientos', self.client.get(reverse('metricas')).content.decode())
+
+    @override_settings(GYM_METRICAS_MUESTREO=1, GYM_METRICAS_LENTAS_MS=0.001)
+    def test_log_de_peticiones_lentas(self):
+        with self.assertLogs('gym.metricas', 'WARNING') as log:
+            self.client.get(reverse('progreso_dashboard'))
+        self.assertIn('progreso_dashboard', log.output[0])
+        self.assertIn('SELECT', log.output[0])
+
+    @override_settings(GYM_METRICAS_TOKEN='secreto')
+    def test_token(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 403)
+        respuesta = self.client.get(reverse('metricas'), HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_sin_token_solo_staff(self):
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 200)
+        self.client.force_login(self.normal)
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metricas'), HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+
+
+class PerfiladoTests(TestCase):
+    """Perfilado bajo demanda (solo staff)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        ejercicios = Ejercicio.objects.bulk_create([
+            Ejercicio(nombre=f'Ejercicio {numero}', grupo_muscular='pecho') for numero in range(3)
+        ])
+        cls.usuario = sembrar_usuario('perfilado', ejercicios, rutinas=1, ejercicios_por_rutina=3, sesiones=3)
+        cls.staff = User.objects.create_user('jefe', password='x', is_staff=True)
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        ajustes = override_settings(GYM_PERFILADO=True, GYM_PERFILADO_DIR=self.directorio.name, GYM_PERFILADO_MAXIMO=2)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def test_staff_con_cabecera_guarda_perfil_y_sql(self):
+        self.client.force_login(self.staff)
+        respuesta = self.client.get(reverse('historial_entrenamientos'), HTTP_X_PERFILAR='1')
+
+        perfil = PerfilPeticion.objects.get(id=respuesta['X-Perfil-Id'])
+        self.assertEqual(perfil.vista, 'historial_entrenamientos')
+        self.assertEqual(perfil.estado, 200)
+        self.assertGreater(perfil.consultas, 0)
+        self.assertIn('cumulative', perfil.resumen)
+        self.assertIn('plan:', perfil.sql)
+        self.assertTrue(os.path.exists(perfil.fichero))
+        pstats.Stats(perfil.fichero)  # el .prof se puede abrir
+        with open(perfil.fichero.replace('.prof', '.sql.txt'), encoding='utf-8') as fichero:
+            self.assertEqual(fichero.read(), perfil.sql)
+
+    def test_sin_staff_o_sin_pedirlo_no_perfila(self):
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get(reverse('progreso_dashboard') + '?perfilar=1')
+        self.assertNotIn('X-Perfil-Id', respuesta)
+
+        self.client.force_login(self.staff)
+        self.client.get(reverse('progreso_dashboard'))
+        self.assertFalse(PerfilPeticion.objects.exists())
+        self.assertEqual(os.listdir(self.directorio.name), [])
+
+    def test_conserva_solo_los_ultimos(self):
+        self.client.force_login(self.staff)
+        for _ in range(3):
+            self.client.get(reverse('historial_entrenamientos') + '?perfilar=1')
+        self.assertEqual(PerfilPeticion.objects.count(), 2)
+        self.assertEqual(len(os.listdir(self.directorio.name)), 4)
+
+
+class CatalogoTests(TestCase):
+    """Catálogo de ejercicios en memoria, búsqueda y formulario de rutina"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ejercicio.objects.bulk_create([
+            Ejercicio(nombre='Press Banca', grupo_muscular='pecho'),
+            Ejercicio(nombre='Press Militar', grupo_muscular='hombros'),
+            Ejercicio(nombre='Aperturas con Mancuernas', grupo_muscular='pecho'),
+            Ejercicio(nombre='Sentadilla Búlgara', grupo_muscular='piernas'),
+            Ejercicio(nombre='Sentadilla', grupo_muscular='piernas'),
+        ] + [Ejercicio(nombre=f'Variante {numero}', grupo_muscular='core') for numero in range(200)])
+        cls.usuario = User.objects.create_user('catalogo', password='x')
+        cls.rutina = Rutina.objects.create(usuario=cls.usuario, nombre='Torso')
+
+    def setUp(self):
+        cache.clear()  # bulk_create no cambia la versión del catálogo
+        self.client.force_login(self.usuario)
+
+    def buscar(self, **parametros):
+        respuesta = self.client.get(reverse('api_buscar_ejercicios'), parametros)
+        return [ejercicio['nombre'] for ejercicio in respuesta.json()['resultados']]
+
+    def test_busqueda_por_prefijo(self):
+        self.assertEqual(self.buscar(q='pre'), ['Press Banca', 'Press Militar'])
+        self.assertEqual(self.buscar(q='ban pre'), ['Press Banca'])
+        self.assertEqual(self.buscar(q='pre', grupo='pecho'), ['Press Banca'])
+        # Sin tildes, y primero lo que empieza por el texto
+        self.assertEqual(self.buscar(q='bulgara'), ['Sentadilla Búlgara'])
+        self.assertEqual(self.buscar(q='sent'), ['Sentadilla', 'Sentadilla Búlgara'])
+        self.assertEqual(self.buscar(q='man'), ['Aperturas con Mancuernas'])
+        self.assertEqual(len(self.buscar(grupo='core', limite=5)), 5)
+
+        respuesta = self.client.get(reverse('api_buscar_ejercicios'), {'grupo': 'gluteos'})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_catalogo_en_memoria_y_se_invalida_al_escribir(self):
+        catalogo.obtener()
+        with self.assertNumQueries(0):
+            catalogo.obtener().buscar('press')
+
+        ejercicio = Ejercicio.objects.create(nombre='Press Inclinado', grupo_muscular='pecho')
+        self.assertIn('Press Inclinado', self.buscar(q='press incl'))
+        ejercicio.nombre = 'Press Declinado'
+        ejercicio.save()
+        self.assertEqual(self.buscar(q='press incl'), [])
+        ejercicio.delete()
+        self.assertEqual(self.buscar(q='press decl'), [])
+
+    def test_formulario_no_incluye_el_catalogo(self):
+        url = reverse('agregar_ejercicio_rutina', kwargs={'rutina_id': self.rutina.id})
+        respuesta = self.client.get(url)
+        self.assertContains(respuesta, reverse('api_buscar_ejercicios'))
+        self.assertNotContains(respuesta, 'Variante')
+
+        banca = Ejercicio.objects.get(nombre='Press Banca')
+        self.client.post(url, {'ejercicio': banca.id, 'series': 4, 'repeticiones': '8-12', 'descanso': 2, 'orden': 0})
+        self.assertTrue(EjercicioRutina.objects.filter(rutina=self.rutina, ejercicio=banca).exists())
+
+        # Si el formulario vuelve con errores, el ejercicio elegido sigue puesto
+        respuesta = self.client.post(url, {'ejercicio': banca.id, 'series': 40})
+        self.assertContains(respuesta, 'value="Press Banca"')
+
+
+class ArchivoTests(TestCase):
+    """Sesiones antiguas empaquetadas en SesionArchivada y lectura transparente"""
+
+    @classmethod
+    def setUpTestData(cls):
+        ejercicios = Ejercicio.objects.bulk_create([
+            Ejercicio(nombre=f'Ejercicio {numero}', grupo_muscular='pecho') for numero in range(4)
+        ])
+        # Una sesión cada 2 días: con 60 días quedan archivadas la mitad
+        cls.usuario = sembrar_usuario('veterano', ejercicios, rutinas=2, ejercicios_por_rutina=4, sesiones=60)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def foto(self):
+        """Todo lo que se lee de las series: agregados, exportación, sincronización e historial"""
+        return {
+            'resumenes': list(ResumenSesionEjercicio.objects.filter(usuario=self.usuario).order_by(
+                'entrenamiento_id', 'ejercicio_id').values_list(
+                'entrenamiento_id', 'ejercicio_id', 'peso_maximo', 'reps_totales', 'series_completadas',
+                'volumen_total', 'e1rm_maximo')),
+            'records': list(RecordPersonal.objects.filter(usuario=self.usuario).order_by(
+                'ejercicio_id', 'repeticiones_minimas').values_list(
+                'ejercicio_id', 'repeticiones_minimas', 'peso_kg', 'repeticiones', 'e1rm', 'fecha')),
+            'ultimos': list(UltimoRendimiento.objects.filter(usuario=self.usuario).order_by(
+                'ejercicio_id').values_list('ejercicio_id', 'entrenamiento_id', 'series')),
+            'estadisticas': list(EstadisticasUsuario.objects.filter(usuario=self.usuario).values_list(
+                'total_entrenamientos', 'total_series', 'volumen_total', 'ejercicio_frecuente_id')),
+            'exportacion': list(filas_historial(self.usuario)),
+            'sync': self.client.get(reverse('api_sync')).json()['series'],
+            'historial': self.client.get(reverse('historial_entrenamientos')).content,
+        }
+
+    def test_archivar_y_desarchivar_no_cambia_nada_visible(self):
+        antes = self.foto()
+        filas_antes = list(SerieEjercicio.objects.order_by('id').values())
+        records_antes = list(RecordPersonal.objects.order_by('ejercicio_id', 'repeticiones_minimas').values_list(
+            'ejercicio_id', 'repeticiones_minimas', 'serie_id'))
+
+        sesiones, series = archivo.archivar(dias=60)
+        self.assertEqual(sesiones, SesionArchivada.objects.count())
+        self.assertEqual(SerieEjercicio.objects.count(), len(filas_antes) - series)
+        self.assertGreater(sesiones, 20)
+        self.assertEqual(self.foto(), antes)
+
+        # Reconstruir los agregados con las series archivadas da lo mismo
+        agregados.reconstruir_resumenes(self.usuario)
+        agregados.reconstruir_records(self.usuario)
+        agregados.reconstruir_ultimos_rendimientos(self.usuario)
+        agregados.reconstruir_estadisticas(self.usuario)
+        self.assertEqual(self.foto(), antes)
+
+        # Vuelven las mismas filas (ids, claves y fechas) y los récords enlazados a ellas
+        archivo.desarchivar(usuario=self.usuario)
+        self.assertFalse(SesionArchivada.objects.exists())
+        self.assertFalse(Entrenamiento.objects.filter(archivado=True).exists())
+        self.assertEqual(list(SerieEjercicio.objects.order_by('id').values()), filas_antes)
+        self.assertEqual(list(RecordPersonal.objects.order_by('ejercicio_id', 'repeticiones_minimas').values_list(
+            'ejercicio_id', 'repeticiones_minimas', 'serie_id')), records_antes)
+        self.assertEqual(self.foto(), antes)
+
+    def test_sesion_archivada_se_lee_y_se_desarchiva_al_escribir(self):
+        archivo.archivar(dias=60)
+        sesion = Entrenamiento.objects.filter(archivado=True).order_by('fecha').first()
+        totales = SesionArchivada.objects.get(entrenamiento=sesion)
+
+        respuesta = self.client.get(reverse('finalizar_entrenamiento', kwargs={'entrenamiento_id': sesion.id}))
+        self.assertEqual(len(respuesta.context['series']), totales.series_totales)
+
+        ejercicio_rutina = sesion.rutina.ejercicios.order_by('orden').first()
+        SerieEjercicio.objects.create(
+            entrenamiento=sesion, ejercicio_rutina=ejercicio_rutina, numero_serie=4, peso_kg=10, repeticiones=5,
+        )
+        sesion.refresh_from_db()
+        self.assertFalse(sesion.archivado)
+        self.assertEqual(sesion.series.count(), totales.series_totales + 1)
+        resumen = ResumenSesionEjercicio.objects.get(entrenamiento=sesion, ejercicio_id=ejercicio_rutina.ejercicio_id)
+        self.assertEqual(resumen.series_completadas, 4)
+
+    def test_cursor_y_lote_cuentan_lo_archivado(self):
+        archivo.archivar(dias=60)
+        sesion, otra = Entrenamiento.objects.filter(usuario=self.usuario, archivado=True).order_by('fecha')[:2]
+
+        # El cursor se recoloca contando las series archivadas: la sesión estaba completa
+        Entrenamiento.objects.filter(id=sesion.id).update(ejercicios_pendientes=None)
+        respuesta = self.client.get(reverse('registrar_serie', kwargs={'entrenamiento_id': sesion.id}))
+        self.assertRedirects(respuesta, reverse('finalizar_entrenamiento', kwargs={'entrenamiento_id': sesion.id}))
+        sesion.refresh_from_db()
+        self.assertFalse(sesion.archivado)
+        self.assertIsNone(sesion.ejercicio_actual)
+
+        # El lote numera detrás de las series que estaban archivadas
+        ejercicio_rutina = otra.rutina.ejercicios.order_by('orden').first()
+        archivadas = sum(1 for serie in archivo.series_de(otra) if serie.ejercicio_rutina_id == ejercicio_rutina.id)
+        self.client.post(reverse('registrar_series_lote', kwargs={'entrenamiento_id': otra.id}), {
+            'form-TOTAL_FORMS': 1, 'form-INITIAL_FORMS': 1,
+            'form-0-ejercicio_rutina': ejercicio_rutina.id, 'form-0-peso': 20, 'form-0-repeticiones': 5,
+            'form-0-rpe': 7,
+        })
+        numeros = sorted(otra.series.filter(ejercicio_rutina=ejercicio_rutina).values_list('numero_serie', flat=True))
+        self.assertEqual(numeros, list(range(1, archivadas + 2)))
+
+    def test_records_recalculados_cuentan_lo_archivado(self):
+        ejercicio_id = RecordPersonal.objects.filter(usuario=self.usuario).values_list('ejercicio_id', flat=True).first()
+        antes = list(RecordPersonal.objects.filter(usuario=self.usuario, ejercicio_id=ejercicio_id).order_by(
+            'repeticiones_minimas').values_list('repeticiones_minimas', 'peso_kg', 'repeticiones', 'e1rm', 'fecha'))
+        archivo.archivar(dias=0)  # todo archivado salvo la sesión en curso, que es de hoy
+
+        agregados.recalcular_records(self.usuario.id, ejercicio_id)
+        despues = list(RecordPersonal.objects.filter(usuario=self.usuario, ejercicio_id=ejercicio_id).order_by(
+            'repeticiones_minimas').values_list('repeticiones_minimas', 'peso_kg', 'repeticiones', 'e1rm', 'fecha'))
+        self.assertEqual(despues, antes)
+
+    def test_records_archivados_guardan_el_id_de_su_serie(self):
+        antes = dict(RecordPersonal.objects.filter(usuario=self.usuario).values_list('id', 'serie_id'))
+        archivo.archivar(dias=60)
+        archivados = RecordPersonal.objects.filter(usuario=self.usuario, serie__isnull=True)
+        self.assertTrue(archivados.exists())
+        for record_id, serie_archivada in archivados.values_list('id', 'serie_archivada'):
+            self.assertEqual(serie_archivada, antes[record_id])
+
+        # Borrar una serie que no es récord no vuelve a buscar los récords archivados
+        en_curso = Entrenamiento.objects.filter(usuario=self.usuario, archivado=False).latest('fecha')
+        serie = SerieEjercicio.objects.create(
+            entrenamiento=en_curso, ejercicio_rutina=en_curso.rutina.ejercicios.order_by('orden').first(),
+            numero_serie=9, peso_kg=1, repeticiones=1,
+        )
+        with mock.patch.object(agregados, 'recalcular_records') as recalcular:
+            serie.delete()
+        recalcular.assert_not_called()
+
+    def test_borrar_sesion_archivada_resta_y_recalcula(self):
+        usuario = User.objects.create_user('borra_archivo', password='x')
+        Perfil.objects.create(usuario=usuario, peso_corporal=80)
+        rutina = Rutina.objects.create(usuario=usuario, nombre='Empuje')
+        ejercicio_rutina = EjercicioRutina.objects.create(
+            rutina=rutina, ejercicio=Ejercicio.objects.create(nombre='Press militar', grupo_muscular='hombros'),
+            orden=1, series=1,
+        )
+        antigua, reciente = [
+            Entrenamiento.objects.create(usuario=usuario, rutina=rutina, fecha=timezone.now() - timedelta(days=dias))
+            for dias in (400, 1)
+        ]
+        SerieEjercicio.objects.create(
+            entrenamiento=antigua, ejercicio_rutina=ejercicio_rutina, numero_serie=1, peso_kg=150, repeticiones=3,
+        )
+        viva = SerieEjercicio.objects.create(
+            entrenamiento=reciente, ejercicio_rutina=ejercicio_rutina, numero_serie=1, peso_kg=100, repeticiones=3,
+        )
+        archivo.archivar(usuario=usuario)
+        antigua.refresh_from_db()
+        self.assertTrue(antigua.archivado)
+
+        antigua.delete()
+        estadisticas = EstadisticasUsuario.objects.get(usuario=usuario)
+        self.assertEqual((estadisticas.total_series, estadisticas.volumen_total), (1, 300))
+        record = RecordPersonal.objects.get(usuario=usuario, repeticiones_minimas=0)
+        self.assertEqual((record.peso_kg, record.serie_id, record.serie_archivada), (100, viva.id, None))
+        ranking = RankingFuerza.objects.get(usuario=usuario)
+        self.assertEqual(ranking.e1rm, viva.e1rm)
+
+    def test_paquete(self):
+        ahora = timezone.now()
+        series = [
+            archivo.SerieArchivada(7, 3, 2, 1, 62.5, 8, None, None, ahora, None),
+            archivo.SerieArchivada(9, 3, 2, 2, 60.0, 10, 9, 80.0, ahora, 'clave-1'),
+        ]
+        self.assertEqual(archivo.desempaquetar(archivo.empaquetar(series)), series)
+        self.assertEqual(archivo.desempaquetar(archivo.empaquetar([])), [])
+
+
+class ComandosCargaTests(TransactionTestCase):
+    """
+    generar_datos y prueba_carga. prueba_carga hace las peticiones desde
+    sus propios hilos: TransactionTestCase para que vean los usuarios.
+    """
+
+    opciones = {'usuarios': 2, 'rutinas': 2, 'sesiones': 6, 'ejercicios_por_rutina': 3, 'semilla': 5}
+
+    def setUp(self):
+        cache.clear()  # catálogo de otra prueba
+
+    def generar(self, **opciones):
+        call_command('generar_datos', **{**self.opciones, **opciones}, stdout=StringIO())
+
+    def cifras(self):
+        """Totales y agregados sin ids, que cambian al regenerar"""
+        return {
+            'series': sorted(SerieEjercicio.objects.values_list(
+                'entrenamiento__usuario__username', 'ejercicio_rutina__ejercicio__nombre', 'numero_serie',
+                'peso_kg', 'repeticiones', 'rpe',
+            )),
+            'estadisticas': sorted(EstadisticasUsuario.objects.values_list(
+                'usuario__username', 'total_entrenamientos', 'total_series', 'volumen_total',
+                'ejercicio_frecuente__nombre',
+            )),
+            'records': sorted(RecordPersonal.objects.values_list(
+                'usuario__username', 'ejercicio__nombre', 'repeticiones_minimas', 'peso_kg', 'repeticiones', 'e1rm',
+            )),
+            'resumenes': sorted(ResumenSesionEjercicio.objects.values_list(
+                'usuario__username', 'ejercicio__nombre', 'fecha', 'peso_maximo', 'reps_totales', 'volumen_total',
+            )),
+            'rankings': sorted(RankingFuerza.objects.values_list(
+                'usuario__username', 'categoria', 'posicion', 'posicion_categoria',
+            )),
+        }
+
+    def test_misma_semilla_mismas_cifras(self):
+        self.generar()
+        cifras = self.cifras()
+        self.assertEqual(len({fila[0] for fila in cifras['estadisticas']}), 2)
+        self.assertTrue(cifras['records'])
+
+        # bulk_create no dispara señales: los agregados tienen que estar ya reconstruidos
+        for usuario in User.objects.filter(username__startswith='carga'):
+            agregados.reconstruir_resumenes(usuario)
+            agregados.reconstruir_records(usuario)
+            agregados.reconstruir_ultimos_rendimientos(usuario)
+            agregados.reconstruir_estadisticas(usuario)
+        agregados.reconstruir_rankings()
+        self.assertEqual(self.cifras(), cifras)
+
+        self.generar(borrar=True)
+        self.assertEqual(self.cifras(), cifras)
+        self.generar(borrar=True, semilla=6)
+        self.assertNotEqual(self.cifras()['series'], cifras['series'])
+
+    def test_prueba_carga_sin_errores(self):
+        self.generar()
+        salida = StringIO()
+        call_command('prueba_carga', hilos=1, flujos=2, host='testserver', stdout=salida)
+        self.assertIn('Sin errores', salida.getvalue())
+        self.assertNotIn('con error', salida.getvalue())
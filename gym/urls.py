@@ -1,5 +1,14 @@
 from django.urls import path
-from.views import home, registro, login_view, logout_view, dashboard, lista_rutinas, crear_rutina, editar_rutina, eliminar_rutina, detalle_rutina, agregar_ejercicio_rutina, iniciar_entrenamiento, registrar_serie, finalizar_entrenamiento, historial_entrenamientos, progreso_dashboard, progreso_ejercicio, actualizar_peso
+from .api import api_sync, api_subir
+from .exportar import exportar_historial
+from .importar import importar_historial
+from .series_temporales import api_serie_ejercicio
+from .grupos_musculares import api_volumen_grupos, progreso_grupos
+from .ranking import api_ranking_ejercicio, ranking_ejercicio
+from .catalogo import api_buscar_ejercicios
+from .metricas import metricas
+from . import progreso_async
+from.views import home, registro, login_view, logout_view, dashboard, lista_rutinas, crear_rutina, editar_rutina, eliminar_rutina, detalle_rutina, agregar_ejercicio_rutina, iniciar_entrenamiento, registrar_serie, registrar_series_lote, finalizar_entrenamiento, historial_entrenamientos, progreso_dashboard, progreso_ejercicio, actualizar_peso
 urlpatterns = [
     path('', home, name='home'),
     path('registro/', registro, name='registro'),
@@ -13,9 +22,23 @@ urlpatterns = [
     path('rutinas/<int:rutina_id>/agregar-ejercicio/', agregar_ejercicio_rutina, name='agregar_ejercicio_rutina'),
     path('entrenamientos/iniciar/<int:rutina_id>/', iniciar_entrenamiento, name='iniciar_entrenamiento'),
     path('entrenamientos/registrar/<int:entrenamiento_id>/', registrar_serie, name='registrar_serie'),
+    path('entrenamientos/registrar-lote/<int:entrenamiento_id>/', registrar_series_lote, name='registrar_series_lote'),
     path('entrenamientos/finalizar/<int:entrenamiento_id>/', finalizar_entrenamiento, name='finalizar_entrenamiento'),
     path('entrenamientos/historial/', historial_entrenamientos, name='historial_entrenamientos'),
+    path('entrenamientos/exportar/', exportar_historial, name='exportar_historial'),
+    path('entrenamientos/importar/', importar_historial, name='importar_historial'),
     path('progreso/', progreso_dashboard, name='progreso_dashboard'),
     path('progreso/ejercicio/<int:ejercicio_id>/', progreso_ejercicio, name='progreso_ejercicio'),
+    path('progreso/grupos/', progreso_grupos, name='progreso_grupos'),
+    path('progreso/ranking/<int:ejercicio_id>/', ranking_ejercicio, name='ranking_ejercicio'),
+    path('progreso/async/', progreso_async.progreso_dashboard, name='progreso_dashboard_async'),
+    path('progreso/async/ejercicio/<int:ejercicio_id>/', progreso_async.progreso_ejercicio, name='progreso_ejercicio_async'),
     path('actualizar-peso/', actualizar_peso, name='actualizar_peso'),
+    path('api/sync/', api_sync, name='api_sync'),
+    path('api/sync/subir/', api_subir, name='api_subir'),
+    path('api/progreso/ejercicio/<int:ejercicio_id>/', api_serie_ejercicio, name='api_serie_ejercicio'),
+    path('api/progreso/grupos/', api_volumen_grupos, name='api_volumen_grupos'),
+    path('api/ranking/<int:ejercicio_id>/', api_ranking_ejercicio, name='api_ranking_ejercicio'),
+    path('api/ejercicios/buscar/', api_buscar_ejercicios, name='api_buscar_ejercicios'),
+    path('metrics', metricas, name='metricas'),
 ]
@@ -1,6 +1,20 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from.models import Rutina, Ejercicio, EjercicioRutina, Entrenamiento, SerieEjercicio, Perfil
-from.forms import RutinaForm, EjercicioRutinaForm
+from.models import Rutina, Ejercicio, EjercicioRutina, Entrenamiento, SerieEjercicio, Perfil, ResumenSesionEjercicio, RecordPersonal, EstadisticasUsuario, UltimoRendimiento
+from . import agregados, archivo, cache_progreso
+from .sqlite import reintentar_si_bloqueada
+from . import progresion, series_temporales
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.utils.http import http_date, quote_etag
+from functools import wraps
+import hashlib
+from django.utils.dateparse import parse_date, parse_datetime
+from.forms import RutinaForm, EjercicioRutinaForm, SerieLoteFormSet
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
@@ -185,7 +199,7 @@ def detalle_rutina(request, rutina_id):
     )
     
     # Obtener todos los ejercicios de esta rutina, ordenados
-    ejercicios = rutina.ejercicios.all().order_by('orden')
+    ejercicios = rutina.ejercicios.select_related('ejercicio').order_by('orden')
     
     return render(request, 'rutinas/detalle.html', {
         'rutina': rutina,
@@ -226,6 +240,7 @@ def agregar_ejercicio_rutina(request, rutina_id):
     
 # 📝 EXPLICACIÓN: Inicia un nuevo entrenamiento basado en una rutina
 @login_required
+@reintentar_si_bloqueada
 def iniciar_entrenamiento(request, rutina_id):
     # Obtener la rutina (solo del usuario actual)
     rutina = get_object_or_404(
@@ -235,41 +250,41 @@ def iniciar_entrenamiento(request, rutina_id):
         activa=True
     )
     
-    # Crear un nuevo entrenamiento
-    entrenamiento = Entrenamiento.objects.create(
-        usuario=request.user,
-        rutina=rutina
-    )
+    # Crear un nuevo entrenamiento y colocar el cursor en el primer ejercicio
+    # (juntos: si SQLite está ocupado y se reintenta, no queda uno a medias)
+    with transaction.atomic():
+        entrenamiento = Entrenamiento.objects.create(
+            usuario=request.user,
+            rutina=rutina
+        )
+        entrenamiento.iniciar_cursor()
     
     # Redirigir a la página para registrar series
     return redirect('registrar_serie', entrenamiento_id=entrenamiento.id)
 
 # 📝 EXPLICACIÓN: Registra serie por serie durante el entrenamiento
 @login_required
+@reintentar_si_bloqueada
 def registrar_serie(request, entrenamiento_id):
-    # Obtener el entrenamiento actual
+    # Obtener el entrenamiento actual (con el ejercicio al que apunta el cursor)
     entrenamiento = get_object_or_404(
-        Entrenamiento,
+        Entrenamiento.objects.select_related('rutina', 'ejercicio_actual__ejercicio'),
         id=entrenamiento_id,
         usuario=request.user
     )
     
-    # Obtener todos los ejercicios de la rutina
-    ejercicios_rutina = entrenamiento.rutina.ejercicios.all().order_by('orden')
+    # El cursor cuenta las series de SerieEjercicio: una sesión archivada
+    # vuelve a tener sus filas antes de moverlo
+    archivo.reabrir([entrenamiento])
     
     # Determinar qué ejercicio toca ahora
-    # Lógica: buscar el primer ejercicio sin series registradas hoy
-    ejercicio_actual = None
-    for ejercicio_rutina in ejercicios_rutina:
-        series_registradas = SerieEjercicio.objects.filter(
-            entrenamiento=entrenamiento,
-            ejercicio_rutina=ejercicio_rutina
-        ).count()
-        
-        if series_registradas < ejercicio_rutina.series:
-            ejercicio_actual = ejercicio_rutina
-            numero_serie = series_registradas + 1
-            break
+    # Lógica: el cursor del entrenamiento ya lo sabe; solo se calcula
+    # una vez para entrenamientos empezados antes de existir el cursor
+    if not entrenamiento.cursor_iniciado:
+        entrenamiento.iniciar_cursor()
+    
+    ejercicio_actual = entrenamiento.ejercicio_actual
+    numero_serie = entrenamiento.serie_actual
     
     # Si no hay más ejercicios, terminar entrenamiento
     if not ejercicio_actual:
@@ -277,73 +292,288 @@ def registrar_serie(request, entrenamiento_id):
     
     # Procesar el formulario si se envió
     if request.method == 'POST':
+        accion = request.POST.get('accion', 'registrar')
+        
+        if accion == 'saltar':
+            # Pasar al siguiente ejercicio sin terminar este
+            entrenamiento.saltar_ejercicio()
+            return redirect('registrar_serie', entrenamiento_id=entrenamiento.id)
+        
+        if accion == 'priorizar':
+            # Cambiar el orden: hacer ahora otro ejercicio pendiente
+            ejercicio_rutina_id = request.POST.get('ejercicio_rutina_id', '')
+            if ejercicio_rutina_id.isdigit():
+                entrenamiento.priorizar_ejercicio(int(ejercicio_rutina_id))
+            return redirect('registrar_serie', entrenamiento_id=entrenamiento.id)
+        
         peso = float(request.POST.get('peso', 0))
         repeticiones = int(request.POST.get('repeticiones', 0))
         rpe = int(request.POST.get("rpe", 7))  # Default 7 si no se especifica
         
-        # Crear registro de la serie
-        SerieEjercicio.objects.create(
-            entrenamiento=entrenamiento,
-            ejercicio_rutina=ejercicio_actual,
-            numero_serie=numero_serie,
-            peso_kg=peso,
-            repeticiones=repeticiones,
-            rpe=rpe,
-        )
+        # Crear la serie y avanzar el cursor en la misma transacción
+        with transaction.atomic():
+            SerieEjercicio.objects.create(
+                entrenamiento=entrenamiento,
+                ejercicio_rutina=ejercicio_actual,
+                numero_serie=numero_serie,
+                peso_kg=peso,
+                repeticiones=repeticiones,
+                rpe=rpe,
+            )
+            if not entrenamiento.avanzar_cursor():
+                # Otra petición (doble clic) ya registró esta serie
+                transaction.set_rollback(True)
+                messages.warning(request, 'Esa serie ya estaba registrada')
         
         # Redirigir a la misma página para la siguiente serie
         return redirect('registrar_serie', entrenamiento_id=entrenamiento.id)
     
     # Contexto para el template
-    # Calcular sugerencia simple
-    sugerencia_peso = None
+    # Calcular sugerencia de peso y repeticiones
+    sugerencia = None
     if ejercicio_actual:
-        sugerencia_peso = calcular_sugerencia_simple(
-            request.user, 
-            ejercicio_actual.ejercicio.id
-        )
+        sugerencia = calcular_sugerencia(entrenamiento, ejercicio_actual)
+    
+    # Ejercicios que quedan, en el orden del cursor (para saltar o reordenar)
+    pendientes = EjercicioRutina.objects.select_related('ejercicio').in_bulk(entrenamiento.ejercicios_pendientes)
+    ejercicios_pendientes = [pendientes[er_id] for er_id in entrenamiento.ejercicios_pendientes if er_id in pendientes]
+    
     return render(request, 'entrenamientos/registrar_serie.html', {
         'entrenamiento': entrenamiento,
         'ejercicio_actual': ejercicio_actual,
         'numero_serie': numero_serie,
         'series_completadas': numero_serie - 1,
         'total_series': ejercicio_actual.series,
-        "sugerencia_peso": sugerencia_peso
+        'ejercicios_pendientes': ejercicios_pendientes,
+        "sugerencia": sugerencia
+    })
+    
+# 📝 EXPLICACIÓN: Registra varias series (un ejercicio o la sesión entera) de una vez
+@login_required
+@reintentar_si_bloqueada
+def registrar_series_lote(request, entrenamiento_id):
+    entrenamiento = get_object_or_404(
+        Entrenamiento.objects.select_related('rutina'),
+        id=entrenamiento_id,
+        usuario=request.user
+    )
+    
+    # Ejercicios de la rutina (opcional: solo uno con ?ejercicio=<id>)
+    ejercicios_rutina = entrenamiento.rutina.ejercicios.select_related('ejercicio').order_by('orden')
+    solo_ejercicio = request.GET.get('ejercicio', '')
+    if solo_ejercicio.isdigit():
+        ejercicios_rutina = ejercicios_rutina.filter(id=int(solo_ejercicio))
+    ejercicios_por_id = {ejercicio_rutina.id: ejercicio_rutina for ejercicio_rutina in ejercicios_rutina}
+    
+    if request.method == 'POST':
+        formset = SerieLoteFormSet(request.POST, ejercicios_validos=ejercicios_por_id)
+        
+        if formset.is_valid():
+            # Contar, numerar e insertar en la misma transacción (como
+            # registrar_serie con avanzar_cursor): así una serie suelta
+            # registrada a la vez no se queda con el mismo número. Lo
+            # serializa el cerrojo de la fila del entrenamiento; SQLite lo
+            # ignora, pero la transacción que leyó y luego escribe falla con
+            # "database is locked" y reintentar_si_bloqueada la repite
+            with transaction.atomic():
+                Entrenamiento.objects.select_for_update().filter(id=entrenamiento.id).exists()
+                # Las archivadas también cuentan al numerar
+                archivo.reabrir([entrenamiento])
+                hechas = dict(
+                    entrenamiento.series.values('ejercicio_rutina_id').annotate(
+                        total=Count('id')
+                    ).values_list('ejercicio_rutina_id', 'total').order_by()
+                )
+                
+                nuevas = []
+                for datos in formset.series_llenas:
+                    ejercicio_rutina_id = datos['ejercicio_rutina']
+                    hechas[ejercicio_rutina_id] = hechas.get(ejercicio_rutina_id, 0) + 1
+                    nuevas.append(SerieEjercicio(
+                        entrenamiento=entrenamiento,
+                        ejercicio_rutina_id=ejercicio_rutina_id,
+                        numero_serie=hechas[ejercicio_rutina_id],
+                        peso_kg=datos['peso'],
+                        repeticiones=datos['repeticiones'],
+                        rpe=datos['rpe'],
+                    ))
+                    nuevas[-1].calcular_e1rm()
+                
+                # Un solo INSERT para todas las series; bulk_create no dispara
+                # señales ni save(), así que 1RM, agregados y cursor van aquí
+                SerieEjercicio.objects.bulk_create(nuevas)
+                agregados.series_creadas_en_lote(entrenamiento, nuevas)
+                entrenamiento.iniciar_cursor()
+            
+            messages.success(request, f'¡{len(nuevas)} series registradas!')
+            return redirect('registrar_serie', entrenamiento_id=entrenamiento.id)
+    else:
+        # Una fila vacía por cada serie planificada
+        formset = SerieLoteFormSet(
+            ejercicios_validos=ejercicios_por_id,
+            initial=[
+                {'ejercicio_rutina': ejercicio_rutina.id}
+                for ejercicio_rutina in ejercicios_rutina
+                for _ in range(ejercicio_rutina.series)
+            ]
+        )
+    
+    # Emparejar cada fila con su ejercicio para mostrar el nombre
+    filas = []
+    for form in formset:
+        valor = str(form['ejercicio_rutina'].value() or '')
+        filas.append((form, ejercicios_por_id.get(int(valor)) if valor.isdigit() else None))
+    
+    return render(request, 'entrenamientos/registrar_lote.html', {
+        'entrenamiento': entrenamiento,
+        'formset': formset,
+        'filas': filas,
     })
     
+# 📝 EXPLICACIÓN: GET condicional (ETag / Last-Modified) para páginas de solo lectura
+# Si el navegador ya tiene la página y el usuario no ha registrado nada
+# desde entonces, se responde 304 sin ejecutar la vista ni sus consultas
+def _hay_mensajes(request):
+    # Con mensajes pendientes la página cambia aunque los datos no: ni ETag
+    # ni Last-Modified, o un 304 se comería el mensaje
+    return bool(len(messages.get_messages(request)))
+
+def _etag_usuario(request, *args, **kwargs):
+    if _hay_mensajes(request):
+        return None
+    marca = cache_progreso.marca_usuario(request.user.id)
+    datos = f'{request.user.id}:{marca}:{request.get_full_path()}:{request.session.session_key}'
+    return hashlib.md5(datos.encode()).hexdigest()
+
+def _ultima_modificacion_usuario(request, *args, **kwargs):
+    if _hay_mensajes(request):
+        return None
+    # La marca son nanosegundos desde 1970 (ver gym/cache_progreso.py)
+    marca = cache_progreso.marca_usuario(request.user.id)
+    return datetime.fromtimestamp(marca / 1e9, tz=dt_timezone.utc)
+
+def validadores_usuario(request):
+    """
+    (ETag entre comillas, Last-Modified en segundos) de la página del
+    usuario, o (None, None) si hay mensajes pendientes
+    """
+    etag = _etag_usuario(request)
+    if not etag:
+        return None, None
+    return quote_etag(etag), int(_ultima_modificacion_usuario(request).timestamp())
+
+def poner_validadores(request, respuesta):
+    """
+    Cabeceras de una respuesta 200 ya generada: si la propia vista escribió
+    algo (finalizar guarda la duración la primera vez), la marca cambió y
+    deben ser las nuevas; con mensajes pendientes, ninguna.
+    """
+    etag, ultima = validadores_usuario(request)
+    if etag:
+        respuesta['ETag'] = etag
+        respuesta['Last-Modified'] = http_date(ultima)
+    else:
+        del respuesta['ETag']
+        del respuesta['Last-Modified']
+
+def peticion_condicional(vista):
+    condicional = condition(etag_func=_etag_usuario, last_modified_func=_ultima_modificacion_usuario)(vista)
+    
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        respuesta = condicional(request, *args, **kwargs)
+        if respuesta.status_code == 200:
+            poner_validadores(request, respuesta)
+        return respuesta
+    
+    # private: la página es de un usuario, ningún proxy debe compartirla
+    return cache_control(private=True, no_cache=True)(envoltura)
+
 # 📝 EXPLICACIÓN: Muestra resumen del entrenamiento completado
 @login_required
+@peticion_condicional
 def finalizar_entrenamiento(request, entrenamiento_id):
     entrenamiento = get_object_or_404(
-        Entrenamiento,
+        Entrenamiento.objects.select_related('rutina'),
         id=entrenamiento_id,
         usuario=request.user
     )
     
     # Calcular duración aproximada (podríamos mejorarlo con timestamps)
-    # Por ahora, un cálculo simple
-    entrenamiento.duracion_minutos = 60  # Valor de ejemplo
-    entrenamiento.save()
+    # Por ahora, un cálculo simple. Solo se guarda la primera vez: volver a
+    # guardar en cada visita cambiaría la marca del usuario y el ETag
+    if not entrenamiento.duracion_minutos:
+        entrenamiento.duracion_minutos = 60  # Valor de ejemplo
+        entrenamiento.save(update_fields=['duracion_minutos', 'actualizado'])
     
     # Obtener todas las series de este entrenamiento
+    # select_related: el template muestra el nombre del ejercicio de cada serie
     series = SerieEjercicio.objects.filter(
         entrenamiento=entrenamiento
-    ).order_by('ejercicio_rutina__orden', 'numero_serie')
+    ).select_related('ejercicio_rutina__ejercicio').order_by('ejercicio_rutina__orden', 'numero_serie')
+    if entrenamiento.archivado:
+        series = archivo.series_de(entrenamiento)
     
     return render(request, 'entrenamientos/finalizar.html', {
         'entrenamiento': entrenamiento,
         'series': series
     })
     
-# 📝 EXPLICACIÓN: Muestra todos los entrenamientos del usuario
+# 📝 EXPLICACIÓN: Muestra todos los entrenamientos del usuario, por páginas
+ENTRENAMIENTOS_POR_PAGINA = 20
+_EPOCA = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+def _cursor_historial(entrenamiento):
+    """Cursor de la página siguiente: '<microsegundos desde 1970>_<id>'"""
+    microsegundos = (entrenamiento.fecha - _EPOCA) // timedelta(microseconds=1)
+    return f'{microsegundos}_{entrenamiento.id}'
+
+def _leer_cursor_historial(cursor):
+    """(fecha, id) del cursor, o None (primera página) si está mal formado o fuera de rango"""
+    try:
+        microsegundos, entrenamiento_id = (int(parte) for parte in cursor.split('_'))
+        return _EPOCA + timedelta(microseconds=microsegundos), entrenamiento_id
+    except (ValueError, OverflowError):
+        return None
+
 @login_required
+@peticion_condicional
 def historial_entrenamientos(request):
+    # Paginación por cursor (keyset) sobre (fecha, id): cada página cuesta
+    # lo mismo aunque el usuario tenga miles de entrenamientos
+    # Los totales van en subconsultas correlacionadas (no GROUP BY): así
+    # SQLite recorre el índice (usuario, -fecha, -id) y para en el LIMIT.
+    # Las sesiones archivadas traen sus totales guardados (gym/archivo.py)
+    series = SerieEjercicio.objects.filter(
+        entrenamiento=OuterRef('pk')
+    ).order_by().values('entrenamiento')
     entrenamientos = Entrenamiento.objects.filter(
         usuario=request.user
-    ).order_by('-fecha')
+    ).select_related('rutina').annotate(
+        num_series=Coalesce(Subquery(series.annotate(total=Count('id')).values('total')), 'archivo__series_totales'),
+        volumen=Coalesce(Subquery(series.annotate(
+            total=Sum(F('peso_kg') * F('repeticiones'), output_field=FloatField())
+        ).values('total')), 'archivo__volumen_total'),
+    ).order_by('-fecha', '-id')
+    
+    cursor = _leer_cursor_historial(request.GET.get('antes', ''))
+    if cursor:
+        fecha, entrenamiento_id = cursor
+        entrenamientos = entrenamientos.filter(
+            Q(fecha__lt=fecha) | Q(fecha=fecha, id__lt=entrenamiento_id)
+        )
+    
+    # Pedimos uno de más para saber si hay otra página
+    pagina = list(entrenamientos[:ENTRENAMIENTOS_POR_PAGINA + 1])
+    siguiente = None
+    if len(pagina) > ENTRENAMIENTOS_POR_PAGINA:
+        pagina = pagina[:ENTRENAMIENTOS_POR_PAGINA]
+        siguiente = _cursor_historial(pagina[-1])
     
     return render(request, 'entrenamientos/historial.html', {
-        'entrenamientos': entrenamientos
+        'entrenamientos': pagina,
+        'cursor_siguiente': siguiente,
+        'es_primera_pagina': cursor is None,
     })
     
 # 📝 EXPLICACIÓN: Calcula el progreso de un ejercicio específico
@@ -351,47 +581,29 @@ def calcular_progreso_ejercicio(usuario, ejercicio_id):
     """
     Compara el rendimiento actual vs anterior en un ejercicio específico
     """
-    # Obtener todas las series de este ejercicio para el usuario
-    series = SerieEjercicio.objects.filter(
-        ejercicio_rutina__ejercicio_id=ejercicio_id,
-        entrenamiento__usuario=usuario
-    ).order_by('entrenamiento__fecha')
-    
-    if not series:
+    # Leer los resúmenes precalculados: una fila por entrenamiento,
+    # no una por serie (se mantienen en gym/agregados.py)
+    resumenes = ResumenSesionEjercicio.objects.filter(
+        usuario=usuario,
+        ejercicio_id=ejercicio_id
+    ).select_related('entrenamiento__rutina').order_by('fecha', 'entrenamiento_id')
+    
+    progreso_por_entrenamiento = [
+        {
+            'fecha': resumen.fecha,
+            'rutina': resumen.entrenamiento.rutina.nombre,
+            'peso_maximo': resumen.peso_maximo,
+            'reps_totales': resumen.reps_totales,
+            'series_completadas': resumen.series_completadas,
+            'volumen_total': resumen.volumen_total,  # peso x reps
+            'e1rm_maximo': resumen.e1rm_maximo,  # precalculado al guardar cada serie
+        }
+        for resumen in resumenes
+    ]
+    
+    if not progreso_por_entrenamiento:
         return None  # No hay datos para este ejercicio
     
-    # Agrupar por entrenamiento
-    progreso_por_entrenamiento = []
-    entrenamiento_actual = None
-    datos_entrenamiento = {}
-    
-    for serie in series:
-        if serie.entrenamiento != entrenamiento_actual:
-            if datos_entrenamiento:
-                progreso_por_entrenamiento.append(datos_entrenamiento)
-            
-            entrenamiento_actual = serie.entrenamiento
-            datos_entrenamiento = {
-                'fecha': serie.entrenamiento.fecha,
-                'rutina': serie.entrenamiento.rutina.nombre,
-                'peso_maximo': 0,
-                'reps_totales': 0,
-                'series_completadas': 0,
-                'volumen_total': 0  # peso x reps
-            }
-        
-        # Actualizar estadísticas
-        datos_entrenamiento['peso_maximo'] = max(
-            datos_entrenamiento['peso_maximo'], 
-            serie.peso_kg
-        )
-        datos_entrenamiento['reps_totales'] += serie.repeticiones
-        datos_entrenamiento['series_completadas'] += 1
-        datos_entrenamiento['volumen_total'] += serie.peso_kg * serie.repeticiones
-    
-    if datos_entrenamiento:
-        progreso_por_entrenamiento.append(datos_entrenamiento)
-    
     return progreso_por_entrenamiento
 
 # 📝 EXPLICACIÓN: Encuentra PRs (Personal Records) del usuario
@@ -399,27 +611,38 @@ def encontrar_prs(usuario):
     """
     Encuentra los récords personales del usuario en cada ejercicio
     """
-    prs = []
+    # Leer el libro de récords en una sola consulta (se mantiene en gym/agregados.py)
+    records = RecordPersonal.objects.filter(
+        usuario=usuario
+    ).select_related('ejercicio').order_by('ejercicio_id', 'repeticiones_minimas')
     
-    # Obtener todos los ejercicios que el usuario ha hecho
-    ejercicios_hechos = Ejercicio.objects.filter(
-        ejerciciorutina__rutina__entrenamiento__usuario=usuario
-    ).distinct()
-    
-    for ejercicio in ejercicios_hechos:
-        # Encontrar la serie con máximo peso para este ejercicio
-        max_serie = SerieEjercicio.objects.filter(
-            ejercicio_rutina__ejercicio=ejercicio,
-            entrenamiento__usuario=usuario
-        ).order_by('-peso_kg').first()
-        
-        if max_serie:
-            prs.append({
-                'ejercicio': ejercicio.nombre,
-                'peso': max_serie.peso_kg,
-                'reps': max_serie.repeticiones,
-                'fecha': max_serie.entrenamiento.fecha,
-                'ejercicio_id': ejercicio.id
+    prs = []
+    mejor_e1rm = None
+    for record in records:
+        if record.repeticiones_minimas == RecordPersonal.RANGO_E1RM:
+            # Mejor 1RM estimado: va antes que el absoluto de su ejercicio
+            mejor_e1rm = record
+        elif record.repeticiones_minimas == 0:
+            # Récord absoluto → una tarjeta por ejercicio
+            pr = {
+                'ejercicio': record.ejercicio.nombre,
+                'peso': record.peso_kg,
+                'reps': record.repeticiones,
+                'fecha': record.fecha,
+                'ejercicio_id': record.ejercicio_id,
+                'por_reps': [],
+                'e1rm': None,
+            }
+            if mejor_e1rm is not None and mejor_e1rm.ejercicio_id == record.ejercicio_id:
+                pr['e1rm'] = mejor_e1rm.e1rm
+                pr['e1rm_peso'] = mejor_e1rm.peso_kg
+                pr['e1rm_reps'] = mejor_e1rm.repeticiones
+            prs.append(pr)
+        elif prs and prs[-1]['ejercicio_id'] == record.ejercicio_id:
+            # Récords por rango: mejor peso con al menos N repeticiones
+            prs[-1]['por_reps'].append({
+                'reps': record.repeticiones_minimas,
+                'peso': record.peso_kg,
             })
     
     
@@ -429,7 +652,8 @@ def encontrar_prs(usuario):
         peso_corporal = perfil.peso_corporal
         if peso_corporal and peso_corporal > 0:
             for pr in prs:
-                relacion = pr['peso'] / peso_corporal
+                # Con 1RM estimado se compara fuerza, no solo el peso más alto levantado
+                relacion = (pr['e1rm'] or pr['peso']) / peso_corporal
                 pr['relacion_peso'] = round(relacion, 2)
                 
                 # Determinar nivel basado en relación
@@ -456,104 +680,208 @@ def calcular_estadisticas_generales(usuario):
     """
     Calcula estadísticas generales de todos los entrenamientos
     """
+    # Una sola consulta por clave primaria: los contadores se mantienen
+    # en cada escritura (ver gym/agregados.py)
+    estadisticas = EstadisticasUsuario.objects.select_related(
+        'ejercicio_frecuente'
+    ).filter(usuario=usuario).first()
+    
+    if estadisticas is None:
+        # Historial anterior a la tabla de contadores → calcularlos una vez
+        agregados.reconstruir_estadisticas(usuario)
+        estadisticas = EstadisticasUsuario.objects.select_related(
+            'ejercicio_frecuente'
+        ).filter(usuario=usuario).first()
+    
+    if estadisticas is None or not estadisticas.total_entrenamientos:
+        return None
+    
+    return {
+        'total_entrenamientos': estadisticas.total_entrenamientos,
+        'total_series': estadisticas.total_series,
+        'volumen_total': estadisticas.volumen_total,
+        'ejercicio_frecuente': estadisticas.ejercicio_frecuente.nombre if estadisticas.ejercicio_frecuente else 'Ninguno',
+        'primera_fecha': estadisticas.primera_fecha,
+        'ultima_fecha': estadisticas.ultima_fecha,
+    }
+    
+# 📝 EXPLICACIÓN: Serie temporal de volumen por entrenamiento
+def calcular_volumen_sesiones(usuario, sesiones=None, desde=None, hasta=None):
+    """
+    Volumen (peso x reps) de cada entrenamiento, calculado por la base de
+    datos en una sola consulta agrupada. Acepta las últimas N sesiones o
+    un rango de fechas; el número de consultas no depende de la ventana.
+    """
     entrenamientos = Entrenamiento.objects.filter(usuario=usuario)
+    if desde:
+        entrenamientos = entrenamientos.filter(fecha__date__gte=desde)
+    if hasta:
+        entrenamientos = entrenamientos.filter(fecha__date__lte=hasta)
+    
+    # Las sesiones archivadas no tienen filas de series: traen sus totales (gym/archivo.py)
+    entrenamientos = entrenamientos.annotate(
+        volumen=Coalesce(
+            Sum(F('series__peso_kg') * F('series__repeticiones'), output_field=FloatField()),
+            Max('archivo__volumen_total'),
+        ),
+        num_series=Count('series') + Coalesce(Max('archivo__series_totales'), 0),
+    ).filter(num_series__gt=0).select_related('rutina').order_by('-fecha')
+    
+    if sesiones:
+        entrenamientos = entrenamientos[:sesiones]
+    
+    return [
+        {
+            'fecha': entrenamiento.fecha.strftime('%d/%m'),
+            'volumen': entrenamiento.volumen,
+            'nombre': entrenamiento.rutina.nombre
+        }
+        for entrenamiento in entrenamientos
+    ]
+
+# Ventanas disponibles para el gráfico del dashboard
+SESIONES_GRAFICO_DEFECTO = 5
+SESIONES_GRAFICO_MAXIMO = 500
+# Puntos del gráfico de un ejercicio: 5 años caben por meses
+PUNTOS_GRAFICO = 120
+
+def ventana_grafico(request):
+    """
+    Lee la ventana del gráfico de la URL:
+    ?sesiones=12, ?meses=6 o ?desde=2025-01-01&hasta=2025-06-30
+    """
+    desde = parse_date(request.GET.get('desde', '') or '')
+    hasta = parse_date(request.GET.get('hasta', '') or '')
     
-    if not entrenamientos:
-        return None
+    meses = request.GET.get('meses', '')
+    if meses.isdigit() and int(meses) > 0:
+        desde = (timezone.now() - timedelta(days=30 * int(meses))).date()
     
-    total_entrenamientos = entrenamientos.count()
-    total_series = SerieEjercicio.objects.filter(
-        entrenamiento__usuario=usuario
-    ).count()
+    if desde or hasta:
+        return {'desde': desde, 'hasta': hasta}
     
-    # Encontrar el ejercicio más frecuente
-    from django.db.models import Count
-    ejercicio_frecuente = Ejercicio.objects.filter(
-        ejerciciorutina__rutina__entrenamiento__usuario=usuario
-    ).annotate(
-        veces_realizado=Count('ejerciciorutina__rutina__entrenamiento')
-    ).order_by('-veces_realizado').first()
+    sesiones = request.GET.get('sesiones', '')
+    if sesiones.isdigit() and int(sesiones) > 0:
+        return {'sesiones': min(int(sesiones), SESIONES_GRAFICO_MAXIMO)}
+    return {'sesiones': SESIONES_GRAFICO_DEFECTO}
     
+# 📝 EXPLICACIÓN: Todo lo que calcula el dashboard de progreso, junto
+# (así se puede cachear de una vez, ver gym/cache_progreso.py)
+# (las cuatro partes son independientes: gym/progreso_async.py las calcula a la vez)
+def calcular_datos_dashboard(usuario, ventana):
     return {
-        'total_entrenamientos': total_entrenamientos,
-        'total_series': total_series,
-        'ejercicio_frecuente': ejercicio_frecuente.nombre if ejercicio_frecuente else 'Ninguno',
-        'primera_fecha': entrenamientos.order_by('fecha').first().fecha,
-        'ultima_fecha': entrenamientos.order_by('-fecha').first().fecha,
+        # Obtener estadísticas generales
+        'estadisticas': calcular_estadisticas_generales(usuario),
+        # Obtener PRs del usuario
+        'prs': encontrar_prs(usuario),
+        # Preparar datos para gráficos (ventana elegida por el usuario)
+        'datos_grafico': calcular_volumen_sesiones(usuario, **ventana),
+        'ultimos_entrenamientos': ultimos_entrenamientos(usuario),
     }
-    
+
+def ultimos_entrenamientos(usuario):
+    # Obtener últimos 5 entrenamientos para la lista de recientes
+    return list(Entrenamiento.objects.filter(
+        usuario=usuario
+    ).select_related('rutina').order_by('-fecha')[:5])
+
+def clave_ventana(ventana):
+    return '-'.join(f'{nombre}={valor}' for nombre, valor in sorted(ventana.items()))
+
 # 📝 EXPLICACIÓN: Vista principal de progreso
 @login_required
+@peticion_condicional
 def progreso_dashboard(request):
     """
     Dashboard principal con gráficos y estadísticas
     """
-    # Obtener estadísticas generales
-    estadisticas = calcular_estadisticas_generales(request.user)
-    
-    # Obtener PRs del usuario
-    prs = encontrar_prs(request.user)
+    ventana = ventana_grafico(request)
     
-    # Obtener últimos 5 entrenamientos para gráfico reciente
-    ultimos_entrenamientos = Entrenamiento.objects.filter(
-        usuario=request.user
-    ).order_by('-fecha')[:5]
+    # Se recalcula solo si el usuario registró algo desde la última visita
+    datos = cache_progreso.obtener_o_calcular(
+        request.user.id,
+        f'dashboard:{clave_ventana(ventana)}',
+        lambda: calcular_datos_dashboard(request.user, ventana)
+    )
     
-    # Preparar datos para gráficos
+    return render(request, 'progreso/dashboard.html', datos)
+
+# 📝 EXPLICACIÓN: Todo lo que calcula la página de progreso de un ejercicio
+def calcular_datos_ejercicio(usuario, ejercicio_id):
+    # Calcular progreso histórico
+    historial = calcular_progreso_ejercicio(usuario, ejercicio_id)
+    serie = serie_grafico_ejercicio(usuario, ejercicio_id, historial)
+    return componer_datos_ejercicio(historial, obtener_peso_corporal(usuario), serie)
+
+def obtener_peso_corporal(usuario):
+    perfil = Perfil.objects.filter(usuario=usuario).first()
+    return perfil.peso_corporal if perfil else None
+
+def serie_grafico_ejercicio(usuario, ejercicio_id, historial):
+    """
+    Puntos del gráfico: todo el historial agrupado por la base de datos
+    (por sesión, semana o mes según lo largo que sea), nunca más de
+    PUNTOS_GRAFICO. Ver gym/series_temporales.py.
+    """
+    if not historial:
+        return None
+    # Con `desde` ya conocido no hace falta buscar la primera sesión
+    return series_temporales.serie_ejercicio(
+        usuario.id, ejercicio_id,
+        desde=timezone.localdate(historial[0]['fecha']),
+        puntos=PUNTOS_GRAFICO,
+    )
+
+def _fecha_punto(inicio):
+    """'sesion' trae la fecha y hora de la sesión; 'semana' y 'mes', el primer día"""
+    momento = parse_datetime(inicio) if 'T' in inicio else None
+    dia = timezone.localdate(momento) if momento else parse_date(inicio)
+    return dia.strftime('%d/%m/%Y')
+
+def componer_datos_ejercicio(historial, peso_corporal, serie):
+    # Preparar datos para gráfico
     datos_grafico = []
-    for entrenamiento in ultimos_entrenamientos:
-        series_entrenamiento = SerieEjercicio.objects.filter(
-            entrenamiento=entrenamiento
-        )
-        if series_entrenamiento:
-            volumen_total = sum(s.peso_kg * s.repeticiones for s in series_entrenamiento)
+    if serie:
+        for punto in serie['puntos']:
             datos_grafico.append({
-                'fecha': entrenamiento.fecha.strftime('%d/%m'),
-                'volumen': volumen_total,
-                'nombre': entrenamiento.rutina.nombre
+                'fecha': _fecha_punto(punto['inicio']),
+                'peso_maximo': punto['peso_maximo'],
+                'e1rm': punto['e1rm_maximo'],
+                'volumen': punto['volumen']
             })
     
-    return render(request, 'progreso/dashboard.html', {
-        'estadisticas': estadisticas,
-        'prs': prs,
+    # Calcular fuerza relativa simple
+    fuerza_relativa = None
+    if peso_corporal and peso_corporal > 0 and historial:
+        ultimo_peso = historial[-1]['peso_maximo']
+        fuerza_relativa = round(ultimo_peso / peso_corporal, 2)
+    
+    return {
+        'historial': historial,
         'datos_grafico': datos_grafico,
-        'ultimos_entrenamientos': ultimos_entrenamientos
-    })
+        'resolucion_grafico': serie['resolucion'] if serie else None,
+        'fuerza_relativa': fuerza_relativa,
+    }
 
 # 📝 EXPLICACIÓN: Vista detallada de progreso por ejercicio
 @login_required
+@peticion_condicional
 def progreso_ejercicio(request, ejercicio_id):
     """
     Muestra el progreso detallado de un ejercicio específico
     """
     ejercicio = get_object_or_404(Ejercicio, id=ejercicio_id)
     
-    # Calcular progreso histórico
-    historial = calcular_progreso_ejercicio(request.user, ejercicio_id)
-    
-    # Preparar datos para gráfico
-    datos_grafico = []
-    if historial:
-        for punto in historial[-10:]:  # Últimos 10 puntos
-            datos_grafico.append({
-                'fecha': punto['fecha'].strftime('%d/%m'),
-                'peso_maximo': punto['peso_maximo'],
-                'volumen': punto['volumen_total']
-            })
+    datos = cache_progreso.obtener_o_calcular(
+        request.user.id,
+        f'ejercicio:{ejercicio_id}',
+        lambda: calcular_datos_ejercicio(request.user, ejercicio_id)
+    )
     
-    # Calcular fuerza relativa simple
-    fuerza_relativa = None
-    try:
-        perfil = Perfil.objects.get(usuario=request.user)
-        if perfil.peso_corporal and perfil.peso_corporal > 0 and historial:
-            ultimo_peso = historial[-1]['peso_maximo']
-            fuerza_relativa = round(ultimo_peso / perfil.peso_corporal, 2)
-    except:
-        pass
     return render(request, 'progreso/ejercicio.html', {
         'ejercicio': ejercicio,
-        'historial': historial,
-        'datos_grafico': datos_grafico,        'fuerza_relativa': fuerza_relativa    })
+        **datos,
+    })
 
 @login_required
 def actualizar_peso(request):
@@ -568,25 +896,21 @@ def actualizar_peso(request):
     return redirect('home')
 
 
-def calcular_sugerencia_simple(usuario, ejercicio_id):
-    """Calcula peso sugerido basado en último RPE - VERSIÓN SIMPLE"""
-    try:
-        from .models import SerieEjercicio
-        ultima = SerieEjercicio.objects.filter(
-            ejercicio_rutina__ejercicio_id=ejercicio_id,
-            entrenamiento__usuario=usuario,
-            rpe__isnull=False
-        ).order_by('-entrenamiento__fecha').first()
-        
-        if ultima and ultima.rpe:
-            if ultima.rpe <= 7:
-                return round(ultima.peso_kg * 1.05, 1)
-            elif ultima.rpe <= 8:
-                return round(ultima.peso_kg * 1.025, 1)
-            elif ultima.rpe == 9:
-                return ultima.peso_kg
-            else:  # RPE 10
-                return round(ultima.peso_kg * 0.975, 1)
-    except:
-        pass
-    return None
+def calcular_sugerencia(entrenamiento, ejercicio_rutina):
+    """
+    Peso y repeticiones sugeridos para la próxima serie (gym/progresion.py).
+    Una consulta por clave única: el último rendimiento se mantiene al
+    guardar cada serie (ver gym/agregados.py)
+    """
+    ultimo = UltimoRendimiento.objects.filter(
+        usuario_id=entrenamiento.usuario_id,
+        ejercicio_id=ejercicio_rutina.ejercicio_id
+    ).values('entrenamiento_id', 'series').first()
+    
+    if ultimo is None:
+        return None
+    return progresion.sugerir(
+        ultimo['series'],
+        progresion.rango_repeticiones(ejercicio_rutina.repeticiones),
+        misma_sesion=ultimo['entrenamiento_id'] == entrenamiento.id,
+    )
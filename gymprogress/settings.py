@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'gym.metricas.MetricasMiddleware',  # el primero: mide todo lo demás
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -48,6 +50,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'gym.perfilado.PerfiladoMiddleware',  # el último: perfila solo la vista
 ]
 
 ROOT_URLCONF = 'gymprogress.urls'
@@ -76,10 +79,90 @@ WSGI_APPLICATION = 'gymprogress.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('GYM_SQLITE_NOMBRE', BASE_DIR / 'db.sqlite3'),
     }
 }
 
+# Perfil de producción para SQLite (opcional): GYM_SQLITE_PRODUCCION=1
+# - WAL: las lecturas no esperan a las escrituras (y al revés)
+# - synchronous=NORMAL: con WAL no se corrompe; como mucho se pierde la
+#   última transacción si se va la luz
+# - mmap_size / cache_size: más base de datos en memoria
+# - timeout: segundos que una escritura espera su turno antes de fallar
+# - CONN_MAX_AGE: reutilizar la conexión entre peticiones
+# Los PRAGMA se aplican en gym/sqlite.py, que también reintenta las vistas
+# de escritura cuando SQLite contesta "database is locked".
+GYM_SQLITE_PRAGMAS = {}
+GYM_SQLITE_REINTENTOS = 0
+
+if os.environ.get('GYM_SQLITE_PRODUCCION') == '1':
+    DATABASES['default']['OPTIONS'] = {
+        'timeout': float(os.environ.get('GYM_SQLITE_TIMEOUT', 10)),
+    }
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('GYM_CONN_MAX_AGE', 600))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+    GYM_SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': int(os.environ.get('GYM_SQLITE_MMAP_MB', 256)) * 1024 * 1024,
+        'cache_size': -int(os.environ.get('GYM_SQLITE_CACHE_MB', 64)) * 1024,  # negativo = KiB
+        'temp_store': 'MEMORY',
+    }
+    GYM_SQLITE_REINTENTOS = int(os.environ.get('GYM_SQLITE_REINTENTOS', 5))
+
+
+# Cache (cálculos de progreso por usuario, ver gym/cache_progreso.py)
+# LocMemCache descarta lo menos usado (LRU) al llegar a MAX_ENTRIES y es
+# por proceso; con varios procesos, GYM_CACHE_DIR activa la caché en disco
+# compartida. TIMEOUT es el TTL en segundos.
+
+if os.environ.get('GYM_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['GYM_CACHE_DIR'],
+            'TIMEOUT': int(os.environ.get('GYM_CACHE_TTL', 3600)),
+            'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('GYM_CACHE_MAX', 10000))},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'gymprogress',
+            'TIMEOUT': int(os.environ.get('GYM_CACHE_TTL', 3600)),
+            'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('GYM_CACHE_MAX', 10000))},
+        }
+    }
+
+
+# Hilos para calcular a la vez las partes de las páginas de progreso async
+# (gym/progreso_async.py). 0 = una detrás de otra en el hilo de la petición.
+GYM_PROGRESO_HILOS = int(os.environ.get('GYM_PROGRESO_HILOS', 4))
+
+
+# Métricas por vista (gym/metricas.py, expuestas en /metrics)
+# - GYM_METRICAS_MUESTREO: fracción de peticiones medidas (0 = ninguna, 1 = todas)
+# - GYM_METRICAS_LENTAS_MS: las peticiones medidas más lentas se escriben
+#   en el log 'gym.metricas' con sus consultas más lentas (0 = no)
+# - GYM_METRICAS_TOKEN: si se pone, /metrics también responde con
+#   "Authorization: Bearer <token>"; sin él, solo a usuarios staff
+GYM_METRICAS_MUESTREO = float(os.environ.get('GYM_METRICAS_MUESTREO', 0))
+GYM_METRICAS_LENTAS_MS = float(os.environ.get('GYM_METRICAS_LENTAS_MS', 0))
+GYM_METRICAS_TOKEN = os.environ.get('GYM_METRICAS_TOKEN', '')
+
+# Perfilado bajo demanda (gym/perfilado.py): con GYM_PERFILADO=1, el staff
+# puede añadir ?perfilar=1 (o la cabecera X-Perfilar: 1) a una petición
+# - GYM_PERFILADO_DIR: dónde se guardan los .prof y el SQL con su plan
+# - GYM_PERFILADO_MAXIMO: perfiles que se conservan (se borran los más antiguos)
+GYM_PERFILADO = os.environ.get('GYM_PERFILADO') == '1'
+GYM_PERFILADO_DIR = os.environ.get('GYM_PERFILADO_DIR', BASE_DIR / 'perfiles')
+GYM_PERFILADO_MAXIMO = int(os.environ.get('GYM_PERFILADO_MAXIMO', 50))
+
+# Archivo de sesiones antiguas (gym/archivo.py, comando archivar_historial):
+# las series de las sesiones con más de estos días se empaquetan en una fila
+GYM_ARCHIVO_DIAS = int(os.environ.get('GYM_ARCHIVO_DIAS', 365))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators